@@ -0,0 +1,107 @@
+"""Benchmark getting a ``ConvNet2d`` from disk to its first prediction.
+
+Each approach builds the model, loads its weights and runs one forward pass,
+so the memory-mapped weights of the meta-device approach are all read before
+the clock stops. The checkpoint is in the page cache for both approaches, so
+the times are those of a warm serving host.
+
+Run with ``python benchmarks/cold_start.py``.
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from timeit import repeat
+
+import torch
+from torch import Tensor
+
+from torch_tools import ConvNet2d
+from torch_tools.checkpoints import meta_model, materialise_model
+
+# pylint: disable=cell-var-from-loop
+
+
+def eager_start(encoder_style: str, path: Path) -> Tensor:
+    """Build and initialise the model, copy the checkpoint into it and run it.
+
+    Parameters
+    ----------
+    encoder_style : str
+        The model's encoder.
+    path : Path
+        The checkpoint's path.
+
+    Returns
+    -------
+    Tensor
+        The model's first prediction.
+
+    """
+    model = ConvNet2d(out_feats=10, encoder_style=encoder_style, pretrained=False)
+    model.load_state_dict(torch.load(path, weights_only=True))
+    return _first_prediction(model)
+
+
+def meta_start(encoder_style: str, path: Path) -> Tensor:
+    """Build the model on the meta device, assign it the checkpoint and run it.
+
+    Parameters
+    ----------
+    encoder_style : str
+        The model's encoder.
+    path : Path
+        The checkpoint's path.
+
+    Returns
+    -------
+    Tensor
+        The model's first prediction.
+
+    """
+    model = meta_model(ConvNet2d, out_feats=10, encoder_style=encoder_style)
+    return _first_prediction(materialise_model(model, path))
+
+
+def _first_prediction(model: ConvNet2d) -> Tensor:
+    """Run one forward pass, which reads every one of the model's weights.
+
+    Parameters
+    ----------
+    model : ConvNet2d
+        The model.
+
+    Returns
+    -------
+    Tensor
+        The prediction.
+
+    """
+    model.eval()
+    with torch.no_grad():
+        return model(torch.zeros(1, 3, 224, 224))
+
+
+def main():
+    """Print the time taken to get a model ready for inference."""
+    print(f"{'encoder':>10} {'eager (ms)':>11} {'meta (ms)':>10} {'speed-up':>9}")
+    with TemporaryDirectory() as tmp_dir:
+        for encoder_style in ("resnet18", "resnet50", "resnet152", "vgg19"):
+            path = Path(tmp_dir) / f"{encoder_style}.pt"
+            model = ConvNet2d(10, encoder_style=encoder_style, pretrained=False)
+            torch.save(model.state_dict(), path)
+            del model
+
+            eager = min(
+                repeat(lambda: eager_start(encoder_style, path), number=1, repeat=3)
+            )
+            meta = min(
+                repeat(lambda: meta_start(encoder_style, path), number=1, repeat=3)
+            )
+            print(
+                f"{encoder_style:>10} {1e3 * eager:11.1f} {1e3 * meta:10.1f} "
+                + f"{eager / meta:8.1f}x"
+            )
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark the vectorised ``patchify_img_batch`` against the old one.
+
+Run with ``python benchmarks/patchify.py``.
+"""
+from itertools import chain
+from timeit import repeat
+
+from torch import Tensor, concat, rand  # pylint: disable=no-name-in-module
+
+from torch_tools.torch_utils import patchify_img_batch, unpatchify_img_batch
+
+# pylint: disable=cell-var-from-loop
+
+
+def legacy_patchify_img_batch(img_batch: Tensor, patch_size: int) -> Tensor:
+    """Patchify ``img_batch`` the way ``patchify_img_batch`` used to.
+
+    Parameters
+    ----------
+    img_batch : Tensor
+        A mini-batch of images.
+    patch_size : int
+        The size of the square patches.
+
+    Returns
+    -------
+    Tensor
+        The patches.
+
+    """
+    _, channels, _, _ = img_batch.shape
+
+    unfolded = (
+        concat(list(img_batch), dim=1)
+        .unfold(0, channels, channels)
+        .unfold(1, patch_size, patch_size)
+        .unfold(2, patch_size, patch_size)
+    )
+
+    unfolded_list = list(chain(*chain(*unfolded)))
+    return concat(list(map(lambda x: x.unsqueeze(0), unfolded_list)), dim=0)
+
+
+def time_call(func, number: int = 5) -> float:
+    """Return the best time, in milliseconds, to call ``func``.
+
+    Parameters
+    ----------
+    func : Callable
+        The function to time.
+    number : int, optional
+        The number of calls per timing run.
+
+    Returns
+    -------
+    float
+        The fastest time per call, in milliseconds.
+
+    """
+    times = repeat(func, number=number, repeat=3)
+    return 1e3 * min(times) / number
+
+
+def main():
+    """Print the cost of patchifying batches of ViT-style inputs."""
+    print(
+        f"{'batch':>18} {'patch':>6} {'legacy (ms)':>12} {'new (ms)':>9} "
+        + f"{'speed-up':>9} {'unpatchify (ms)':>16}"
+    )
+    for batch_size, size, patch_size in ((8, 224, 16), (64, 224, 16), (16, 512, 8)):
+        batch = rand(batch_size, 3, size, size)
+        patches = patchify_img_batch(batch, patch_size)
+        assert (legacy_patchify_img_batch(batch, patch_size) == patches).all()
+
+        legacy = time_call(lambda: legacy_patchify_img_batch(batch, patch_size))
+        new = time_call(lambda: patchify_img_batch(batch, patch_size))
+        inverse = time_call(lambda: unpatchify_img_batch(patches, (size, size)))
+        print(
+            f"{f'{batch_size}x3x{size}x{size}':>18} {patch_size:6d} "
+            + f"{legacy:12.2f} {new:9.2f} {legacy / new:8.1f}x {inverse:16.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Benchmark fused against unfused pointwise transforms in ``DataSet``.
+
+Run with ``python benchmarks/transform_fusion.py``.
+"""
+from timeit import repeat
+
+import numpy as np
+
+from PIL import Image
+
+from torchvision.transforms import Compose, ToTensor, Normalize  # type: ignore
+
+from torch_tools.datasets._transform_fusion import fuse_tfms
+
+
+def time_per_sample(tfms: Compose, img, number: int = 200) -> float:
+    """Return the best time, in microseconds, to apply ``tfms`` to ``img``.
+
+    Parameters
+    ----------
+    tfms : Compose
+        The transforms to time.
+    img : Any
+        The image to transform.
+    number : int, optional
+        The number of calls per timing run.
+
+    Returns
+    -------
+    float
+        The fastest time per call, in microseconds.
+
+    """
+    times = repeat(lambda: tfms(img), number=number, repeat=5)
+    return 1e6 * min(times) / number
+
+
+def main():
+    """Print the per-sample cost of fused and unfused transforms."""
+    tfms = Compose(
+        [
+            ToTensor(),
+            Normalize((0.485, 0.456, 0.406), (0.229, 0.224, 0.225)),
+        ]
+    )
+    fused = fuse_tfms(tfms)
+
+    print(f"{'input':>22} {'unfused (us)':>14} {'fused (us)':>12} {'speed-up':>9}")
+    for size in (64, 256, 512):
+        array = np.random.randint(0, 256, (size, size, 3)).astype(np.uint8)
+        for name, img in (("ndarray", array), ("PIL", Image.fromarray(array))):
+            unfused_time = time_per_sample(tfms, img)
+            fused_time = time_per_sample(fused, img)
+            print(
+                f"{f'{name} {size}x{size}x3':>22} {unfused_time:14.1f} "
+                + f"{fused_time:12.1f} {unfused_time / fused_time:8.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark the per-step cost of runtime validation in ``UNet`` inference.
+
+Run with ``python benchmarks/validation.py``.
+"""
+from typing import Dict, Tuple
+from timeit import repeat
+
+from torch import rand, no_grad  # pylint: disable=no-name-in-module
+
+from torch_tools import UNet
+from torch_tools.validation import validation_level
+
+# pylint: disable=cell-var-from-loop
+
+
+def time_per_step(model: UNet, batch, levels: Tuple[str, ...]) -> Dict[str, float]:
+    """Return the best time, in microseconds, of one forward pass per level.
+
+    Parameters
+    ----------
+    model : UNet
+        The model to time.
+    batch : Tensor
+        The mini-batch to pass through the model.
+    levels : Tuple[str, ...]
+        The validation levels to time the model at.
+
+    Returns
+    -------
+    Dict[str, float]
+        The fastest time per forward pass, in microseconds, at each level.
+
+    Notes
+    -----
+    The levels are timed in turn, many times over, so drifts in the
+    machine's speed affect each level alike.
+
+    """
+    best = {level: float("inf") for level in levels}
+    with no_grad():
+        for _ in range(20):
+            for level in levels:
+                with validation_level(level):
+                    time = min(repeat(lambda: model(batch), number=20, repeat=1))
+                best[level] = min(best[level], 1e6 * time / 20)
+    return best
+
+
+def main():
+    """Print the cost of small-image forward passes at each level."""
+    print(
+        f"{'input':>16} {'layers':>7} {'full (us)':>10} {'off (us)':>9} "
+        + f"{'overhead (us)':>14}"
+    )
+    for size, num_layers in ((16, 3), (32, 4), (64, 5)):
+        model = UNet(3, 2, features_start=4, num_layers=num_layers).eval()
+        times = time_per_step(model, rand(1, 3, size, size), ("full", "off"))
+        print(
+            f"{f'1x3x{size}x{size}':>16} {num_layers:7d} {times['full']:10.1f} "
+            + f"{times['off']:9.1f} {times['full'] - times['off']:14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
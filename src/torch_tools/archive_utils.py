@@ -0,0 +1,490 @@
+"""Listing and reading the members of archive files."""
+import os
+import json
+import struct
+import tarfile
+from pathlib import Path
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+from zipfile import ZipFile, ZIP_STORED
+
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+class ZipMember(NamedTuple):
+    """Record of a member of a zip file.
+
+    Parameters
+    ----------
+    archive : Path
+        The path of the zip file on disk.
+    name : str
+        The member's name in its zip file.
+    compressed_size : int
+        The size of the member's (possibly compressed) data, in bytes.
+    file_size : int
+        The uncompressed size of the member, in bytes.
+    header_offset : int
+        The offset of the member's local header in its zip file.
+    crc : int
+        The CRC-32 of the uncompressed member.
+    compress_type : int
+        The compression method (e.g. ``zipfile.ZIP_STORED``).
+    parents : Tuple[str, ...]
+        For members of nested zip files, the names of the zip files the member
+        is nested in, outermost first. Empty for members of ``archive``
+        itself.
+
+    """
+
+    archive: Path
+    name: str
+    compressed_size: int
+    file_size: int
+    header_offset: int
+    crc: int
+    compress_type: int
+    parents: Tuple[str, ...] = ()
+
+
+def list_zip_members(zip_path: Path, nested: bool = False) -> List[ZipMember]:
+    """List records of the members of the zip file at ``zip_path``.
+
+    Parameters
+    ----------
+    zip_path : Path
+        The path of the zip file.
+    nested : bool, optional
+        If ``True``, the members of zip files inside the zip file are listed
+        too (recursively), after the member which holds them.
+
+    Returns
+    -------
+    List[ZipMember]
+        The members, in the order they appear in the central directory.
+
+    Raises
+    ------
+    TypeError
+        If ``zip_path`` is not a ``Path``, or ``nested`` is not a ``bool``.
+
+    Notes
+    -----
+    Parsed central directories are cached, keyed by the zip file's path,
+    modification time and size, so repeated listings of an unchanged zip
+    file only cost a ``stat``.
+
+    """
+    if not isinstance(zip_path, Path):
+        raise TypeError(f"'zip_path' should be a Path. Got '{type(zip_path)}'.")
+    if not isinstance(nested, bool):
+        raise TypeError(f"'nested' should be a bool. Got '{type(nested)}'.")
+
+    stat = os.stat(zip_path)
+    return list(_cached_members(zip_path, stat.st_mtime_ns, stat.st_size, nested))
+
+
+@lru_cache(maxsize=256)
+def _cached_members(
+    zip_path: Path,
+    mtime_ns: int,  # pylint: disable=unused-argument
+    size: int,  # pylint: disable=unused-argument
+    nested: bool,
+) -> Tuple[ZipMember, ...]:
+    """Parse the central directory of ``zip_path`` (cached).
+
+    Parameters
+    ----------
+    zip_path : Path
+        The path of the zip file.
+    mtime_ns : int
+        The zip file's modification time (part of the cache key).
+    size : int
+        The zip file's size (part of the cache key).
+    nested : bool
+        Whether to descend into nested zip files.
+
+    Returns
+    -------
+    Tuple[ZipMember, ...]
+        The members.
+
+    """
+    with ZipFile(zip_path) as archive:
+        return tuple(_members(archive, zip_path, (), nested))
+
+
+def _members(
+    archive: ZipFile,
+    zip_path: Path,
+    parents: Tuple[str, ...],
+    nested: bool,
+) -> List[ZipMember]:
+    """Build records of the members of an open zip file.
+
+    Parameters
+    ----------
+    archive : ZipFile
+        The open zip file.
+    zip_path : Path
+        The path of the outermost zip file on disk.
+    parents : Tuple[str, ...]
+        The names of the zip files ``archive`` is nested in.
+    nested : bool
+        Whether to descend into nested zip files.
+
+    Returns
+    -------
+    List[ZipMember]
+        The members.
+
+    """
+    members = []
+    for info in archive.infolist():
+        members.append(
+            ZipMember(
+                archive=zip_path,
+                name=info.filename,
+                compressed_size=info.compress_size,
+                file_size=info.file_size,
+                header_offset=info.header_offset,
+                crc=info.CRC,
+                compress_type=info.compress_type,
+                parents=parents,
+            )
+        )
+        if nested and info.filename.endswith(".zip"):
+            with ZipFile(archive.open(info)) as inner:
+                members += _members(inner, zip_path, parents + (info.filename,), nested)
+    return members
+
+
+def zip_member_offset(member: ZipMember) -> int:
+    """Return the offset of a stored member's bytes in its zip file.
+
+    Parameters
+    ----------
+    member : ZipMember
+        A member of a zip file on disk (not a nested one), stored without
+        compression.
+
+    Returns
+    -------
+    int
+        The offset, in bytes, of the member's data from the start of
+        ``member.archive``. Reading ``member.file_size`` bytes from there
+        gives the member's contents.
+
+    Raises
+    ------
+    TypeError
+        If ``member`` is not a ``ZipMember``.
+    ValueError
+        If ``member`` is compressed or nested.
+
+    """
+    if not isinstance(member, ZipMember):
+        raise TypeError(f"'member' should be a ZipMember. Got '{type(member)}'.")
+    if member.compress_type != ZIP_STORED or member.parents:
+        msg = f"Only members stored, uncompressed, in '{member.archive}' have "
+        msg += f"an offset. '{member.name}' is compressed or nested."
+        raise ValueError(msg)
+
+    stat = os.stat(member.archive)
+    return _cached_offset(
+        member.archive,
+        stat.st_mtime_ns,
+        stat.st_size,
+        member.header_offset,
+    )
+
+
+@lru_cache(maxsize=65536)
+def _cached_offset(
+    zip_path: Path,
+    mtime_ns: int,  # pylint: disable=unused-argument
+    size: int,  # pylint: disable=unused-argument
+    header_offset: int,
+) -> int:
+    """Read a member's local header to find the offset of its data (cached).
+
+    Parameters
+    ----------
+    zip_path : Path
+        The path of the zip file.
+    mtime_ns : int
+        The zip file's modification time (part of the cache key).
+    size : int
+        The zip file's size (part of the cache key).
+    header_offset : int
+        The offset of the member's local header.
+
+    Returns
+    -------
+    int
+        The offset of the member's data.
+
+    Raises
+    ------
+    RuntimeError
+        If there is no local header at ``header_offset``.
+
+    """
+    with open(zip_path, "rb") as zip_file:
+        zip_file.seek(header_offset)
+        header = _LOCAL_HEADER.unpack(zip_file.read(_LOCAL_HEADER.size))
+
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        raise RuntimeError(f"Bad local header in '{zip_path}' at {header_offset}.")
+
+    name_length, extra_length = header[-2:]
+    return header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+
+def read_zip_member(member: ZipMember) -> bytes:
+    """Read the contents of ``member``.
+
+    Parameters
+    ----------
+    member : ZipMember
+        The member to read.
+
+    Returns
+    -------
+    bytes
+        The member's uncompressed contents.
+
+    Raises
+    ------
+    TypeError
+        If ``member`` is not a ``ZipMember``.
+
+    Notes
+    -----
+    Members stored without compression, directly in ``member.archive``, are
+    read with a single seek and read, without opening the zip file or
+    decompressing anything. Other members are read with ``zipfile``.
+
+    """
+    if not isinstance(member, ZipMember):
+        raise TypeError(f"'member' should be a ZipMember. Got '{type(member)}'.")
+
+    if member.compress_type == ZIP_STORED and not member.parents:
+        with open(member.archive, "rb") as zip_file:
+            zip_file.seek(zip_member_offset(member))
+            return zip_file.read(member.file_size)
+
+    with ZipFile(member.archive) as archive:
+        return _read_nested(archive, member.parents, member.name)
+
+
+def _read_nested(
+    archive: ZipFile,
+    parents: Tuple[str, ...],
+    name: str,
+) -> bytes:
+    """Read ``name`` from the zip file nested in ``archive`` at ``parents``.
+
+    Parameters
+    ----------
+    archive : ZipFile
+        The outermost zip file.
+    parents : Tuple[str, ...]
+        The names of the nested zip files, outermost first.
+    name : str
+        The name of the member to read.
+
+    Returns
+    -------
+    bytes
+        The member's contents.
+
+    """
+    if not parents:
+        return archive.read(name)
+
+    with ZipFile(archive.open(parents[0])) as inner:
+        return _read_nested(inner, parents[1:], name)
+
+
+class TarMember(NamedTuple):
+    """Record of a regular file in a tar archive.
+
+    Parameters
+    ----------
+    archive : Path
+        The path of the tar archive on disk.
+    name : str
+        The member's name in the archive.
+    size : int
+        The size of the member, in bytes.
+    offset : int
+        The offset of the member's data in the (uncompressed) tar stream.
+    compressed : bool
+        Whether the archive is compressed (``.tar.gz``, etc.). If not, the
+        member's data can be read by seeking to ``offset`` in ``archive``.
+
+    """
+
+    archive: Path
+    name: str
+    size: int
+    offset: int
+    compressed: bool
+
+
+def tar_index_path(tar_path: Path) -> Path:
+    """Return the path of the persistent index of ``tar_path``.
+
+    Parameters
+    ----------
+    tar_path : Path
+        The path of a tar archive.
+
+    Returns
+    -------
+    Path
+        The index's path: ``tar_path`` with ``".index"`` appended.
+
+    """
+    return tar_path.with_name(tar_path.name + ".index")
+
+
+def list_tar_members(tar_path: Path) -> List[TarMember]:
+    """List records of the regular files in the tar archive at ``tar_path``.
+
+    Parameters
+    ----------
+    tar_path : Path
+        The path of the tar archive, which may be compressed.
+
+    Returns
+    -------
+    List[TarMember]
+        The regular files in the archive, in the order they appear in it.
+
+    Raises
+    ------
+    TypeError
+        If ``tar_path`` is not a ``Path``.
+
+    Notes
+    -----
+    Listing a tar archive means reading all of its headers, which are
+    scattered through the archive, so the listing is done once and saved as
+    an index next to the archive (see ``tar_index_path``). Later listings,
+    in this or any other process, read the index instead—unless the
+    archive's modification time or size have changed. If the index cannot be
+    written (say, the directory is read-only), the listing is still cached
+    in memory.
+
+    """
+    if not isinstance(tar_path, Path):
+        raise TypeError(f"'tar_path' should be a Path. Got '{type(tar_path)}'.")
+
+    stat = os.stat(tar_path)
+    return list(_cached_tar_members(tar_path, stat.st_mtime_ns, stat.st_size))
+
+
+@lru_cache(maxsize=256)
+def _cached_tar_members(
+    tar_path: Path,
+    mtime_ns: int,
+    size: int,
+) -> Tuple[TarMember, ...]:
+    """Read the index of ``tar_path``, building it if need be (cached).
+
+    Parameters
+    ----------
+    tar_path : Path
+        The path of the tar archive.
+    mtime_ns : int
+        The archive's modification time.
+    size : int
+        The archive's size.
+
+    Returns
+    -------
+    Tuple[TarMember, ...]
+        The regular files in the archive.
+
+    """
+    index_path = tar_index_path(tar_path)
+    compressed = not tar_path.name.endswith(".tar")
+
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        if index["mtime_ns"] == mtime_ns and index["size"] == size:
+            return tuple(
+                TarMember(tar_path, name, length, offset, compressed)
+                for name, offset, length in index["members"]
+            )
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    with tarfile.open(tar_path, mode="r:*") as archive:
+        members = tuple(
+            TarMember(tar_path, info.name, info.size, info.offset_data, compressed)
+            for info in archive
+            if info.isreg()
+        )
+
+    index = {
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "members": [[x.name, x.offset, x.size] for x in members],
+    }
+    tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_text(json.dumps(index), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+    except OSError:
+        pass
+
+    return members
+
+
+def read_tar_member(member: TarMember) -> bytes:
+    """Read the contents of ``member``.
+
+    Parameters
+    ----------
+    member : TarMember
+        The member to read.
+
+    Returns
+    -------
+    bytes
+        The member's contents.
+
+    Raises
+    ------
+    TypeError
+        If ``member`` is not a ``TarMember``.
+
+    Notes
+    -----
+    Members of uncompressed archives are read with a single seek and read.
+    Members of compressed archives have to be found by decompressing the
+    archive up to them, which is much slower: for random access, store the
+    archive uncompressed.
+
+    """
+    if not isinstance(member, TarMember):
+        raise TypeError(f"'member' should be a TarMember. Got '{type(member)}'.")
+
+    if not member.compressed:
+        with open(member.archive, "rb") as tar_file:
+            tar_file.seek(member.offset)
+            return tar_file.read(member.size)
+
+    with tarfile.open(member.archive, mode="r:*") as archive:
+        extracted = archive.extractfile(member.name)
+        if extracted is None:
+            raise RuntimeError(f"Could not read '{member.name}' in '{member.archive}'.")
+        return extracted.read()
@@ -0,0 +1,1023 @@
+"""Saving and loading model checkpoints with low overhead."""
+import os
+import json
+import pickle
+from shutil import rmtree
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
+from itertools import chain
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import torch
+from torch import Tensor, no_grad  # pylint: disable=no-name-in-module
+from torch.nn import Module
+from torch.optim import Optimizer
+
+
+# pylint: disable=too-many-arguments, too-many-lines
+
+_MISMATCH_OPTIONS = ("skip", "partial", "error")
+
+
+class LoadReport(NamedTuple):
+    """What ``load_checkpoint`` did with each tensor.
+
+    Parameters
+    ----------
+    loaded : List[str]
+        The model's keys which were loaded in full.
+    partial : List[str]
+        The model's keys which were loaded in part, because their shapes
+        differ from the checkpoint's.
+    skipped : List[str]
+        The model's keys which were not loaded, because their shapes differ
+        from the checkpoint's.
+    missing : List[str]
+        The model's keys which are not in the checkpoint.
+    unexpected : List[str]
+        The checkpoint's keys which don't match any of the model's.
+
+    """
+
+    loaded: List[str]
+    partial: List[str]
+    skipped: List[str]
+    missing: List[str]
+    unexpected: List[str]
+
+
+def load_checkpoint(
+    model: Module,
+    checkpoint_path: Path,
+    prefix_map: Optional[Dict[str, str]] = None,
+    mismatch: str = "skip",
+    state_key: Optional[str] = None,
+    strict: bool = False,
+) -> LoadReport:
+    """Load the checkpoint at ``checkpoint_path`` into ``model``.
+
+    The checkpoint is memory-mapped, rather than read into memory, and its
+    tensors are copied into ``model`` one at a time. Only the pages of the
+    file holding the tensor being copied need to be in memory, so loading a
+    checkpoint doesn't (even briefly) double the model's memory footprint.
+
+    Parameters
+    ----------
+    model : Module
+        The model to load the checkpoint into.
+    checkpoint_path : Path
+        The path to the checkpoint, saved with ``torch.save``.
+    prefix_map : Dict[str, str], optional
+        Maps prefixes of the checkpoint's keys to the prefixes of the model's
+        keys. For example, ``{"module.": ""}`` strips the prefix
+        ``DataParallel`` adds, and ``{"encoder.": "backbone."}`` loads a
+        checkpoint's encoder into a model's backbone. The longest matching
+        prefix is used.
+    mismatch : str, optional
+        What to do with tensors whose shapes differ between the checkpoint
+        and the model. ``"skip"`` leaves the model's tensor as it is.
+        ``"partial"`` copies the overlapping part—the leading slice along each
+        dimension—if the tensors have the same number of dimensions (so a
+        first convolution whose ``in_channels`` went from 3 to 1 gets the
+        weights of the first channel), and skips the tensor otherwise.
+        ``"error"`` raises a ``RuntimeError``.
+    state_key : str, optional
+        If the checkpoint is a dict holding the state dict along with other
+        things (the optimiser's state, the epoch, etc.), the key of the state
+        dict. If ``None``, the checkpoint is taken to be the state dict.
+    strict : bool, optional
+        If ``True``, raise a ``RuntimeError`` unless every tensor of the
+        model is loaded in full and every tensor of the checkpoint is used.
+
+    Returns
+    -------
+    LoadReport
+        What was loaded, loaded in part, skipped, missing and unexpected.
+
+    Raises
+    ------
+    TypeError
+        If ``model`` is not a ``Module``, ``checkpoint_path`` is not a
+        ``Path`` or ``prefix_map`` is not a dict (or ``None``).
+    ValueError
+        If ``mismatch`` is not one of the options.
+    KeyError
+        If ``state_key`` is not in the checkpoint.
+    RuntimeError
+        If ``mismatch`` is ``"error"`` and a tensor's shape doesn't match, or
+        ``strict`` is ``True`` and the model and checkpoint don't match
+        exactly.
+
+    Examples
+    --------
+    >>> from pathlib import Path
+    >>> from torch_tools import ConvNet2d
+    >>> from torch_tools.checkpoints import load_checkpoint
+    >>> model = ConvNet2d(out_feats=10, in_channels=1, pretrained=False)
+    >>> report = load_checkpoint(
+            model,
+            Path("checkpoint.pt"),
+            prefix_map={"module.": ""},
+            mismatch="partial",
+            state_key="model",
+        )
+    >>> report.partial
+    ['backbone.conv1.weight']
+
+    Notes
+    -----
+    The checkpoint is loaded with ``weights_only=True``, so it can only hold
+    tensors and plain Python containers. Checkpoints in the legacy (pre
+    PyTorch 1.6) format cannot be memory-mapped, and are read into memory
+    instead.
+
+    """
+    _check_args(model, checkpoint_path, prefix_map, mismatch)
+
+    checkpoint = _load_mapped(checkpoint_path)
+    if state_key is not None:
+        checkpoint = checkpoint[state_key]
+    return _load_state(
+        model, _remap_keys(checkpoint, prefix_map or {}), mismatch, strict
+    )
+
+
+def _load_state(
+    model: Module,
+    source: Dict[str, Tensor],
+    mismatch: str,
+    strict: bool,
+) -> LoadReport:
+    """Copy the tensors in ``source`` into ``model``.
+
+    Parameters
+    ----------
+    model : Module
+        The model to load the tensors into.
+    source : Dict[str, Tensor]
+        The checkpoint's tensors, keyed by the model's names.
+    mismatch : str
+        What to do with shape-mismatched tensors. See ``load_checkpoint``.
+    strict : bool
+        Whether to raise unless the model and ``source`` match exactly.
+
+    Returns
+    -------
+    LoadReport
+        What was loaded, loaded in part, skipped, missing and unexpected.
+
+    Raises
+    ------
+    RuntimeError
+        If ``strict`` is ``True`` and the model and ``source`` don't match.
+
+    """
+    targets = model.state_dict(keep_vars=True)
+    outcomes: Dict[str, List[str]] = {"loaded": [], "partial": [], "skipped": []}
+
+    with no_grad():
+        for key in filter(lambda x: x in source, targets):
+            outcomes[_copy_tensor(key, source[key], targets[key], mismatch)].append(key)
+
+    report = LoadReport(
+        **outcomes,
+        missing=[key for key in targets if key not in source],
+        unexpected=[key for key in source if key not in targets],
+    )
+
+    if strict and (
+        report.partial or report.skipped or report.missing or report.unexpected
+    ):
+        msg = "The checkpoint does not match the model: "
+        msg += f"{_summary(report)}."
+        raise RuntimeError(msg)
+
+    return report
+
+
+def _check_args(
+    model: Module,
+    checkpoint_path: Path,
+    prefix_map: Optional[Dict[str, str]],
+    mismatch: str,
+):
+    """Check the arguments of ``load_checkpoint``.
+
+    Parameters
+    ----------
+    model : Module
+        The model.
+    checkpoint_path : Path
+        The checkpoint's path.
+    prefix_map : Dict[str, str], optional
+        The key prefixes to remap.
+    mismatch : str
+        What to do with mismatched shapes.
+
+    Raises
+    ------
+    TypeError
+        If any of the arguments have the wrong type.
+    ValueError
+        If ``mismatch`` is not one of the options.
+
+    """
+    if not isinstance(model, Module):
+        raise TypeError(f"'model' should be a 'Module'. Got '{type(model)}'.")
+    if not isinstance(checkpoint_path, Path):
+        msg = "'checkpoint_path' should be a 'Path'. Got "
+        msg += f"'{type(checkpoint_path)}'."
+        raise TypeError(msg)
+    if not isinstance(prefix_map, (dict, type(None))):
+        msg = f"'prefix_map' should be a dict or None. Got '{type(prefix_map)}'."
+        raise TypeError(msg)
+    if mismatch not in _MISMATCH_OPTIONS:
+        msg = f"'mismatch' should be one of {_MISMATCH_OPTIONS}. Got "
+        msg += f"'{mismatch}'."
+        raise ValueError(msg)
+
+
+def _copy_tensor(key: str, value: Tensor, target: Tensor, mismatch: str) -> str:
+    """Copy the checkpoint's ``value`` into the model's ``target``.
+
+    Parameters
+    ----------
+    key : str
+        The (model's) key of the tensor.
+    value : Tensor
+        The tensor from the checkpoint.
+    target : Tensor
+        The model's parameter or buffer.
+    mismatch : str
+        What to do if the shapes differ. See ``load_checkpoint``.
+
+    Returns
+    -------
+    str
+        ``"loaded"``, ``"partial"`` or ``"skipped"``.
+
+    Raises
+    ------
+    RuntimeError
+        If the shapes differ and ``mismatch`` is ``"error"``.
+
+    """
+    if value.shape == target.shape:
+        target.copy_(value)
+        return "loaded"
+
+    if mismatch == "error":
+        msg = f"Shape of '{key}' is '{tuple(value.shape)}' in the "
+        msg += f"checkpoint and '{tuple(target.shape)}' in the model."
+        raise RuntimeError(msg)
+
+    if mismatch == "partial" and value.dim() == target.dim():
+        overlap = tuple(map(lambda x: slice(0, min(x)), zip(value.shape, target.shape)))
+        target[overlap].copy_(value[overlap])
+        return "partial"
+
+    return "skipped"
+
+
+def _load_mapped(checkpoint_path: Path) -> Any:
+    """Load the checkpoint, memory-mapped if its format allows.
+
+    Parameters
+    ----------
+    checkpoint_path : Path
+        The checkpoint's path.
+
+    Returns
+    -------
+    Any
+        The checkpoint, with its tensors on the CPU.
+
+    """
+    try:
+        return torch.load(
+            checkpoint_path, map_location="cpu", mmap=True, weights_only=True
+        )
+    except (RuntimeError, pickle.UnpicklingError) as error:
+        if "zipfile" not in str(error).lower():
+            raise
+    return torch.load(checkpoint_path, map_location="cpu", weights_only=True)
+
+
+def _remap_keys(
+    state: Dict[str, Tensor], prefix_map: Dict[str, str]
+) -> Dict[str, Tensor]:
+    """Replace the prefixes of ``state``'s keys using ``prefix_map``.
+
+    Parameters
+    ----------
+    state : Dict[str, Tensor]
+        The checkpoint's state dict.
+    prefix_map : Dict[str, str]
+        Maps the checkpoint's key prefixes to the model's.
+
+    Returns
+    -------
+    Dict[str, Tensor]
+        ``state`` with its keys remapped.
+
+    """
+    prefixes = sorted(prefix_map, key=len, reverse=True)
+
+    def _remap(key: str) -> str:
+        prefix = next((x for x in prefixes if key.startswith(x)), None)
+        return key if prefix is None else prefix_map[prefix] + key[len(prefix) :]
+
+    return {_remap(key): value for key, value in state.items()}
+
+
+def _summary(report: LoadReport) -> str:
+    """Summarise the problems in ``report``.
+
+    Parameters
+    ----------
+    report : LoadReport
+        The report.
+
+    Returns
+    -------
+    str
+        The keys loaded in part, skipped, missing and unexpected.
+
+    """
+    fields: Tuple[str, ...] = ("partial", "skipped", "missing", "unexpected")
+    return ", ".join(f"{field} {getattr(report, field)}" for field in fields)
+
+
+class CheckpointWriter:
+    """Save sharded checkpoints in the background, without stalling training.
+
+    ``save`` copies the model's (and optimiser's) state to CPU buffers and
+    returns; a background thread then writes it to disk. Each save is a
+    directory, ``step-<step>``, holding one file per top-level submodule of
+    the model (``model.backbone.pt``, ``model.pool.pt``,
+    ``model.dense_layers.pt`` for a ``ConvNet2d``), ``optimiser.pt`` and a
+    ``manifest.json``. Saves are written to a temporary directory which is
+    renamed once every file has been flushed to disk, so a crash mid-save
+    never leaves a partial checkpoint behind, and only the last
+    ``keep_last`` saves are kept.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory to save the checkpoints in. It is created if it doesn't
+        exist.
+    keep_last : int, optional
+        The number of checkpoints to keep. Older ones are deleted after each
+        save.
+
+    Examples
+    --------
+    >>> from pathlib import Path
+    >>> from torch_tools.checkpoints import CheckpointWriter
+    >>> from torch_tools.checkpoints import latest_checkpoint
+    >>> from torch_tools.checkpoints import load_sharded_checkpoint
+    >>> with CheckpointWriter(Path("checkpoints"), keep_last=3) as writer:
+            for epoch in range(num_epochs):
+                train_one_epoch(model, optimiser)
+                writer.save(epoch, model, optimiser, extra={"epoch": epoch})
+    >>> report = load_sharded_checkpoint(
+            model,
+            latest_checkpoint(Path("checkpoints")),
+            optimiser=optimiser,
+        )
+
+    Notes
+    -----
+    Only one save is written at a time: ``save`` first waits for the
+    previous save to finish, which bounds the memory used by snapshots to
+    one copy of the state. The model's CPU buffers are reused between saves.
+    Errors raised while writing are re-raised by the next call to ``save``,
+    ``wait`` or ``close``.
+
+    """
+
+    def __init__(self, directory: Path, keep_last: int = 3):
+        """Build ``CheckpointWriter``."""
+        if not isinstance(directory, Path):
+            raise TypeError(f"'directory' should be a 'Path'. Got '{type(directory)}'.")
+        if not isinstance(keep_last, int):
+            raise TypeError(f"'keep_last' should be an int. Got '{type(keep_last)}'.")
+        if keep_last < 1:
+            raise ValueError(f"'keep_last' should be positive. Got '{keep_last}'.")
+
+        self._directory = directory
+        self._keep_last = keep_last
+        self._buffers: Dict[str, Tensor] = {}
+        self._pending: Optional[Future] = None
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+        directory.mkdir(parents=True, exist_ok=True)
+        for stale in directory.glob(".step-*.tmp"):
+            rmtree(stale)
+        for old in directory.glob(".step-*.old"):
+            final_dir = directory / old.name[1:].removesuffix(".old")
+            if final_dir.exists():
+                rmtree(old)
+            else:
+                os.replace(old, final_dir)
+
+    def save(
+        self,
+        step: int,
+        model: Module,
+        optimiser: Optional[Optimizer] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Future:
+        """Snapshot the state of ``model`` and ``optimiser`` and save it.
+
+        Parameters
+        ----------
+        step : int
+            The step (or epoch) of the checkpoint. A checkpoint already saved
+            at ``step`` is replaced.
+        model : Module
+            The model to save.
+        optimiser : Optimizer, optional
+            The optimiser to save.
+        extra : Dict[str, Any], optional
+            JSON-serialisable information to store in the manifest.
+
+        Returns
+        -------
+        Future
+            Resolves to the checkpoint's directory once it has been written.
+
+        Raises
+        ------
+        TypeError
+            If ``step`` is not an int, ``model`` is not a ``Module`` or
+            ``optimiser`` is not an ``Optimizer`` (or ``None``).
+        ValueError
+            If ``step`` is negative.
+
+        """
+        _check_save_args(step, model, optimiser)
+        manifest = json.dumps({"step": step, "extra": extra or {}})
+
+        self.wait()
+
+        with no_grad():
+            shards = self._snapshot_model(model)
+        if optimiser is not None:
+            shards["optimiser.pt"] = _snapshot(optimiser.state_dict())
+
+        self._pending = self._pool.submit(self._write, step, shards, manifest)
+        return self._pending
+
+    def _snapshot_model(self, model: Module) -> Dict[str, Dict[str, Tensor]]:
+        """Copy the model's state into the CPU buffers, grouped in shards.
+
+        Parameters
+        ----------
+        model : Module
+            The model.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Tensor]]
+            The state, keyed by shard file name and then parameter name.
+
+        """
+        shards: Dict[str, Dict[str, Tensor]] = {}
+        for key, tensor in model.state_dict().items():
+            buffer = self._buffers.get(key)
+            if (
+                buffer is None
+                or buffer.shape != tensor.shape
+                or buffer.dtype != tensor.dtype
+            ):
+                buffer = self._buffers[key] = tensor.detach().to("cpu", copy=True)
+            else:
+                buffer.copy_(tensor)
+
+            shards.setdefault(_shard_name(key), {})[key] = buffer
+        return shards
+
+    def _write(self, step: int, shards: Dict[str, Any], manifest: str) -> Path:
+        """Write a checkpoint and commit it by renaming its directory.
+
+        A checkpoint already saved at ``step`` is renamed aside, and only
+        deleted once the new one is in place, so there is always a copy of
+        the step on disk. A copy left aside by a crash is restored when the
+        next writer is built.
+
+        Parameters
+        ----------
+        step : int
+            The checkpoint's step.
+        shards : Dict[str, Any]
+            The objects to save, keyed by file name.
+        manifest : str
+            The manifest's JSON.
+
+        Returns
+        -------
+        Path
+            The checkpoint's directory.
+
+        """
+        tmp_dir = self._directory / f".step-{step:010d}.tmp"
+        old_dir = self._directory / f".step-{step:010d}.old"
+        final_dir = self._directory / f"step-{step:010d}"
+        if tmp_dir.exists():
+            rmtree(tmp_dir)
+        tmp_dir.mkdir()
+
+        for name, state in shards.items():
+            with open(tmp_dir / name, "wb") as file:
+                torch.save(state, file)
+                file.flush()
+                os.fsync(file.fileno())
+
+        with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as file:
+            json.dump({**json.loads(manifest), "shards": sorted(shards)}, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        if final_dir.exists():
+            if old_dir.exists():
+                rmtree(old_dir)
+            os.replace(final_dir, old_dir)
+        os.replace(tmp_dir, final_dir)
+        _fsync_directory(self._directory)
+        if old_dir.exists():
+            rmtree(old_dir)
+
+        for old in list_checkpoints(self._directory)[: -self._keep_last]:
+            rmtree(old)
+
+        return final_dir
+
+    def wait(self):
+        """Wait for the save in progress, if any, to be written."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def close(self):
+        """Wait for the save in progress and stop the background thread."""
+        try:
+            self.wait()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "CheckpointWriter":
+        """Return the writer.
+
+        Returns
+        -------
+        CheckpointWriter
+            The writer.
+
+        """
+        return self
+
+    def __exit__(self, *args: Any):
+        """Close the writer.
+
+        Parameters
+        ----------
+        args : Any
+            The exception, if any, raised in the ``with`` block.
+
+        """
+        self.close()
+
+
+def list_checkpoints(directory: Path) -> List[Path]:
+    """List the checkpoints ``CheckpointWriter`` saved in ``directory``.
+
+    Parameters
+    ----------
+    directory : Path
+        The writer's directory.
+
+    Returns
+    -------
+    List[Path]
+        The checkpoints' directories, from the oldest step to the latest.
+
+    """
+    return sorted(path for path in directory.glob("step-*") if path.is_dir())
+
+
+def latest_checkpoint(directory: Path) -> Optional[Path]:
+    """Return the latest checkpoint ``CheckpointWriter`` saved in ``directory``.
+
+    Parameters
+    ----------
+    directory : Path
+        The writer's directory.
+
+    Returns
+    -------
+    Path, optional
+        The latest checkpoint's directory, or ``None`` if there isn't one.
+
+    """
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+def read_manifest(checkpoint_dir: Path) -> Dict[str, Any]:
+    """Read the manifest of a checkpoint saved by ``CheckpointWriter``.
+
+    Parameters
+    ----------
+    checkpoint_dir : Path
+        The checkpoint's directory.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The checkpoint's ``"step"``, ``"extra"`` information and
+        ``"shards"``.
+
+    """
+    return json.loads((checkpoint_dir / "manifest.json").read_text(encoding="utf-8"))
+
+
+def load_sharded_checkpoint(
+    model: Module,
+    checkpoint_dir: Path,
+    optimiser: Optional[Optimizer] = None,
+    mismatch: str = "skip",
+    strict: bool = False,
+    num_threads: int = 4,
+) -> LoadReport:
+    """Load a checkpoint saved by ``CheckpointWriter``, in parallel.
+
+    The shards are memory-mapped in ``num_threads`` threads, and their
+    tensors copied into ``model`` one at a time (see ``load_checkpoint``).
+
+    Parameters
+    ----------
+    model : Module
+        The model to load the checkpoint into.
+    checkpoint_dir : Path
+        The checkpoint's directory (see ``latest_checkpoint``).
+    optimiser : Optimizer, optional
+        The optimiser to load the checkpoint's optimiser state into.
+    mismatch : str, optional
+        What to do with shape-mismatched tensors. See ``load_checkpoint``.
+    strict : bool, optional
+        If ``True``, raise a ``RuntimeError`` unless the model and the
+        checkpoint match exactly.
+    num_threads : int, optional
+        The number of threads to read the shards with.
+
+    Returns
+    -------
+    LoadReport
+        What was loaded into ``model``.
+
+    Raises
+    ------
+    TypeError
+        If ``checkpoint_dir`` is not a ``Path`` or ``num_threads`` is not
+        an int.
+    ValueError
+        If ``num_threads`` is not positive.
+    RuntimeError
+        If ``optimiser`` is given but the checkpoint has no optimiser state.
+
+    """
+    _check_args(model, checkpoint_dir, None, mismatch)
+    _check_num_threads(num_threads)
+
+    shards = read_manifest(checkpoint_dir)["shards"]
+    if optimiser is not None and "optimiser.pt" not in shards:
+        msg = f"Checkpoint '{checkpoint_dir}' has no optimiser state."
+        raise RuntimeError(msg)
+    if optimiser is None:
+        shards = [name for name in shards if name != "optimiser.pt"]
+
+    states = _read_shards(checkpoint_dir, shards, num_threads)
+    if optimiser is not None:
+        optimiser.load_state_dict(states.pop("optimiser.pt"))
+
+    return _load_state(model, _merge_shards(states), mismatch, strict)
+
+
+def meta_model(model_cls: Callable[..., Module], *args: Any, **kwargs: Any) -> Module:
+    """Build a model on the meta device, without allocating its weights.
+
+    Parameters and buffers created on the meta device have shapes and dtypes
+    but no data, so nothing is allocated or initialised—and, for
+    ``ConvNet2d``, no pretrained weights are downloaded or read. Use
+    ``materialise_model`` to give the model its weights from a checkpoint.
+
+    Parameters
+    ----------
+    model_cls : Callable[..., Module]
+        The model's class (or any function which builds a model).
+    args : Any
+        Positional arguments for ``model_cls``.
+    kwargs : Any
+        Keyword arguments for ``model_cls``.
+
+    Returns
+    -------
+    Module
+        The model, on the meta device.
+
+    Examples
+    --------
+    >>> from pathlib import Path
+    >>> from torch_tools import ConvNet2d
+    >>> from torch_tools.checkpoints import meta_model, materialise_model
+    >>> model = meta_model(ConvNet2d, out_feats=10, encoder_style="resnet152")
+    >>> model = materialise_model(model, Path("checkpoint.pt"))
+
+    Notes
+    -----
+    Non-persistent buffers, which aren't saved in checkpoints (like those of
+    the models' input normalisation), are on the meta device too. They are
+    rebuilt by ``materialise_model``.
+
+    """
+    with torch.device("meta"):
+        return model_cls(*args, **kwargs)
+
+
+def materialise_model(
+    model: Module,
+    checkpoint: Union[Path, Dict[str, Tensor]],
+    prefix_map: Optional[Dict[str, str]] = None,
+    state_key: Optional[str] = None,
+    device: Optional[Union[str, torch.device]] = None,
+    num_threads: int = 4,
+) -> Module:
+    """Give a model built by ``meta_model`` its weights from a checkpoint.
+
+    The checkpoint's tensors are assigned to the model, rather than copied
+    into it. Loaded from a file, they are memory-mapped, so the weights are
+    only read from disk as they are used and no tensor is ever allocated
+    twice.
+
+    Buffers which aren't saved in checkpoints are rebuilt, next to the
+    checkpoint's tensors, by the ``reset_buffers`` method of the modules
+    which hold them (see ``InputNormalisation``).
+
+    Parameters
+    ----------
+    model : Module
+        The model, on the meta device.
+    checkpoint : Path or Dict[str, Tensor]
+        A checkpoint file saved with ``torch.save``, a checkpoint directory
+        saved by ``CheckpointWriter``, or a state dict.
+    prefix_map : Dict[str, str], optional
+        Maps prefixes of the checkpoint's keys to the prefixes of the model's
+        keys. See ``load_checkpoint``.
+    state_key : str, optional
+        The key of the state dict in a checkpoint file which holds other
+        things too. See ``load_checkpoint``.
+    device : str or torch.device, optional
+        The device to move the model to. If ``None``, the model's tensors
+        stay where the checkpoint's are (on the CPU, for a file).
+    num_threads : int, optional
+        The number of threads to read a checkpoint directory's shards with.
+
+    Returns
+    -------
+    Module
+        ``model``, with its weights.
+
+    Raises
+    ------
+    TypeError
+        If ``model`` is not a ``Module``, ``checkpoint`` is not a ``Path`` or
+        a dict, or ``prefix_map`` is not a dict (or ``None``).
+    RuntimeError
+        If the checkpoint's keys or shapes don't match the model's, or any of
+        the model's tensors are still on the meta device.
+
+    """
+    if not isinstance(model, Module):
+        raise TypeError(f"'model' should be a 'Module'. Got '{type(model)}'.")
+    if not isinstance(checkpoint, (Path, dict)):
+        msg = "'checkpoint' should be a 'Path' or a dict. Got "
+        msg += f"'{type(checkpoint)}'."
+        raise TypeError(msg)
+    if not isinstance(prefix_map, (dict, type(None))):
+        msg = f"'prefix_map' should be a dict or None. Got '{type(prefix_map)}'."
+        raise TypeError(msg)
+    _check_num_threads(num_threads)
+
+    if isinstance(checkpoint, dict):
+        state = checkpoint
+    elif checkpoint.is_dir():
+        shards = read_manifest(checkpoint)["shards"]
+        shards = [name for name in shards if name != "optimiser.pt"]
+        state = _merge_shards(_read_shards(checkpoint, shards, num_threads))
+    else:
+        state = _load_mapped(checkpoint)
+        state = state if state_key is None else state[state_key]
+
+    model.load_state_dict(_remap_keys(state, prefix_map or {}), assign=True)
+    _reset_meta_buffers(model)
+
+    on_meta = [
+        name
+        for name, tensor in chain(model.named_parameters(), model.named_buffers())
+        if tensor.is_meta
+    ]
+    if on_meta:
+        raise RuntimeError(f"Tensors '{on_meta}' are still on the meta device.")
+
+    return model if device is None else model.to(device)
+
+
+def _reset_meta_buffers(model: Module):
+    """Rebuild the buffers left on the meta device by loading a state dict.
+
+    Parameters
+    ----------
+    model : Module
+        The model, with its checkpoint's tensors assigned.
+
+    Notes
+    -----
+    The buffers are rebuilt by the ``reset_buffers`` method of the modules
+    which hold them, on the device of the model's first tensor which isn't
+    on the meta device (or the CPU, if there is none).
+
+    """
+    device = next(
+        (
+            tensor.device
+            for tensor in chain(model.parameters(), model.buffers())
+            if not tensor.is_meta
+        ),
+        torch.device("cpu"),
+    )
+    for module in model.modules():
+        reset_buffers = getattr(module, "reset_buffers", None)
+        on_meta = any(buffer.is_meta for buffer in module.buffers(recurse=False))
+        if reset_buffers is not None and on_meta:
+            reset_buffers(device=device)
+
+
+def _check_num_threads(num_threads: int):
+    """Check ``num_threads`` is a positive int.
+
+    Parameters
+    ----------
+    num_threads : int
+        The number of threads.
+
+    Raises
+    ------
+    TypeError
+        If ``num_threads`` is not an int.
+    ValueError
+        If ``num_threads`` is not positive.
+
+    """
+    if not isinstance(num_threads, int):
+        raise TypeError(f"'num_threads' should be an int. Got '{type(num_threads)}'.")
+    if num_threads < 1:
+        raise ValueError(f"'num_threads' should be positive. Got '{num_threads}'.")
+
+
+def _read_shards(
+    checkpoint_dir: Path,
+    shards: List[str],
+    num_threads: int,
+) -> Dict[str, Any]:
+    """Memory-map a checkpoint's ``shards`` in ``num_threads`` threads.
+
+    Parameters
+    ----------
+    checkpoint_dir : Path
+        The checkpoint's directory.
+    shards : List[str]
+        The names of the shard files to read.
+    num_threads : int
+        The number of threads.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The contents of each shard, keyed by its name.
+
+    """
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        paths = (checkpoint_dir / name for name in shards)
+        return dict(zip(shards, pool.map(_load_mapped, paths)))
+
+
+def _merge_shards(states: Dict[str, Dict[str, Tensor]]) -> Dict[str, Tensor]:
+    """Merge the model's shards into a single state dict.
+
+    Parameters
+    ----------
+    states : Dict[str, Dict[str, Tensor]]
+        The model's shards, keyed by file name.
+
+    Returns
+    -------
+    Dict[str, Tensor]
+        The model's state dict.
+
+    """
+    return {key: value for state in states.values() for key, value in state.items()}
+
+
+def _check_save_args(step: int, model: Module, optimiser: Optional[Optimizer]):
+    """Check the arguments of ``CheckpointWriter.save``.
+
+    Parameters
+    ----------
+    step : int
+        The checkpoint's step.
+    model : Module
+        The model.
+    optimiser : Optimizer, optional
+        The optimiser.
+
+    Raises
+    ------
+    TypeError
+        If any of the arguments have the wrong type.
+    ValueError
+        If ``step`` is negative.
+
+    """
+    if not isinstance(step, int):
+        raise TypeError(f"'step' should be an int. Got '{type(step)}'.")
+    if step < 0:
+        raise ValueError(f"'step' should not be negative. Got '{step}'.")
+    if not isinstance(model, Module):
+        raise TypeError(f"'model' should be a 'Module'. Got '{type(model)}'.")
+    if not isinstance(optimiser, (Optimizer, type(None))):
+        msg = f"'optimiser' should be an 'Optimizer' or None. Got '{type(optimiser)}'."
+        raise TypeError(msg)
+
+
+def _shard_name(key: str) -> str:
+    """Return the name of the shard file the model's ``key`` is saved in.
+
+    Parameters
+    ----------
+    key : str
+        A key of the model's state dict.
+
+    Returns
+    -------
+    str
+        ``"model.<submodule>.pt"``, where ``submodule`` is the top-level
+        submodule ``key`` belongs to, or ``"model.pt"`` for the model's own
+        parameters and buffers.
+
+    """
+    return f"model.{key.split('.', 1)[0]}.pt" if "." in key else "model.pt"
+
+
+def _snapshot(state: Any) -> Any:
+    """Copy the tensors in ``state`` to the CPU.
+
+    Parameters
+    ----------
+    state : Any
+        A (nested) container of tensors and other objects.
+
+    Returns
+    -------
+    Any
+        ``state``, with each tensor replaced by a copy on the CPU.
+
+    """
+    if isinstance(state, Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {key: _snapshot(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(map(_snapshot, state))
+    return state
+
+
+def _fsync_directory(directory: Path):
+    """Flush ``directory``'s entries (e.g. a rename) to disk, where possible.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory.
+
+    """
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
@@ -1,2 +1,5 @@
 """Init for `torch_tools.datasets`."""
 from torch_tools.datasets._dataset import DataSet
+from torch_tools.datasets._tfms_caching import CacheBoundary
+from torch_tools.datasets._loader_tuning import tune_data_loader
+from torch_tools.datasets._sample_index import SampleIndex
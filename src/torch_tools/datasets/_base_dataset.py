@@ -9,6 +9,8 @@ from numpy import ndarray
 from torch import Tensor
 from torch.utils.data import Dataset
 
+from torch_tools.datasets._indexed_column import IndexedColumn
+
 
 class _BaseDataset(Dataset):
     """Base dataset class.
@@ -65,7 +67,7 @@ class _BaseDataset(Dataset):
     def _set_inputs(
         self,
         inputs: Sequence[Union[str, Path, Tensor, ndarray]],
-    ) -> Tuple[Union[str, Path, Tensor, ndarray], ...]:
+    ) -> Sequence[Union[str, Path, Tensor, ndarray]]:
         """Set the dataset's inputs.
 
         Parameters
@@ -75,10 +77,17 @@ class _BaseDataset(Dataset):
 
         Returns
         -------
-        Tuple[Union[str, Path, Tensor, ndarray]]
+        Sequence[Union[str, Path, Tensor, ndarray]]
             The inputs in a tuple.
 
+        Notes
+        -----
+        An ``IndexedColumn`` is kept as it is, rather than being read into a
+        tuple.
+
         """
+        if isinstance(inputs, IndexedColumn):
+            return inputs
         self._input_type(inputs)
         self._individual_types(inputs)
         return tuple(inputs)
@@ -86,7 +95,7 @@ class _BaseDataset(Dataset):
     def _set_targets(
         self,
         targets: Optional[Sequence[Union[str, Path, Tensor, ndarray]]] = None,
-    ) -> Union[Tuple[Union[str, Path, Tensor, ndarray], ...], None]:
+    ) -> Optional[Sequence[Union[str, Path, Tensor, ndarray]]]:
         """Set the targets (ground truths) of the dataset.
 
         Parameters
@@ -96,11 +105,11 @@ class _BaseDataset(Dataset):
 
         Returns
         -------
-        Union[Tuple[Union[str, Path, Tensor, ndarray], ...], None]
+        Optional[Sequence[Union[str, Path, Tensor, ndarray]]]
             `targets` in a tuple, or `None`.
 
         """
-        if targets is None:
+        if targets is None or isinstance(targets, IndexedColumn):
             return targets
         self._input_type(targets)
         self._individual_types(targets)
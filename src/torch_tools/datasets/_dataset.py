@@ -4,16 +4,25 @@ from pathlib import Path
 
 
 from torch import Tensor, concat  # pylint: disable=no-name-in-module
+from torch import dtype  # pylint: disable=no-name-in-module
 from torchvision.transforms import Compose  # type: ignore
 
 
 from numpy import ndarray
 
 
+from torch_tools.models._argument_processing import process_boolean_arg
 from torch_tools.datasets._base_dataset import _BaseDataset
+from torch_tools.datasets._shared_cache import SharedSampleCache
+from torch_tools.datasets._transform_fusion import fuse_tfms as fuse_pointwise_tfms
+from torch_tools.datasets._tfms_caching import split_tfms, DiskSampleCache
+from torch_tools.datasets._numpy_conversion import (
+    ndarray_to_tensor,
+    warn_if_writable,
+)
 
 
-# pylint: disable=too-many-arguments, too-few-public-methods
+# pylint: disable=too-many-arguments, too-few-public-methods, too-many-instance-attributes
 
 
 class DataSet(_BaseDataset):
@@ -39,6 +48,40 @@ class DataSet(_BaseDataset):
         transformed, and sliced apart, in the way one would apply rotations or
         reflections to images and segmentation masks. The dimensionality
         matters!
+    from_numpy : bool, optional
+        If ``True``, any inputs or targets which are numpy arrays are
+        converted to tensors with ``torch.from_numpy`` before the transforms
+        are applied. Writable arrays are not copied, so the tensors share
+        memory with the arrays, and you will be warned about this.
+    numpy_dtype : torch.dtype, optional
+        The dtype to cast the tensors produced by ``from_numpy`` to. The cast
+        is done in the same copy as the permutation from ``hwc_to_chw``. If
+        ``None``, the arrays' dtypes are kept. Only used if ``from_numpy`` is
+        ``True``.
+    hwc_to_chw : bool, optional
+        If ``True``, three-dimensional numpy arrays are treated as images with
+        shape ``(H, W, C)`` and permuted to ``(C, H, W)``. Only used if
+        ``from_numpy`` is ``True``.
+    cache_bytes : int, optional
+        If not ``None``, the outputs of ``input_tfms`` and ``target_tfms``
+        are cached in a block of shared memory of this many bytes, which is
+        shared by every ``DataLoader`` worker. A sample prepared by any worker
+        is then a cache hit for every other worker in later epochs. Only the
+        deterministic prefix of ``input_tfms`` and ``target_tfms`` is
+        cached: see the notes below. The cached outputs must be tensors. See
+        ``torch_tools.datasets._shared_cache.SharedSampleCache``.
+    fuse_tfms : bool, optional
+        If ``True``, runs of pointwise transforms in ``input_tfms`` and
+        ``target_tfms``—``ToTensor`` or ``PILToTensor`` followed by
+        ``ConvertImageDtype`` and ``Normalize``—are fused into a single pass
+        with one output allocation. See
+        ``torch_tools.datasets._transform_fusion.FusedPointwiseTfms``.
+    cache_dir : Path, optional
+        If not ``None``, the outputs of the deterministic prefix of
+        ``input_tfms`` and ``target_tfms`` are cached as files in this
+        directory, where they persist between runs. Cannot be used with
+        ``cache_bytes``. See
+        ``torch_tools.datasets._tfms_caching.DiskSampleCache``.
 
     Notes
     -----
@@ -50,6 +93,27 @@ class DataSet(_BaseDataset):
           transforms.
         - Doing inference (just set `targets=None` and it yields inputs only).
 
+    For semantic segmentation, the targets can be compact class-index maps
+    of shape ``(H, W)`` (see
+    ``torch_tools.torch_utils.index_map_from_mask_img``), rather than one-hot
+    ``(num_classes, H, W)`` tensors. Expand them into one-hot targets, if
+    the loss needs them, in the training step, with
+    ``torch_tools.torch_utils.target_from_mask_img_batch``.
+
+    Images can be kept as ``uint8`` tensors all the way through the dataset,
+    its cache and the ``DataLoader``'s collation (which moves four times
+    fewer bytes than ``float32``). Have the model do the cast and
+    normalisation instead, using its ``input_norm_kwargs`` argument.
+
+    When caching (with ``cache_bytes`` or ``cache_dir``), ``input_tfms`` and
+    ``target_tfms`` are each split into a deterministic prefix, whose output
+    is cached, and a random tail, which is run every time a sample is
+    fetched (followed by ``both_tfms``). The split is at the first
+    ``CacheBoundary`` in the ``Compose``, if there is one, or else just
+    before the first random transform (``RandomCrop``, ``ColorJitter``,
+    etc.). Augmentations therefore stay fresh, while loading and resizing
+    are only paid for once.
+
     """
 
     def __init__(
@@ -59,6 +123,12 @@ class DataSet(_BaseDataset):
         input_tfms: Optional[Compose] = None,
         target_tfms: Optional[Compose] = None,
         both_tfms: Optional[Compose] = None,
+        from_numpy: bool = False,
+        numpy_dtype: Optional[dtype] = None,
+        hwc_to_chw: bool = False,
+        cache_bytes: Optional[int] = None,
+        fuse_tfms: bool = False,
+        cache_dir: Optional[Path] = None,
     ):
         """Build `DataSet`."""
         super().__init__(inputs=inputs, targets=targets)
@@ -66,6 +136,60 @@ class DataSet(_BaseDataset):
         self._y_tfms = self._receive_tfms(target_tfms)
         self._both_tfms = self._receive_tfms(both_tfms)
 
+        if process_boolean_arg(fuse_tfms) is True:
+            self._x_tfms = self._fused(self._x_tfms)
+            self._y_tfms = self._fused(self._y_tfms)
+
+        self._from_numpy = process_boolean_arg(from_numpy)
+        self._numpy_dtype = self._receive_numpy_dtype(numpy_dtype)
+        self._hwc_to_chw = process_boolean_arg(hwc_to_chw)
+
+        if self._from_numpy is True:
+            warn_if_writable(self.inputs, "inputs", self._numpy_dtype)
+            warn_if_writable(self.targets or (), "targets", self._numpy_dtype)
+
+        self._cache = self._build_cache(cache_bytes, cache_dir)
+
+        self._x_tail: Optional[Compose] = None
+        self._y_tail: Optional[Compose] = None
+        if self._cache is not None:
+            self._x_tfms, self._x_tail = split_tfms(self._x_tfms)
+            self._y_tfms, self._y_tail = split_tfms(self._y_tfms)
+
+    def _build_cache(
+        self,
+        cache_bytes: Optional[int],
+        cache_dir: Optional[Path],
+    ) -> Optional[Union[SharedSampleCache, DiskSampleCache]]:
+        """Build the sample cache, if one is requested.
+
+        Parameters
+        ----------
+        cache_bytes : int, optional
+            Size of the shared-memory cache.
+        cache_dir : Path, optional
+            Directory of the on-disk cache.
+
+        Returns
+        -------
+        SharedSampleCache or DiskSampleCache or None
+            The cache, or ``None``.
+
+        Raises
+        ------
+        ValueError
+            If both ``cache_bytes`` and ``cache_dir`` are given.
+
+        """
+        if cache_bytes is not None and cache_dir is not None:
+            msg = "Only one of 'cache_bytes' and 'cache_dir' should be given."
+            raise ValueError(msg)
+        if cache_bytes is not None:
+            return SharedSampleCache(len(self), cache_bytes)
+        if cache_dir is not None:
+            return DiskSampleCache(cache_dir)
+        return None
+
     @staticmethod
     def _receive_tfms(tfms: Optional[Compose] = None) -> Union[Compose, None]:
         """Check the transforms are `Compose` (or `None`) and return them.
@@ -87,6 +211,71 @@ class DataSet(_BaseDataset):
             raise TypeError(msg)
         return tfms
 
+    @staticmethod
+    def _fused(tfms: Optional[Compose]) -> Optional[Compose]:
+        """Fuse the pointwise transforms in ``tfms`` (if it isn't ``None``).
+
+        Parameters
+        ----------
+        tfms : Compose, optional
+            The transforms to fuse.
+
+        Returns
+        -------
+        Compose or None
+            The fused transforms, or ``None``.
+
+        """
+        return fuse_pointwise_tfms(tfms) if tfms is not None else None
+
+    @staticmethod
+    def _receive_numpy_dtype(numpy_dtype: Optional[dtype]) -> Optional[dtype]:
+        """Check ``numpy_dtype`` is a ``torch.dtype`` (or ``None``).
+
+        Parameters
+        ----------
+        numpy_dtype : torch.dtype, optional
+            The dtype to cast tensors converted from numpy arrays to.
+
+        Returns
+        -------
+        torch.dtype or None
+            ``numpy_dtype``.
+
+        Raises
+        ------
+        TypeError
+            If ``numpy_dtype`` is not a ``torch.dtype`` or ``None``.
+
+        """
+        if not isinstance(numpy_dtype, (dtype, type(None))):
+            msg = "'numpy_dtype' should be a 'torch.dtype' or 'None'. Got "
+            msg += f"'{type(numpy_dtype)}'."
+            raise TypeError(msg)
+        return numpy_dtype
+
+    def _convert_ndarray(
+        self,
+        item: Union[str, Path, Tensor, ndarray],
+    ) -> Union[str, Path, Tensor, ndarray]:
+        """Convert ``item`` to a ``Tensor`` if it is a numpy array.
+
+        Parameters
+        ----------
+        item : Union[str, Path, Tensor, ndarray]
+            An input or target item.
+
+        Returns
+        -------
+        Union[str, Path, Tensor, ndarray]
+            ``item`` converted to a ``Tensor`` if it is an ``ndarray`` and
+            ``self._from_numpy`` is ``True``, otherwise ``item`` unchanged.
+
+        """
+        if self._from_numpy and isinstance(item, ndarray):
+            return ndarray_to_tensor(item, self._numpy_dtype, self._hwc_to_chw)
+        return item
+
     def _apply_input_tfms(
         self,
         x_item: Union[str, Path, Tensor, ndarray],
@@ -148,13 +337,30 @@ class DataSet(_BaseDataset):
         Notes
         -----
         `x_item` and `y_item` are concatenated along the channel dimension,
-        transformed and then sliced apart.
+        transformed and then sliced apart. If `x_item` and `y_item` have
+        different integer dtypes (say, a `uint8` image and an `int64` mask),
+        and the transforms keep the promoted dtype, each part is cast back to
+        its original dtype after slicing, so compact dtypes survive the
+        concatenation's type promotion. Otherwise—floating-point items, or
+        transforms which change the dtype themselves—the transforms' output
+        dtype is kept.
+
+        If `y_item` has one dimension fewer than `x_item` (say, a `(H, W)`
+        class-index map and a `(C, H, W)` image), it is given a channel
+        dimension for the transforms, and has it removed again afterwards.
 
         """
         if self._both_tfms is not None:
             slice_idx = x_item.shape[0]
-            transformed = self._both_tfms(concat([x_item, y_item], dim=0))
-            return transformed[:slice_idx], transformed[slice_idx:]
+            index_map = y_item.dim() == x_item.dim() - 1
+            y_in = y_item.unsqueeze(0) if index_map else y_item
+
+            joined = concat([x_item, y_in], dim=0)
+            transformed = self._both_tfms(joined)
+            x_out, y_out = transformed[:slice_idx], transformed[slice_idx:]
+            if _compact_pair(x_item, y_item) and transformed.dtype == joined.dtype:
+                x_out, y_out = x_out.to(x_item.dtype), y_out.to(y_item.dtype)
+            return x_out, (y_out.squeeze(0) if index_map else y_out)
         return x_item, y_item
 
     def __getitem__(self, idx: int) -> Union[Tuple[Tensor, ...], Tensor]:
@@ -166,12 +372,81 @@ class DataSet(_BaseDataset):
             Index of the item to return.
 
         """
-        x_item = self._apply_input_tfms(self.inputs[idx])
+        sample = self._cache.get(idx) if self._cache is not None else None
+
+        if sample is None:
+            sample = self._transformed_sample(idx)
+            if self._cache is not None:
+                self._cache.put(idx, sample)
+
+        sample = self._apply_random_tails(sample)
 
         if self.targets is None:
-            return x_item
+            return sample[0]
+
+        return self._apply_both_tfms(*sample)
 
-        y_item = self._apply_target_transforms(self.targets[idx])
-        x_item, y_item = self._apply_both_tfms(x_item, y_item)
+    def _transformed_sample(self, idx: int) -> Tuple[Tensor, ...]:
+        """Load the item(s) at ``idx`` and apply the input/target transforms.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the item to return.
+
+        Returns
+        -------
+        Tuple[Tensor, ...]
+            The transformed input, and target if the dataset has targets.
 
+        """
+        x_item = self._apply_input_tfms(self._convert_ndarray(self.inputs[idx]))
+
+        if self.targets is None:
+            return (x_item,)
+
+        y_item = self._apply_target_transforms(self._convert_ndarray(self.targets[idx]))
         return x_item, y_item
+
+    def _apply_random_tails(self, sample: Tuple[Tensor, ...]) -> Tuple[Tensor, ...]:
+        """Apply the random tails of the input/target transforms.
+
+        Parameters
+        ----------
+        sample : Tuple[Tensor, ...]
+            The (possibly cached) output of the deterministic transforms.
+
+        Returns
+        -------
+        Tuple[Tensor, ...]
+            ``sample`` with the random tails applied.
+
+        """
+        tails = (self._x_tail, self._y_tail)
+        return tuple(
+            tail(item) if tail is not None else item
+            for item, tail in zip(sample, tails)
+        )
+
+
+def _compact_pair(x_item: Tensor, y_item: Tensor) -> bool:
+    """Return whether the items have different integer dtypes.
+
+    Parameters
+    ----------
+    x_item : Tensor
+        Input item.
+    y_item : Tensor
+        Target item.
+
+    Returns
+    -------
+    bool
+        ``True`` if neither item is floating point (or complex) and their
+        dtypes differ.
+
+    """
+    integral = not any(
+        map(lambda x: x.is_floating_point() or x.is_complex(), (x_item, y_item))
+    )
+    return integral and x_item.dtype != y_item.dtype
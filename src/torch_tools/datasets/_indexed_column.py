@@ -0,0 +1,118 @@
+"""Lazy sequence of the values of one column of a ``SampleIndex``."""
+import os
+import sqlite3
+from array import array
+from pathlib import Path
+from typing import Any, Optional, Sequence, Union, Dict
+
+from torch import Tensor, tensor  # pylint: disable=no-name-in-module
+
+
+class IndexedColumn(Sequence):
+    """The values of one column of a ``SampleIndex``, looked up on access.
+
+    Only the rowids of the selected samples are held in memory (as an
+    ``array`` of 64-bit integers, eight bytes per sample), and each value is
+    read from the index when it is accessed. Unlike a tuple of millions of
+    paths, the rowids are a single object, so ``DataLoader`` workers do not
+    gradually copy them by touching their reference counts.
+
+    Parameters
+    ----------
+    index_path : Path
+        The path of the index's database.
+    column : str
+        The column to read the values from.
+    rowids : array
+        The rowids of the selected samples, in order.
+    as_path : bool
+        If ``True``, the values are returned as ``Path``s. Otherwise, they
+        are returned as (scalar) tensors.
+
+    Notes
+    -----
+    Each process opens its own connection to the index, so the sequence can
+    be pickled and sent to ``DataLoader`` workers.
+
+    """
+
+    def __init__(self, index_path: Path, column: str, rowids: array, as_path: bool):
+        """Build ``IndexedColumn``."""
+        self._index_path = index_path
+        self._column = column
+        self._rowids = rowids
+        self._as_path = as_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = os.getpid()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this process's (read-only) connection to the index.
+
+        Returns
+        -------
+        sqlite3.Connection
+            The connection.
+
+        """
+        if self._conn is None or self._pid != os.getpid():
+            uri = self._index_path.resolve().as_uri() + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    def __len__(self) -> int:
+        """Return the number of selected samples.
+
+        Returns
+        -------
+        int
+            The number of samples.
+
+        """
+        return len(self._rowids)
+
+    def __getitem__(self, idx: Any) -> Union[Path, Tensor]:  # type: ignore[override]
+        """Return the value of the column for the sample at ``idx``.
+
+        Parameters
+        ----------
+        idx : int
+            The position of the sample in the selection.
+
+        Returns
+        -------
+        Path or Tensor
+            The value.
+
+        Raises
+        ------
+        TypeError
+            If ``idx`` is not an int.
+        RuntimeError
+            If the sample has been removed from the index since it was
+            selected.
+
+        """
+        if not isinstance(idx, int):
+            msg = f"'idx' should be an int. Got '{type(idx)}'."
+            raise TypeError(msg)
+
+        query = f"SELECT {self._column} FROM samples WHERE rowid = ?"
+        row = self._connection().execute(query, (self._rowids[idx],)).fetchone()
+        if row is None:
+            msg = f"The sample at position {idx} has been removed from the index "
+            msg += "since it was selected."
+            raise RuntimeError(msg)
+        (value,) = row
+        return Path(value) if self._as_path else tensor(value)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state to pickle, without the connection.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The state.
+
+        """
+        return {**self.__dict__, "_conn": None}
@@ -0,0 +1,533 @@
+"""Automatic tuning of ``DataLoader`` settings for a dataset and model."""
+import os
+import json
+import hashlib
+import platform
+from time import perf_counter
+from pathlib import Path
+from itertools import product, chain
+from typing import Any, Dict, List, Optional, Sequence
+
+from torch import Tensor, zeros, float64, no_grad  # pylint: disable=no-name-in-module
+from torch import __version__ as torch_version
+from torch.nn import Module
+from torch.utils.data import DataLoader, Dataset, get_worker_info
+
+from torch_tools.models._argument_processing import process_boolean_arg
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+
+_CACHE_FILE = "loader_tuning.json"
+
+
+class _TimedDataset(Dataset):
+    """Wrap a dataset, recording how long each worker spends fetching.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset to wrap.
+    max_workers : int
+        The largest number of workers the dataset will be loaded with.
+
+    """
+
+    def __init__(self, dataset: Dataset, max_workers: int):
+        """Build ``_TimedDataset``."""
+        self.dataset = dataset
+        self.busy = zeros(max(max_workers, 1), dtype=float64).share_memory_()
+
+    def __len__(self) -> int:
+        """Return the length of the wrapped dataset.
+
+        Returns
+        -------
+        int
+            The number of items in the dataset.
+
+        """
+        return len(self.dataset)  # type: ignore
+
+    def __getitem__(self, idx: int) -> Any:
+        """Fetch the item at ``idx``, adding the time taken to ``self.busy``.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the item.
+
+        Returns
+        -------
+        Any
+            The item.
+
+        """
+        start = perf_counter()
+        item = self.dataset[idx]
+        info = get_worker_info()
+        self.busy[info.id if info is not None else 0] += perf_counter() - start
+        return item
+
+
+def _rss_bytes() -> int:
+    """Return the resident set size of this process and its children.
+
+    Returns
+    -------
+    int
+        The summed resident set size, in bytes, or zero if ``/proc`` is not
+        available.
+
+    Notes
+    -----
+    Pages shared between processes are counted once per process, so the
+    total is an upper bound.
+
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 0
+    pids = [str(os.getpid())]
+
+    try:
+        for task in Path("/proc/self/task").iterdir():
+            pids.extend((task / "children").read_text(encoding="ascii").split())
+    except OSError:
+        pass
+
+    total = 0
+    for pid in pids:
+        try:
+            total += int(
+                Path(f"/proc/{pid}/statm").read_text(encoding="ascii").split()[1]
+            )
+        except (OSError, IndexError, ValueError):
+            continue
+
+    return total * page_size
+
+
+def _run_trial(
+    dataset: Dataset,
+    model: Module,
+    loader_kwargs: Dict[str, Any],
+    num_batches: int,
+) -> Dict[str, float]:
+    """Time ``num_batches`` batches of ``dataset`` through ``model``.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset to load.
+    model : Module
+        The model to pass each batch's inputs through.
+    loader_kwargs : Dict[str, Any]
+        The ``DataLoader`` settings to try.
+    num_batches : int
+        The number of batches to time.
+
+    Returns
+    -------
+    Dict[str, float]
+        The throughput (``"samples_per_sec"``), the fraction of the workers'
+        time spent waiting rather than fetching (``"worker_idle"``) and the
+        peak resident set size (``"peak_rss_bytes"``).
+
+    Notes
+    -----
+    The first batch is not included in the throughput, so worker start-up
+    does not count against settings with many workers.
+
+    """
+    num_workers = loader_kwargs["num_workers"]
+    timed = _TimedDataset(dataset, num_workers)
+    loader = DataLoader(timed, **loader_kwargs)
+    device = next(model.parameters(), zeros(0)).device
+
+    peak_rss, samples, first_done = _rss_bytes(), 0, 0.0
+    start = perf_counter()
+
+    with no_grad():
+        for batch_idx, batch in enumerate(loader):
+            inputs = batch[0] if isinstance(batch, (list, tuple)) else batch
+            if isinstance(inputs, Tensor):
+                _ = model(inputs.to(device))
+            peak_rss = max(peak_rss, _rss_bytes())
+
+            if batch_idx == 0:
+                first_done = perf_counter()
+            else:
+                samples += len(inputs)
+
+            if batch_idx + 1 == num_batches:
+                break
+
+    stop = perf_counter()
+    del loader
+
+    if samples == 0:
+        samples, first_done = len(inputs), start
+
+    busy = float(timed.busy.sum())
+    idle = 1.0 - busy / (num_workers * (stop - start)) if num_workers > 0 else 0.0
+
+    return {
+        "samples_per_sec": samples / max(stop - first_done, 1e-9),
+        "worker_idle": min(max(idle, 0.0), 1.0),
+        "peak_rss_bytes": float(peak_rss),
+    }
+
+
+def _warm_up(dataset: Dataset, num_samples: int):
+    """Fetch the first ``num_samples`` items of ``dataset``, once.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset.
+    num_samples : int
+        The number of items to fetch.
+
+    Notes
+    -----
+    Every trial loads the same first items. Fetching them once before the
+    trials fills the dataset's sample cache (with ``cache_bytes`` or
+    ``cache_dir``) and the operating system's page cache, so the first
+    trial isn't penalised for filling them for the rest.
+
+    """
+    for idx in range(min(num_samples, len(dataset))):  # type: ignore
+        _ = dataset[idx]
+
+
+def _search_space(
+    num_workers: Sequence[int],
+    prefetch_factors: Sequence[int],
+    batch_sizes: Sequence[int],
+) -> List[Dict[str, Any]]:
+    """List the ``DataLoader`` settings to try.
+
+    Parameters
+    ----------
+    num_workers : Sequence[int]
+        The numbers of workers to try.
+    prefetch_factors : Sequence[int]
+        The prefetch factors to try.
+    batch_sizes : Sequence[int]
+        The batch sizes to try.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        ``DataLoader`` keyword arguments for each combination. Without
+        workers, there is nothing to prefetch, so ``prefetch_factor`` is only
+        varied when ``num_workers`` is positive.
+
+    """
+    space = []
+    for batch_size, workers in product(batch_sizes, num_workers):
+        factors = prefetch_factors if workers > 0 else [None]
+        for factor in factors:
+            space.append(
+                {
+                    "batch_size": batch_size,
+                    "num_workers": workers,
+                    "prefetch_factor": factor,
+                }
+            )
+    return space
+
+
+def _fingerprint(
+    dataset: Dataset,
+    model: Module,
+    space: List[Dict[str, Any]],
+    max_rss_bytes: Optional[int],
+) -> str:
+    """Hash the machine, dataset, model and search space.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset being tuned for.
+    model : Module
+        The candidate model.
+    space : List[Dict[str, Any]]
+        The search space.
+    max_rss_bytes : int, optional
+        The memory cap.
+
+    Returns
+    -------
+    str
+        A hex digest identifying the tuning problem.
+
+    Notes
+    -----
+    Only stable properties are hashed: the model's type and the names,
+    shapes, dtypes and devices of its parameters and buffers, and the
+    dataset's type, length and the shapes and dtypes (or, for non-tensors,
+    the types) of its first item's parts. Reprs can hold memory addresses,
+    paths or values which change from run to run.
+
+    """
+    first = dataset[0]
+    parts = first if isinstance(first, (list, tuple)) else (first,)
+    tensors = chain(model.named_parameters(), model.named_buffers())
+
+    key = {
+        "machine": [
+            platform.node(),
+            platform.machine(),
+            os.cpu_count(),
+            torch_version,
+        ],
+        "dataset": [
+            type(dataset).__name__,
+            len(dataset),  # type: ignore
+            [
+                (
+                    [list(x.shape), str(x.dtype)]
+                    if isinstance(x, Tensor)
+                    else type(x).__name__
+                )
+                for x in parts
+            ],
+        ],
+        "model": [
+            type(model).__name__,
+            [[name, list(x.shape), str(x.dtype), str(x.device)] for name, x in tensors],
+        ],
+        "space": space,
+        "max_rss_bytes": max_rss_bytes,
+    }
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def _default_cache_dir() -> Path:
+    """Return the default directory for the tuning cache.
+
+    Returns
+    -------
+    Path
+        ``$XDG_CACHE_HOME/torch_tools``, or ``~/.cache/torch_tools``.
+
+    """
+    root = os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
+    return Path(root) / "torch_tools"
+
+
+def _read_cache(cache_file: Path) -> Dict[str, Any]:
+    """Read the tuning cache, treating unreadable files as empty.
+
+    Parameters
+    ----------
+    cache_file : Path
+        The cache's path.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The cached results, keyed by fingerprint.
+
+    """
+    try:
+        return json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_file: Path, fingerprint: str, entry: Dict[str, Any]):
+    """Add ``entry`` to the tuning cache (atomically).
+
+    Parameters
+    ----------
+    cache_file : Path
+        The cache's path.
+    fingerprint : str
+        The key to store ``entry`` under.
+    entry : Dict[str, Any]
+        The tuning results.
+
+    """
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    cache = _read_cache(cache_file)
+    cache[fingerprint] = entry
+
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp_file.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    os.replace(tmp_file, cache_file)
+
+
+def _process_int_arg(value: int, name: str, minimum: int) -> int:
+    """Check ``value`` is an int no less than ``minimum``.
+
+    Parameters
+    ----------
+    value : int
+        The value to check.
+    name : str
+        The name of the argument, for the error messages.
+    minimum : int
+        The smallest allowed value.
+
+    Returns
+    -------
+    int
+        ``value``.
+
+    Raises
+    ------
+    TypeError
+        If ``value`` is not an int.
+    ValueError
+        If ``value`` is less than ``minimum``.
+
+    """
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"'{name}' should be an int. Got '{type(value)}'.")
+    if value < minimum:
+        raise ValueError(f"'{name}' should be at least {minimum}. Got '{value}'.")
+    return value
+
+
+def tune_data_loader(
+    dataset: Dataset,
+    model: Module,
+    num_workers: Sequence[int] = (0, 2, 4, 8),
+    prefetch_factors: Sequence[int] = (2, 4),
+    batch_sizes: Sequence[int] = (32, 64, 128),
+    num_batches: int = 20,
+    max_rss_bytes: Optional[int] = None,
+    cache_dir: Optional[Path] = None,
+    retune: bool = False,
+) -> Dict[str, Any]:
+    """Choose ``DataLoader`` settings for ``dataset`` by timing short trials.
+
+    Each combination of ``num_workers``, ``prefetch_factors`` and
+    ``batch_sizes`` is tried by loading ``num_batches`` batches and passing
+    their inputs through ``model``. The settings with the highest throughput
+    whose peak memory use is under ``max_rss_bytes`` are returned.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset to tune the loader for—usually a ``DataSet``.
+    model : Module
+        The candidate model, which each batch of inputs is passed through
+        (without gradients). It should already be on the device it will be
+        trained on.
+    num_workers : Sequence[int], optional
+        The numbers of workers to try.
+    prefetch_factors : Sequence[int], optional
+        The prefetch factors to try (when there are workers).
+    batch_sizes : Sequence[int], optional
+        The batch sizes to try.
+    num_batches : int, optional
+        The number of batches to load in each trial.
+    max_rss_bytes : int, optional
+        Settings whose peak resident set size—of this process and its
+        workers—exceeds this many bytes are rejected. If ``None``, there is
+        no cap.
+    cache_dir : Path, optional
+        Directory of the results cache. Defaults to
+        ``~/.cache/torch_tools`` (or ``$XDG_CACHE_HOME/torch_tools``).
+    retune : bool, optional
+        If ``True``, ignore cached results and rerun the trials.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Keyword arguments for ``DataLoader``: ``batch_size``, ``num_workers``
+        and ``prefetch_factor``.
+
+    Raises
+    ------
+    TypeError
+        If ``model`` is not a ``Module``, or ``cache_dir`` is not a ``Path``.
+    ValueError
+        If the search space, or ``dataset``, is empty.
+    RuntimeError
+        If no settings fit under ``max_rss_bytes``.
+
+    Notes
+    -----
+    Results are cached in ``cache_dir``, keyed by a fingerprint of the
+    machine, the dataset (its type, length, and the shapes and dtypes of its
+    first item), the model (its type, and its parameters' and buffers' names,
+    shapes and dtypes) and the search space. Later calls with the same
+    fingerprint return the cached settings straight away. The measurements
+    from every trial (samples per second, worker idle fraction and peak
+    resident set size) are stored alongside them.
+
+    The model is put in eval mode for the trials, so they don't update its
+    batch-norm statistics, and its previous mode is restored afterwards.
+    The items the trials load are fetched once beforehand, so a dataset's
+    sample cache is warm for every trial: the throughputs are those of
+    epochs after the first.
+
+    Peak memory is read from ``/proc``, so the cap is only enforced on Linux.
+
+    Examples
+    --------
+    >>> from torch.utils.data import DataLoader
+    >>> from torch_tools.datasets import DataSet, tune_data_loader
+    >>> dataset = DataSet(inputs=..., targets=..., input_tfms=...)
+    >>> loader_kwargs = tune_data_loader(dataset, model, max_rss_bytes=2**34)
+    >>> loader = DataLoader(dataset, shuffle=True, **loader_kwargs)
+
+    """
+    if not isinstance(model, Module):
+        msg = f"'model' should be a 'torch.nn.Module'. Got '{type(model)}'."
+        raise TypeError(msg)
+    if not isinstance(cache_dir, (Path, type(None))):
+        msg = f"'cache_dir' should be a 'Path' or 'None'. Got '{type(cache_dir)}'."
+        raise TypeError(msg)
+
+    _ = list(map(lambda x: _process_int_arg(x, "num_workers", 0), num_workers))
+    _ = list(
+        map(lambda x: _process_int_arg(x, "prefetch_factors", 1), prefetch_factors)
+    )
+    _ = list(map(lambda x: _process_int_arg(x, "batch_sizes", 1), batch_sizes))
+    _process_int_arg(num_batches, "num_batches", 1)
+    if max_rss_bytes is not None:
+        _process_int_arg(max_rss_bytes, "max_rss_bytes", 1)
+
+    space = _search_space(num_workers, prefetch_factors, batch_sizes)
+    if len(space) == 0:
+        raise ValueError("The search space of loader settings is empty.")
+    if len(dataset) == 0:  # type: ignore
+        raise ValueError("Cannot tune a loader for an empty dataset.")
+
+    cache_file = (cache_dir or _default_cache_dir()) / _CACHE_FILE
+    fingerprint = _fingerprint(dataset, model, space, max_rss_bytes)
+
+    if process_boolean_arg(retune) is False:
+        cached = _read_cache(cache_file).get(fingerprint)
+        if cached is not None:
+            return cached["best"]
+
+    _warm_up(dataset, max(batch_sizes) * num_batches)
+
+    training = model.training
+    model.eval()
+    try:
+        trials: List[Dict[str, Any]] = [
+            {"loader_kwargs": kwargs, **_run_trial(dataset, model, kwargs, num_batches)}
+            for kwargs in space
+        ]
+    finally:
+        model.train(training)
+
+    allowed = [
+        trial
+        for trial in trials
+        if max_rss_bytes is None or trial["peak_rss_bytes"] <= max_rss_bytes
+    ]
+    if len(allowed) == 0:
+        msg = f"No loader settings fit under 'max_rss_bytes'={max_rss_bytes}. "
+        msg += f"Lowest peak RSS was {min(t['peak_rss_bytes'] for t in trials)}."
+        raise RuntimeError(msg)
+
+    best = max(allowed, key=lambda x: x["samples_per_sec"])["loader_kwargs"]
+    _write_cache(cache_file, fingerprint, {"best": best, "trials": trials})
+    return best
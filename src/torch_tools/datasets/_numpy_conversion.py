@@ -0,0 +1,167 @@
+"""Conversion of numpy arrays to tensors for `torch_tools.datasets`."""
+from typing import Optional, Sequence, Any
+from warnings import warn, catch_warnings, simplefilter
+
+from numpy import ndarray, ascontiguousarray
+from numpy import empty as empty_array
+
+from torch import Tensor, from_numpy, empty  # pylint: disable=no-name-in-module
+from torch import dtype as torch_dtype  # pylint: disable=no-name-in-module
+
+
+def ndarray_to_tensor(
+    array: ndarray,
+    dtype: Optional[torch_dtype] = None,
+    hwc_to_chw: bool = False,
+) -> Tensor:
+    """Convert ``array`` to a ``Tensor``, avoiding copies where possible.
+
+    Parameters
+    ----------
+    array : ndarray
+        The array to convert.
+    dtype : torch.dtype, optional
+        The dtype the returned ``Tensor`` should have. If ``None``, the
+        ``Tensor`` keeps the dtype of ``array``.
+    hwc_to_chw : bool, optional
+        If ``True``, three-dimensional arrays are taken to be ``(H, W, C)``
+        images, and are permuted to ``(C, H, W)``. Arrays with any other
+        number of dimensions are not permuted.
+
+    Returns
+    -------
+    Tensor
+        ``array`` as a ``Tensor``.
+
+    Raises
+    ------
+    TypeError
+        If ``array`` is not an ``ndarray``.
+
+    Notes
+    -----
+    If ``array`` is writable, and no change of dtype is requested, the
+    returned ``Tensor`` shares its memory with ``array`` (the permutation
+    to channels-first is a view, not a copy). If a dtype change is requested,
+    the cast and the permutation happen together in a single copy. Read-only
+    arrays are always copied, because writing to a ``Tensor`` which views
+    read-only memory is undefined.
+
+    """
+    if not isinstance(array, ndarray):
+        msg = f"'array' should be a numpy ndarray. Got '{type(array)}'."
+        raise TypeError(msg)
+
+    writable = array.flags.writeable
+    tensor = _view_as_tensor(_torch_compatible(array))
+
+    if hwc_to_chw and tensor.dim() == 3:
+        tensor = tensor.permute(2, 0, 1)
+
+    out_dtype = tensor.dtype if dtype is None else dtype
+
+    if (out_dtype == tensor.dtype) and writable:
+        return tensor
+
+    out = empty(tensor.shape, dtype=out_dtype)
+    return out.copy_(tensor)
+
+
+def _torch_compatible(array: ndarray) -> ndarray:
+    """Return ``array``, or a copy of it, which ``torch.from_numpy`` accepts.
+
+    Parameters
+    ----------
+    array : ndarray
+        The array to check.
+
+    Returns
+    -------
+    ndarray
+        ``array`` itself if ``torch`` can view it directly. Otherwise, a
+        native-byte-order copy with non-negative strides.
+
+    """
+    if array.dtype.byteorder not in ("=", "|"):
+        array = array.astype(array.dtype.newbyteorder("="))
+    if any(map(lambda x: x < 0, array.strides)):
+        array = ascontiguousarray(array)
+    return array
+
+
+def _view_as_tensor(array: ndarray) -> Tensor:
+    """View ``array`` as a ``Tensor`` without copying it.
+
+    Parameters
+    ----------
+    array : ndarray
+        The array to view.
+
+    Returns
+    -------
+    Tensor
+        A ``Tensor`` sharing memory with ``array``.
+
+    Notes
+    -----
+    ``torch.from_numpy`` warns if ``array`` is read-only. We silence that
+    warning here because ``ndarray_to_tensor`` never hands the read-only view
+    back to the user.
+
+    """
+    with catch_warnings():
+        simplefilter("ignore", UserWarning)
+        return from_numpy(array)
+
+
+def shares_memory(array: ndarray, dtype: Optional[torch_dtype] = None) -> bool:
+    """Return whether ``ndarray_to_tensor`` would view ``array`` zero-copy.
+
+    Parameters
+    ----------
+    array : ndarray
+        The array to convert.
+    dtype : torch.dtype, optional
+        The dtype requested of the ``Tensor``.
+
+    Returns
+    -------
+    bool
+        ``True`` if the ``Tensor`` would share its memory with ``array``.
+
+    """
+    if not array.flags.writeable:
+        return False
+    if array.dtype.byteorder not in ("=", "|"):
+        return False
+    if any(map(lambda x: x < 0, array.strides)):
+        return False
+    return dtype is None or _view_as_tensor(empty_array(0, array.dtype)).dtype == dtype
+
+
+def warn_if_writable(
+    items: Sequence[Any],
+    name: str,
+    dtype: Optional[torch_dtype] = None,
+):
+    """Warn if any of the arrays in ``items`` would be viewed, not copied.
+
+    Parameters
+    ----------
+    items : Sequence[Any]
+        The dataset's inputs or targets.
+    name : str
+        The name of ``items`` to use in the warning.
+    dtype : torch.dtype, optional
+        The dtype the arrays are converted to. Arrays which need casting are
+        copied, so don't share memory with their tensors.
+
+    """
+    arrays = filter(lambda x: isinstance(x, ndarray), items)
+    if any(map(lambda x: shares_memory(x, dtype), arrays)):
+        msg = f"Some of the dataset's '{name}' are writable numpy arrays. "
+        msg += "The tensors produced from these arrays share memory with "
+        msg += "them, so in-place transforms will modify the dataset's "
+        msg += "arrays (and vice versa). Use 'arr.setflags(write=False)' to "
+        msg += "have such arrays copied instead."
+        warn(msg, UserWarning)
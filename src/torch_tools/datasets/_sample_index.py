@@ -0,0 +1,554 @@
+"""SQLite index of a dataset's samples and their metadata."""
+import sqlite3
+from array import array
+from pathlib import Path
+from itertools import islice
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from torch_tools.datasets._dataset import DataSet
+from torch_tools.datasets._indexed_column import IndexedColumn
+
+
+# pylint: disable=too-many-arguments
+
+_COLUMN_TYPES = ("TEXT", "INTEGER", "REAL")
+
+_BASE_COLUMNS = {
+    "sample_id": "TEXT",
+    "path": "TEXT",
+    "archive": "TEXT",
+    "offset": "INTEGER",
+    "size": "INTEGER",
+}
+
+_FETCH_SIZE = 10_000
+
+
+class SampleIndex:
+    """Index of a dataset's samples, and their metadata, in SQLite.
+
+    Each sample has a unique ``sample_id``, the ``path`` given to the
+    dataset's transforms and, optionally, the ``archive`` it is stored in
+    with its byte ``offset`` and ``size`` there. Any number of metadata
+    columns (patient, site, label, date, etc.) can be declared, each of which
+    is indexed so filtered queries are answered by SQLite rather than by
+    Python loops over lists of records.
+
+    Parameters
+    ----------
+    index_path : Path
+        The path of the index (an SQLite database). It is created if it
+        doesn't exist.
+    columns : Dict[str, str], optional
+        The metadata columns, mapping each column's name to its type
+        (``"TEXT"``, ``"INTEGER"`` or ``"REAL"``). Columns which are not yet
+        in the index are added to it.
+
+    Examples
+    --------
+    >>> from pathlib import Path
+    >>> from torch_tools.datasets import SampleIndex
+    >>> index = SampleIndex(
+            Path("samples.sqlite"),
+            columns={"site": "TEXT", "label": "INTEGER", "date": "TEXT"},
+        )
+    >>> index.add(
+            {"sample_id": img.stem, "path": str(img), "site": site, ...}
+            for img, site, ... in records
+        )
+    >>> train_set = index.dataset(
+            target_column="label",
+            filters={"site": ["Rivendell", "Lorien"]},
+            where="date < ?",
+            params=("2024-01-01",),
+            input_tfms=tfms,
+        )
+
+    Notes
+    -----
+    A query streams the rowids of the matching samples out of SQLite, and the
+    ``DataSet`` it builds reads each sample's path (and target) from the
+    index when the sample is fetched. See
+    ``torch_tools.datasets._indexed_column.IndexedColumn``.
+
+    """
+
+    def __init__(self, index_path: Path, columns: Optional[Dict[str, str]] = None):
+        """Build ``SampleIndex``."""
+        if not isinstance(index_path, Path):
+            msg = f"'index_path' should be a 'Path'. Got '{type(index_path)}'."
+            raise TypeError(msg)
+        self._index_path = index_path
+        self._columns = dict(_BASE_COLUMNS)
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS samples (
+                    sample_id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    archive TEXT,
+                    offset INTEGER,
+                    size INTEGER
+                )"""
+            )
+            for name, kind in conn.execute(
+                "SELECT name, type FROM pragma_table_info('samples')"
+            ):
+                self._columns[name] = kind
+            for name, kind in self._process_columns(columns).items():
+                self._add_column(conn, name, kind)
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connect to the index.
+
+        Returns
+        -------
+        sqlite3.Connection
+            A connection to the index.
+
+        """
+        conn = sqlite3.connect(self._index_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _process_columns(columns: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Check the metadata column declarations.
+
+        Parameters
+        ----------
+        columns : Dict[str, str], optional
+            The metadata columns.
+
+        Returns
+        -------
+        Dict[str, str]
+            The columns, with their types in upper case.
+
+        Raises
+        ------
+        TypeError
+            If ``columns`` is not a dict (or ``None``).
+        ValueError
+            If a column's name is not an identifier, or its type is not
+            allowed.
+
+        """
+        if columns is None:
+            return {}
+        if not isinstance(columns, dict):
+            msg = f"'columns' should be a dict or None. Got '{type(columns)}'."
+            raise TypeError(msg)
+
+        processed = {}
+        for name, kind in columns.items():
+            if not (isinstance(name, str) and name.isidentifier()):
+                msg = f"Column names should be identifiers. Got '{name}'."
+                raise ValueError(msg)
+            if str(kind).upper() not in _COLUMN_TYPES:
+                msg = f"Column types should be one of {_COLUMN_TYPES}. Got "
+                msg += f"'{kind}' for column '{name}'."
+                raise ValueError(msg)
+            processed[name] = str(kind).upper()
+        return processed
+
+    def _add_column(self, conn: sqlite3.Connection, name: str, kind: str):
+        """Add the metadata column ``name`` to the index, if it is new.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            A connection to the index.
+        name : str
+            The column's name.
+        kind : str
+            The column's type.
+
+        Raises
+        ------
+        ValueError
+            If the column exists with a different type.
+
+        """
+        if name in self._columns:
+            if self._columns[name] != kind:
+                msg = f"Column '{name}' already has type "
+                msg += f"'{self._columns[name]}'. Got '{kind}'."
+                raise ValueError(msg)
+            return
+        conn.execute(f"ALTER TABLE samples ADD COLUMN {name} {kind}")
+        conn.execute(f"CREATE INDEX samples_{name} ON samples ({name})")
+        self._columns[name] = kind
+
+    @property
+    def columns(self) -> Dict[str, str]:
+        """Map each of the index's columns to its type.
+
+        Returns
+        -------
+        Dict[str, str]
+            The columns and their types.
+
+        """
+        return dict(self._columns)
+
+    def _check_column(self, name: str):
+        """Check ``name`` is one of the index's columns.
+
+        Parameters
+        ----------
+        name : str
+            The column name.
+
+        Raises
+        ------
+        ValueError
+            If ``name`` is not a column.
+
+        """
+        if name not in self._columns:
+            msg = f"'{name}' is not a column of the index. Choose from "
+            msg += f"{list(self._columns)}."
+            raise ValueError(msg)
+
+    def add(self, samples: Iterable[Dict[str, Any]], batch_size: int = 10_000):
+        """Add ``samples`` to the index, replacing any with the same id.
+
+        Parameters
+        ----------
+        samples : Iterable[Dict[str, Any]]
+            The samples, each a dict mapping column names to values. Each
+            must have a ``"sample_id"`` and a ``"path"``. ``samples`` is
+            consumed in batches, so it can be a generator.
+        batch_size : int, optional
+            The number of samples inserted at a time.
+
+        Raises
+        ------
+        ValueError
+            If a sample has a key which is not a column, or is missing its
+            ``"sample_id"`` or ``"path"``.
+
+        Notes
+        -----
+        A replaced sample keeps its rowid, so datasets built from earlier
+        queries see its new values. Columns not given for it are cleared.
+
+        """
+        samples = iter(samples)
+        with closing(self._connect()) as conn:
+            while batch := list(islice(samples, batch_size)):
+                for keys in {tuple(sorted(x)) for x in batch}:
+                    self._insert(
+                        conn, keys, [x for x in batch if tuple(sorted(x)) == keys]
+                    )
+            conn.commit()
+
+    def _insert(
+        self,
+        conn: sqlite3.Connection,
+        keys: Tuple[str, ...],
+        samples: List[Dict[str, Any]],
+    ):
+        """Insert ``samples``, which all have the columns ``keys``.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            A connection to the index.
+        keys : Tuple[str, ...]
+            The columns given for each sample.
+        samples : List[Dict[str, Any]]
+            The samples.
+
+        Raises
+        ------
+        ValueError
+            If a key is not a column, or ``"sample_id"`` or ``"path"`` is
+            missing.
+
+        """
+        _ = list(map(self._check_column, keys))
+        if not {"sample_id", "path"}.issubset(keys):
+            msg = "Each sample should have a 'sample_id' and a 'path'. Got "
+            msg += f"keys {list(keys)}."
+            raise ValueError(msg)
+
+        # An upsert, rather than INSERT OR REPLACE, so the rowid is kept
+        columns, marks = ", ".join(keys), ", ".join("?" * len(keys))
+        updates = ", ".join(
+            f"{name} = excluded.{name}" if name in keys else f"{name} = NULL"
+            for name in self._columns
+            if name != "sample_id"
+        )
+        conn.executemany(
+            f"""INSERT INTO samples ({columns}) VALUES ({marks})
+            ON CONFLICT (sample_id) DO UPDATE SET {updates}""",
+            (tuple(x[key] for key in keys) for x in samples),
+        )
+
+    def remove(self, sample_ids: Iterable[str]):
+        """Remove the samples with ``sample_ids`` from the index.
+
+        Parameters
+        ----------
+        sample_ids : Iterable[str]
+            The ids of the samples to remove.
+
+        """
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "DELETE FROM samples WHERE sample_id = ?",
+                ((x,) for x in sample_ids),
+            )
+            conn.commit()
+
+    def _query(
+        self,
+        filters: Optional[Dict[str, Any]],
+        where: Optional[str],
+        params: Sequence[Any],
+    ) -> Tuple[str, List[Any]]:
+        """Build the ``WHERE`` clause, and its parameters, of a query.
+
+        Parameters
+        ----------
+        filters : Dict[str, Any], optional
+            See ``self.select``.
+        where : str, optional
+            See ``self.select``.
+        params : Sequence[Any]
+            See ``self.select``.
+
+        Returns
+        -------
+        str
+            The clause (empty if there are no conditions).
+        List[Any]
+            The clause's parameters.
+
+        """
+        conditions: List[str] = []
+        values: List[Any] = []
+        for name, value in (filters or {}).items():
+            self._check_column(name)
+            if isinstance(value, (list, tuple, set)):
+                conditions.append(f"{name} IN ({', '.join('?' * len(value))})")
+                values.extend(value)
+            else:
+                conditions.append(f"{name} = ?")
+                values.append(value)
+
+        if where is not None:
+            conditions.append(f"({where})")
+            values.extend(params)
+
+        clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return clause, values
+
+    def select(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        where: Optional[str] = None,
+        params: Sequence[Any] = (),
+        order_by: str = "sample_id",
+    ) -> array:
+        """Return the rowids of the samples matching a query.
+
+        Parameters
+        ----------
+        filters : Dict[str, Any], optional
+            Map column names to the value they should equal, or to a list of
+            values they should be one of.
+        where : str, optional
+            An SQL condition the samples should meet as well, with ``?``
+            placeholders for its ``params``—for example
+            ``"date BETWEEN ? AND ?"``.
+        params : Sequence[Any], optional
+            The values of the placeholders in ``where``.
+        order_by : str, optional
+            The column to order the samples by.
+
+        Returns
+        -------
+        array
+            The matching samples' rowids, as 64-bit integers.
+
+        """
+        self._check_column(order_by)
+        clause, values = self._query(filters, where, params)
+        rowids = array("q")
+
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                f"SELECT rowid FROM samples{clause} ORDER BY {order_by}",
+                values,
+            )
+            while rows := cursor.fetchmany(_FETCH_SIZE):
+                rowids.extend(x for (x,) in rows)
+
+        return rowids
+
+    def count(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        where: Optional[str] = None,
+        params: Sequence[Any] = (),
+    ) -> int:
+        """Count the samples matching a query.
+
+        Parameters
+        ----------
+        filters : Dict[str, Any], optional
+            See ``self.select``.
+        where : str, optional
+            See ``self.select``.
+        params : Sequence[Any], optional
+            See ``self.select``.
+
+        Returns
+        -------
+        int
+            The number of matching samples.
+
+        """
+        clause, values = self._query(filters, where, params)
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM samples{clause}", values
+            ).fetchone()[0]
+
+    def __len__(self) -> int:
+        """Return the number of samples in the index.
+
+        Returns
+        -------
+        int
+            The number of samples.
+
+        """
+        return self.count()
+
+    def column(
+        self,
+        name: str,
+        rowids: array,
+        as_path: Optional[bool] = None,
+    ) -> IndexedColumn:
+        """Return a lazy sequence of the values of column ``name``.
+
+        Parameters
+        ----------
+        name : str
+            The column.
+        rowids : array
+            The rowids of the samples (see ``self.select``).
+        as_path : bool, optional
+            Whether to return the values as ``Path``s, rather than as
+            tensors. If ``None``, ``TEXT`` columns are returned as paths.
+
+        Returns
+        -------
+        IndexedColumn
+            The column's values.
+
+        """
+        self._check_column(name)
+        if as_path is None:
+            as_path = self._columns[name] == "TEXT"
+        return IndexedColumn(self._index_path, name, rowids, as_path)
+
+    def dataset(
+        self,
+        input_column: str = "path",
+        target_column: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        where: Optional[str] = None,
+        params: Sequence[Any] = (),
+        order_by: str = "sample_id",
+        **dataset_kwargs,
+    ) -> DataSet:
+        """Build a ``DataSet`` of the samples matching a query.
+
+        Parameters
+        ----------
+        input_column : str, optional
+            The column holding the inputs (usually their paths).
+        target_column : str, optional
+            The column holding the targets. ``TEXT`` targets are given to the
+            target transforms as paths, and numeric targets as scalar
+            tensors. If ``None``, the dataset has no targets.
+        filters : Dict[str, Any], optional
+            See ``self.select``.
+        where : str, optional
+            See ``self.select``.
+        params : Sequence[Any], optional
+            See ``self.select``.
+        order_by : str, optional
+            See ``self.select``.
+        dataset_kwargs
+            Keyword arguments passed on to ``DataSet`` (``input_tfms``,
+            ``target_tfms``, etc.).
+
+        Returns
+        -------
+        DataSet
+            The dataset.
+
+        Raises
+        ------
+        ValueError
+            If no samples match the query.
+
+        """
+        rowids = self.select(filters, where, params, order_by)
+        if len(rowids) == 0:
+            raise ValueError("No samples in the index match the query.")
+
+        return DataSet(
+            inputs=self.column(input_column, rowids),
+            targets=self.column(target_column, rowids) if target_column else None,
+            **dataset_kwargs,
+        )
+
+    def read_bytes(self, sample_id: str) -> bytes:
+        """Read the raw bytes of the sample ``sample_id``.
+
+        If the sample has an ``archive``, ``offset`` and ``size``, they are
+        read directly from the archive, with a single seek. Otherwise, the
+        file at its ``path`` is read.
+
+        Parameters
+        ----------
+        sample_id : str
+            The id of the sample.
+
+        Returns
+        -------
+        bytes
+            The sample's bytes.
+
+        Raises
+        ------
+        KeyError
+            If there is no sample with id ``sample_id``.
+
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT path, archive, offset, size FROM samples WHERE sample_id = ?",
+                (sample_id,),
+            ).fetchone()
+
+        if row is None:
+            raise KeyError(f"There is no sample with id '{sample_id}'.")
+
+        path, archive, offset, size = row
+        if archive is None or offset is None or size is None:
+            return Path(path).read_bytes()
+
+        with open(archive, "rb") as file:
+            file.seek(offset)
+            return file.read(size)
@@ -0,0 +1,463 @@
+"""Sample cache which lives in shared memory."""
+import os
+import sys
+from typing import Optional, Tuple, Dict, Any, List
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+from numpy import ndarray, int64, zeros as np_zeros
+
+from torch import Tensor, frombuffer, uint8  # pylint: disable=no-name-in-module
+import torch
+
+
+# pylint: disable=too-many-instance-attributes
+
+_DTYPES = (
+    torch.float32,
+    torch.float64,
+    torch.float16,
+    torch.bfloat16,
+    torch.uint8,
+    torch.int8,
+    torch.int16,
+    torch.int32,
+    torch.int64,
+    torch.bool,
+)
+
+_MAX_TENSORS = 2
+_MAX_DIMS = 6
+_TENSOR_FIELDS = 2 + _MAX_DIMS
+_ROW_FIELDS = 4 + _MAX_TENSORS * _TENSOR_FIELDS
+_HEADER_FIELDS = 5
+_ALIGN = 8
+
+# Indices of the header fields.
+_HEAD, _QUEUE_START, _QUEUE_LEN, _HITS, _MISSES = range(_HEADER_FIELDS)
+
+# Indices of the fields in each row of the index.
+_VALID, _OFFSET, _NBYTES, _NUM_TENSORS = range(4)
+
+
+class SharedSampleCache:
+    """Cache of dataset samples shared by every ``DataLoader`` worker.
+
+    The samples are stored in a fixed-size block of shared memory, and an
+    index, also in shared memory, records where each sample lives. When a
+    worker process stores a sample, it is a cache hit for every other worker
+    (and the main process) from then on.
+
+    Parameters
+    ----------
+    num_items : int
+        The number of items in the dataset the cache serves.
+    max_bytes : int
+        The size, in bytes, of the shared-memory block the samples are
+        stored in.
+
+    Notes
+    -----
+    — Samples are stored in a ring buffer, and the eviction policy is
+    first-in-first-out: when there is no room for a new sample, the oldest
+    samples are evicted until there is.
+
+    — Only samples consisting of one or two tensors, each with no more than
+    six dimensions, are cached. Samples larger than ``max_bytes`` are never
+    cached.
+
+    — The shared memory is released when the cache created by the main
+    process is garbage collected, or when ``close`` is called.
+
+    """
+
+    def __init__(self, num_items: int, max_bytes: int):
+        """Build ``SharedSampleCache``."""
+        self._num_items = _process_positive_int(num_items, "num_items", 0)
+        self._max_bytes = _process_positive_int(max_bytes, "max_bytes", 1)
+
+        index_fields = _HEADER_FIELDS + self._num_items * (_ROW_FIELDS + 1)
+        self._index_shm = SharedMemory(create=True, size=8 * index_fields)
+        self._data_shm = SharedMemory(create=True, size=self._max_bytes)
+        self._creator_pid = os.getpid()
+
+        self._lock = get_context("spawn").Lock()
+        self._map_buffers()
+        self._header[:] = 0
+        self._rows[:] = 0
+
+    _header: ndarray
+    _rows: ndarray
+    _queue: ndarray
+    _arena: Tensor
+
+    def _map_buffers(self):
+        """View the shared-memory blocks as arrays."""
+        index = ndarray(
+            (_HEADER_FIELDS + self._num_items * (_ROW_FIELDS + 1),),
+            dtype=int64,
+            buffer=self._index_shm.buf,
+        )
+        self._header = index[:_HEADER_FIELDS]
+        rows_end = _HEADER_FIELDS + self._num_items * _ROW_FIELDS
+        self._rows = index[_HEADER_FIELDS:rows_end].reshape(-1, _ROW_FIELDS)
+        self._queue = index[rows_end:]
+        self._arena = frombuffer(self._data_shm.buf, dtype=uint8)
+
+    @property
+    def hits(self) -> int:
+        """int: The number of cache hits, summed over all processes."""
+        return int(self._header[_HITS])
+
+    @property
+    def misses(self) -> int:
+        """int: The number of cache misses, summed over all processes."""
+        return int(self._header[_MISSES])
+
+    def get(self, idx: int) -> Optional[Tuple[Tensor, ...]]:
+        """Return the sample at ``idx``, or ``None`` if it is not cached.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the sample in the dataset.
+
+        Returns
+        -------
+        Tuple[Tensor, ...] or None
+            Copies of the cached tensors, or ``None`` on a cache miss.
+
+        """
+        with self._lock:
+            row = self._rows[idx]
+            if row[_VALID] == 0:
+                self._header[_MISSES] += 1
+                return None
+            self._header[_HITS] += 1
+            offset, nbytes = int(row[_OFFSET]), int(row[_NBYTES])
+            raw = self._arena[offset : offset + nbytes].clone()
+            meta = row[_NUM_TENSORS:].copy()
+
+        return _unpack(raw, meta)
+
+    def put(self, idx: int, sample: Tuple[Any, ...]) -> bool:
+        """Store ``sample`` in the cache, at ``idx``.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the sample in the dataset.
+        sample : Tuple[Any, ...]
+            The sample to store.
+
+        Returns
+        -------
+        bool
+            Whether ``sample`` is in the cache.
+
+        """
+        if not _cacheable(sample):
+            return False
+
+        flats = [_as_bytes(tensor) for tensor in sample]
+        sizes = [_aligned(len(flat)) for flat in flats]
+        if sum(sizes) > self._max_bytes:
+            return False
+
+        with self._lock:
+            row = self._rows[idx]
+            if row[_VALID] == 1:
+                return True
+
+            start = self._allocate(sum(sizes))
+            offset = start
+            for flat, size in zip(flats, sizes):
+                self._arena[offset : offset + len(flat)].copy_(flat)
+                offset += size
+
+            row[_OFFSET], row[_NBYTES] = start, sum(sizes)
+            row[_NUM_TENSORS:] = _pack_meta(sample)
+            row[_VALID] = 1
+            self._enqueue(idx)
+
+        return True
+
+    def _allocate(self, nbytes: int) -> int:
+        """Make room for ``nbytes`` bytes in the ring buffer.
+
+        Parameters
+        ----------
+        nbytes : int
+            The number of bytes to make room for.
+
+        Returns
+        -------
+        int
+            The offset to write the bytes at.
+
+        Notes
+        -----
+        Must be called with ``self._lock`` held. The live samples always
+        occupy a contiguous (cyclic) stretch of the buffer, from the oldest
+        to the newest, so the samples overlapping the region we want are
+        always the oldest ones.
+
+        """
+        if self._header[_QUEUE_LEN] == 0:
+            self._header[_HEAD] = 0
+
+        head = int(self._header[_HEAD])
+        if head + nbytes <= self._max_bytes:
+            start, regions = head, [(head, head + nbytes)]
+        else:
+            start, regions = 0, [(head, self._max_bytes), (0, nbytes)]
+
+        while self._header[_QUEUE_LEN] > 0:
+            oldest = self._rows[self._queue[self._header[_QUEUE_START]]]
+            lower = int(oldest[_OFFSET])
+            upper = lower + int(oldest[_NBYTES])
+            if not any(map(lambda x: lower < x[1] and x[0] < upper, regions)):
+                break
+            self._dequeue()
+
+        self._header[_HEAD] = start + nbytes
+        return start
+
+    def _enqueue(self, idx: int):
+        """Add ``idx`` to the back of the eviction queue.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the newly-stored sample.
+
+        """
+        back = self._header[_QUEUE_START] + self._header[_QUEUE_LEN]
+        self._queue[back % self._num_items] = idx
+        self._header[_QUEUE_LEN] += 1
+
+    def _dequeue(self):
+        """Evict the oldest sample."""
+        self._rows[self._queue[self._header[_QUEUE_START]], _VALID] = 0
+        self._header[_QUEUE_START] += 1
+        self._header[_QUEUE_START] %= self._num_items
+        self._header[_QUEUE_LEN] -= 1
+
+    def close(self):
+        """Detach from the shared memory (and free it in the main process)."""
+        if not hasattr(self, "_arena"):
+            return
+        del self._header, self._rows, self._queue, self._arena
+        for shm in (self._index_shm, self._data_shm):
+            shm.close()
+            if os.getpid() == self._creator_pid:
+                shm.unlink()
+
+    def __del__(self):
+        """Release the shared memory."""
+        self.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state needed to attach to the cache in another process.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The cache's state, without the shared-memory views.
+
+        """
+        return {
+            "num_items": self._num_items,
+            "max_bytes": self._max_bytes,
+            "index_name": self._index_shm.name,
+            "data_name": self._data_shm.name,
+            "creator_pid": self._creator_pid,
+            "lock": self._lock,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """Attach to the shared memory created by the main process.
+
+        Parameters
+        ----------
+        state : Dict[str, Any]
+            The state returned by ``__getstate__``.
+
+        """
+        self._num_items = state["num_items"]
+        self._max_bytes = state["max_bytes"]
+        self._creator_pid = state["creator_pid"]
+        self._lock = state["lock"]
+        self._index_shm = _attach(state["index_name"])
+        self._data_shm = _attach(state["data_name"])
+        self._map_buffers()
+
+
+def _process_positive_int(value: int, name: str, minimum: int) -> int:
+    """Check ``value`` is an int no less than ``minimum``.
+
+    Parameters
+    ----------
+    value : int
+        The value to check.
+    name : str
+        The name of the argument, for the error messages.
+    minimum : int
+        The smallest allowed value.
+
+    Returns
+    -------
+    int
+        ``value``.
+
+    Raises
+    ------
+    TypeError
+        If ``value`` is not an int.
+    ValueError
+        If ``value`` is less than ``minimum``.
+
+    """
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"'{name}' should be an int. Got '{type(value)}'.")
+    if value < minimum:
+        msg = f"'{name}' should be at least {minimum}. Got '{value}'."
+        raise ValueError(msg)
+    return value
+
+
+def _attach(name: str) -> SharedMemory:
+    """Attach to the existing shared-memory block called ``name``.
+
+    Parameters
+    ----------
+    name : str
+        The name of the block.
+
+    Returns
+    -------
+    SharedMemory
+        The shared-memory block.
+
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)  # pylint: disable=E1123
+    return SharedMemory(name=name)
+
+
+def _cacheable(sample: Tuple[Any, ...]) -> bool:
+    """Check whether ``sample`` can be stored in the cache.
+
+    Parameters
+    ----------
+    sample : Tuple[Any, ...]
+        The sample to check.
+
+    Returns
+    -------
+    bool
+        ``True`` if ``sample`` holds between one and ``_MAX_TENSORS`` CPU
+        tensors of supported dtypes with no more than ``_MAX_DIMS`` dims.
+
+    """
+    if not 1 <= len(sample) <= _MAX_TENSORS:
+        return False
+    return all(
+        map(
+            lambda x: isinstance(x, Tensor)
+            and x.device.type == "cpu"
+            and x.dtype in _DTYPES
+            and x.dim() <= _MAX_DIMS,
+            sample,
+        )
+    )
+
+
+def _aligned(nbytes: int) -> int:
+    """Round ``nbytes`` up to a multiple of ``_ALIGN``.
+
+    Parameters
+    ----------
+    nbytes : int
+        A number of bytes.
+
+    Returns
+    -------
+    int
+        ``nbytes`` rounded up.
+
+    """
+    return -(-nbytes // _ALIGN) * _ALIGN
+
+
+def _as_bytes(tensor: Tensor) -> Tensor:
+    """Return the raw bytes of ``tensor`` as a flat ``uint8`` tensor.
+
+    Parameters
+    ----------
+    tensor : Tensor
+        The tensor to get the bytes of.
+
+    Returns
+    -------
+    Tensor
+        The bytes of ``tensor``.
+
+    """
+    return tensor.detach().contiguous().reshape(-1).view(uint8)
+
+
+def _pack_meta(sample: Tuple[Tensor, ...]) -> ndarray:
+    """Encode the number, dtypes and shapes of the tensors in ``sample``.
+
+    Parameters
+    ----------
+    sample : Tuple[Tensor, ...]
+        The sample to describe.
+
+    Returns
+    -------
+    ndarray
+        The metadata, laid out as the tail of a row in the index.
+
+    """
+    meta = np_zeros(_ROW_FIELDS - _NUM_TENSORS, dtype=int64)
+    meta[0] = len(sample)
+    for num, tensor in enumerate(sample):
+        start = 1 + num * _TENSOR_FIELDS
+        meta[start] = _DTYPES.index(tensor.dtype)
+        meta[start + 1] = tensor.dim()
+        meta[start + 2 : start + 2 + tensor.dim()] = tensor.shape
+    return meta
+
+
+def _unpack(raw: Tensor, meta: ndarray) -> Tuple[Tensor, ...]:
+    """Rebuild a sample's tensors from its bytes and metadata.
+
+    Parameters
+    ----------
+    raw : Tensor
+        The sample's bytes.
+    meta : ndarray
+        The sample's metadata (see ``_pack_meta``).
+
+    Returns
+    -------
+    Tuple[Tensor, ...]
+        The sample's tensors.
+
+    """
+    tensors: List[Tensor] = []
+    offset = 0
+    for num in range(int(meta[0])):
+        start = 1 + num * _TENSOR_FIELDS
+        dtype = _DTYPES[int(meta[start])]
+        shape = tuple(map(int, meta[start + 2 : start + 2 + int(meta[start + 1])]))
+        numel = 1
+        for size in shape:
+            numel *= size
+        nbytes = numel * torch.empty((), dtype=dtype).element_size()
+        chunk = raw[offset : offset + nbytes]
+        tensors.append(chunk.view(dtype).reshape(shape))
+        offset += _aligned(nbytes)
+    return tuple(tensors)
@@ -0,0 +1,215 @@
+"""Splitting transforms into a cacheable prefix and a random tail."""
+import os
+from pathlib import Path
+from typing import Any, Optional, Tuple, Callable
+
+from torch import Tensor, save, load  # pylint: disable=no-name-in-module
+from torchvision.transforms import Compose  # type: ignore
+
+
+_RANDOM_TFM_NAMES = {
+    "AugMix",
+    "AutoAugment",
+    "ColorJitter",
+    "ElasticTransform",
+    "GaussianBlur",
+    "RandAugment",
+    "TrivialAugmentWide",
+}
+
+
+class CacheBoundary:
+    """Mark where a ``Compose`` stops being deterministic.
+
+    When ``DataSet`` caches samples, the transforms before the boundary are
+    applied once and their outputs are cached, while the transforms after it
+    are applied every time the sample is fetched. Applying the boundary
+    itself does nothing.
+
+    Examples
+    --------
+    >>> from torchvision.transforms import Compose, Resize, ToTensor
+    >>> from torchvision.transforms import RandomCrop
+    >>> from torch_tools.datasets import CacheBoundary
+    >>> tfms = Compose([load_img, Resize(256), ToTensor(), CacheBoundary(),
+                        RandomCrop(224)])
+
+    """
+
+    def __call__(self, item: Any) -> Any:
+        """Return ``item`` unchanged.
+
+        Parameters
+        ----------
+        item : Any
+            The item being transformed.
+
+        Returns
+        -------
+        Any
+            ``item``.
+
+        """
+        return item
+
+    def __repr__(self) -> str:
+        """Represent the boundary.
+
+        Returns
+        -------
+        str
+            The class name.
+
+        """
+        return f"{self.__class__.__name__}()"
+
+
+def is_random_tfm(tfm: Callable) -> bool:
+    """Guess whether ``tfm`` is a random transform.
+
+    Parameters
+    ----------
+    tfm : Callable
+        A transform.
+
+    Returns
+    -------
+    bool
+        ``True`` if ``tfm``'s class name starts with ``"Random"``, or is one
+        of torchvision's other random transforms (``ColorJitter``,
+        ``GaussianBlur``, the auto-augment policies, etc.).
+
+    """
+    name = type(tfm).__name__
+    return name.startswith("Random") or name in _RANDOM_TFM_NAMES
+
+
+def split_tfms(
+    tfms: Optional[Compose],
+) -> Tuple[Optional[Compose], Optional[Compose]]:
+    """Split ``tfms`` into a deterministic prefix and a random tail.
+
+    Parameters
+    ----------
+    tfms : Compose, optional
+        The transforms to split.
+
+    Returns
+    -------
+    Compose or None
+        The deterministic prefix (``None`` if ``tfms`` is ``None``).
+    Compose or None
+        The random tail (``None`` if there isn't one).
+
+    Notes
+    -----
+    If ``tfms`` contains a ``CacheBoundary``, we split at the first one.
+    Otherwise, we split before the first transform ``is_random_tfm`` flags.
+    If there are neither, the whole of ``tfms`` is the prefix.
+
+    """
+    if tfms is None:
+        return None, None
+
+    transforms = list(tfms.transforms)
+    markers = [i for i, tfm in enumerate(transforms) if isinstance(tfm, CacheBoundary)]
+    randoms = [i for i, tfm in enumerate(transforms) if is_random_tfm(tfm)]
+
+    if markers:
+        prefix, tail = transforms[: markers[0]], transforms[markers[0] + 1 :]
+    elif randoms:
+        prefix, tail = transforms[: randoms[0]], transforms[randoms[0] :]
+    else:
+        prefix, tail = transforms, []
+
+    return Compose(prefix), (Compose(tail) if tail else None)
+
+
+class DiskSampleCache:
+    """Cache of dataset samples stored as files on disk.
+
+    Each sample is saved, with ``torch.save``, in its own file in
+    ``directory``. Files are written to a temporary name and then renamed, so
+    a crash (or another ``DataLoader`` worker) never sees a partial file.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory to store the samples in. It is created if it doesn't
+        exist.
+
+    Notes
+    -----
+    — Only samples made up of tensors are cached.
+
+    — The cache is never invalidated: if you change the deterministic
+    transforms, use a new ``directory`` (or empty the old one).
+
+    """
+
+    def __init__(self, directory: Path):
+        """Build ``DiskSampleCache``."""
+        if not isinstance(directory, Path):
+            msg = f"'directory' should be a 'Path'. Got '{type(directory)}'."
+            raise TypeError(msg)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._directory = directory
+
+    def _path(self, idx: int) -> Path:
+        """Return the path of the file for the sample at ``idx``.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the sample in the dataset.
+
+        Returns
+        -------
+        Path
+            The sample's file path.
+
+        """
+        return self._directory / f"{idx}.pt"
+
+    def get(self, idx: int) -> Optional[Tuple[Tensor, ...]]:
+        """Return the sample at ``idx``, or ``None`` if it is not cached.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the sample in the dataset.
+
+        Returns
+        -------
+        Tuple[Tensor, ...] or None
+            The cached tensors, or ``None`` on a cache miss.
+
+        """
+        try:
+            return tuple(load(self._path(idx), weights_only=True))
+        except FileNotFoundError:
+            return None
+
+    def put(self, idx: int, sample: Tuple[Any, ...]) -> bool:
+        """Store ``sample`` in the cache, at ``idx``.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the sample in the dataset.
+        sample : Tuple[Any, ...]
+            The sample to store.
+
+        Returns
+        -------
+        bool
+            Whether ``sample`` is in the cache.
+
+        """
+        if not all(map(lambda x: isinstance(x, Tensor), sample)):
+            return False
+
+        tmp_path = self._path(idx).with_suffix(f".{os.getpid()}.tmp")
+        save(tuple(map(lambda x: x.detach().cpu().clone(), sample)), tmp_path)
+        os.replace(tmp_path, self._path(idx))
+        return True
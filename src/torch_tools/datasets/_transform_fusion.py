@@ -0,0 +1,247 @@
+"""Fusion of runs of pointwise torchvision transforms."""
+from typing import List, Callable, Any, Dict, Tuple, Optional
+
+from numpy import ndarray, asarray
+
+from PIL.Image import Image
+
+from torch import Tensor, empty, addcmul  # pylint: disable=no-name-in-module
+from torch import ones, zeros, as_tensor  # pylint: disable=no-name-in-module
+from torch import uint8, float64, iinfo  # pylint: disable=no-name-in-module
+from torch import get_default_dtype  # pylint: disable=no-name-in-module
+from torch import dtype as torch_dtype  # pylint: disable=no-name-in-module
+from torch import device as torch_device  # pylint: disable=no-name-in-module
+
+from torchvision.transforms import (  # type: ignore
+    Compose,
+    ToTensor,
+    PILToTensor,
+    ConvertImageDtype,
+    Normalize,
+)
+
+from torch_tools.datasets._numpy_conversion import (
+    _torch_compatible,
+    _view_as_tensor,
+)
+
+
+_CONVERTERS = (ToTensor, PILToTensor)
+_POINTWISE = (ConvertImageDtype, Normalize)
+_FUSABLE_PIL_MODES = ("L", "RGB", "RGBA")
+
+_Coeffs = Tuple[Tensor, Tensor, torch_dtype]
+
+
+class FusedPointwiseTfms:
+    """A run of pointwise transforms applied in a single pass.
+
+    The run may start with ``ToTensor`` or ``PILToTensor``, followed by any
+    number of ``ConvertImageDtype`` and ``Normalize`` transforms. The whole
+    run is folded into a per-channel multiply-add, so, for example, a
+    ``uint8`` ``(H, W, C)`` image becomes a normalised float ``(C, H, W)``
+    tensor in one kernel with one output allocation.
+
+    Parameters
+    ----------
+    tfms : List[Callable]
+        The transforms to fuse.
+
+    Notes
+    -----
+    Inputs the fused path cannot handle (such as PIL images in modes other
+    than ``"L"``, ``"RGB"`` or ``"RGBA"``, or conversions to integer dtypes)
+    are passed through the original transforms instead.
+
+    """
+
+    def __init__(self, tfms: List[Callable]):
+        """Build ``FusedPointwiseTfms``."""
+        self.tfms = tfms
+        self._coeffs: Dict[Tuple[Any, ...], Optional[_Coeffs]] = {}
+
+    def __call__(self, img: Any) -> Any:
+        """Apply the fused transforms to ``img``.
+
+        Parameters
+        ----------
+        img : Any
+            The image to transform.
+
+        Returns
+        -------
+        Any
+            The transformed image.
+
+        """
+        src = self._channels_first_view(img)
+        if src is None:
+            return Compose(self.tfms)(img)
+
+        key = (src.dtype, src.shape[-3], src.device)
+        if key not in self._coeffs:
+            self._coeffs[key] = self._fold(*key)
+
+        coeffs = self._coeffs[key]
+        if coeffs is None:
+            return Compose(self.tfms)(img)
+
+        mult, shift, out_dtype = coeffs
+        out = empty(src.shape, dtype=out_dtype, device=src.device)
+        return addcmul(shift, src, mult, out=out)
+
+    def _channels_first_view(self, img: Any) -> Optional[Tensor]:
+        """View ``img`` as a channels-first tensor, without copying it.
+
+        Parameters
+        ----------
+        img : Any
+            The image passed to the transforms.
+
+        Returns
+        -------
+        Tensor or None
+            A ``(C, H, W)`` view of ``img``, or ``None`` if the fused path
+            cannot handle ``img``.
+
+        """
+        first = self.tfms[0]
+
+        if not isinstance(first, _CONVERTERS):
+            return img if _has_channels(img) else None
+
+        if isinstance(img, Image) and img.mode in _FUSABLE_PIL_MODES:
+            array = asarray(img)
+        elif isinstance(img, ndarray) and isinstance(first, ToTensor):
+            array = img
+        else:
+            return None
+
+        if array.ndim == 2:
+            array = array[:, :, None]
+        if array.ndim != 3:
+            return None
+
+        return _view_as_tensor(_torch_compatible(array)).permute(2, 0, 1)
+
+    def _fold(
+        self,
+        src_dtype: torch_dtype,
+        channels: int,
+        device: torch_device,
+    ) -> Optional[_Coeffs]:
+        """Fold the transforms into a per-channel multiply and add.
+
+        Parameters
+        ----------
+        src_dtype : torch.dtype
+            The dtype of the channels-first view of the image.
+        channels : int
+            The number of channels in the image.
+        device : torch.device
+            The device the image is on.
+
+        Returns
+        -------
+        Tuple[Tensor, Tensor, torch.dtype] or None
+            The multiplier, the shift, and the output dtype. ``None`` if the
+            transforms cannot be folded for this dtype.
+
+        """
+        dtype = src_dtype
+        mult = ones(channels, dtype=float64)
+        shift = zeros(channels, dtype=float64)
+
+        for tfm in self.tfms:
+            if isinstance(tfm, ToTensor) and dtype == uint8:
+                mult, dtype = mult / 255.0, get_default_dtype()
+            elif isinstance(tfm, ConvertImageDtype):
+                if not tfm.dtype.is_floating_point:
+                    return None
+                if not dtype.is_floating_point:
+                    mult = mult / iinfo(dtype).max
+                dtype = tfm.dtype
+            elif isinstance(tfm, Normalize):
+                if not dtype.is_floating_point:
+                    return None
+                mean = as_tensor(tfm.mean, dtype=float64).reshape(-1)
+                std = as_tensor(tfm.std, dtype=float64).reshape(-1)
+                if not {mean.numel(), std.numel()} <= {1, channels}:
+                    return None
+                mult, shift = mult / std, (shift - mean) / std
+
+        mult = mult.reshape(channels, 1, 1).to(device=device, dtype=dtype)
+        shift = shift.reshape(channels, 1, 1).to(device=device, dtype=dtype)
+        return mult, shift, dtype
+
+    def __repr__(self) -> str:
+        """Represent the fused transforms.
+
+        Returns
+        -------
+        str
+            A representation of the fused transforms.
+
+        """
+        inner = ", ".join(map(repr, self.tfms))
+        return f"{self.__class__.__name__}([{inner}])"
+
+
+def _has_channels(img: Any) -> bool:
+    """Check ``img`` is a tensor with a channel dimension.
+
+    Parameters
+    ----------
+    img : Any
+        The image to check.
+
+    Returns
+    -------
+    bool
+        Whether ``img`` is a ``Tensor`` with at least three dimensions.
+
+    """
+    if not isinstance(img, Tensor):
+        return False
+    return img.dim() >= 3 and not img.requires_grad
+
+
+def fuse_tfms(tfms: Compose) -> Compose:
+    """Fuse runs of pointwise transforms in ``tfms``.
+
+    Parameters
+    ----------
+    tfms : Compose
+        The transforms to fuse.
+
+    Returns
+    -------
+    Compose
+        ``tfms`` with each run of two or more fusable transforms replaced by
+        a ``FusedPointwiseTfms``. See ``FusedPointwiseTfms`` for the
+        transforms which can be fused.
+
+    Raises
+    ------
+    TypeError
+        If ``tfms`` is not a ``Compose``.
+
+    """
+    if not isinstance(tfms, Compose):
+        msg = f"'tfms' should be a 'Compose'. Got '{type(tfms)}'."
+        raise TypeError(msg)
+
+    fused: List[Callable] = []
+    run: List[Callable] = []
+
+    for tfm in tfms.transforms + [None]:
+        if isinstance(tfm, _POINTWISE) and run:
+            run.append(tfm)
+            continue
+
+        fused.extend([FusedPointwiseTfms(run)] if len(run) > 1 else run)
+        run = [tfm] if isinstance(tfm, _CONVERTERS + _POINTWISE) else []
+        if not run and tfm is not None:
+            fused.append(tfm)
+
+    return Compose(fused)
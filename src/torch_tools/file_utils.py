@@ -1,8 +1,25 @@
 """File searching and path utilities."""
+import os
+import heapq
+import sqlite3
+from time import time_ns, monotonic, sleep
+from fnmatch import fnmatchcase
+from contextlib import ExitStack
+from functools import partial
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
-from typing import List, Optional
+from tempfile import TemporaryDirectory
+from typing import List, Optional, Sequence, Iterator, Iterable, Tuple, IO
+from typing import Set, Callable, Deque
 
-from zipfile import ZipFile
+from torch_tools.archive_utils import list_zip_members, list_tar_members
+from torch_tools.archive_utils import TAR_SUFFIXES
+
+# pylint: disable=too-many-arguments, too-few-public-methods, too-many-lines
+
+_ARCHIVE_SUFFIXES = (".zip",) + TAR_SUFFIXES
+_TAR_INDEX_SUFFIXES = tuple(map(lambda x: x + ".index", TAR_SUFFIXES))
 
 
 def ls_zipfile(zip_path: Path) -> List[Path]:
@@ -24,27 +41,96 @@ def ls_zipfile(zip_path: Path) -> List[Path]:
     TypeError
         If ``zip_path`` is not a ``Path``.
 
+    Notes
+    -----
+    See ``torch_tools.archive_utils.list_zip_members`` for more detailed
+    (and cached) listings.
+
     """
     if not isinstance(zip_path, Path):
         raise TypeError(
             f"'{zip_path}' should be Path. Got '{type(zip_path)}'.",
         )
 
-    with ZipFile(zip_path) as zip_archive:
-        file_names = zip_archive.namelist()
+    members = list_zip_members(zip_path)
+    return sorted(
+        map(lambda x: zip_path / x.name, members),
+        key=lambda x: x.name,
+    )
+
+
+def ls_tarfile(tar_path: Path) -> List[Path]:
+    """List the regular files in the tar archive at ``tar_path``.
+
+    Parameters
+    ----------
+    tar_path : Path
+        Path to the tar archive (which may be compressed) whose contents we
+        want to list.
+
+    Returns
+    -------
+    List[Path]
+        A list of the files in the archive at ``tar_path``, sorted by file
+        name.
+
+    Raises
+    ------
+    TypeError
+        If ``tar_path`` is not a ``Path``.
+
+    Notes
+    -----
+    The first listing of an archive saves an index next to it, which later
+    listings reuse. See ``torch_tools.archive_utils.list_tar_members``.
+
+    """
+    if not isinstance(tar_path, Path):
+        raise TypeError(f"'{tar_path}' should be Path. Got '{type(tar_path)}'.")
+
+    members = list_tar_members(tar_path)
     return sorted(
-        map(lambda x: zip_path / x, file_names),
+        map(lambda x: tar_path / x.name, members),
         key=lambda x: x.name,
     )
 
 
-def traverse_directory_tree(directory: Path) -> List[Path]:
+def _ls_archive(archive: Path) -> List[Path]:
+    """List the contents of a zip file or tar archive.
+
+    Parameters
+    ----------
+    archive : Path
+        The path of the archive.
+
+    Returns
+    -------
+    List[Path]
+        The archive's members, sorted by name.
+
+    """
+    if archive.name.endswith(".zip"):
+        return ls_zipfile(archive)
+    return ls_tarfile(archive)
+
+
+def traverse_directory_tree(
+    directory: Path,
+    num_threads: int = 1,
+    index_path: Optional[Path] = None,
+) -> List[Path]:
     """Recursively list all files in ``directory``.
 
     Parameters
     ----------
     directory : Path
         The directory whose contents should be searched.
+    num_threads : int, optional
+        The number of threads to list directories with. See
+        ``walk_directory_tree``.
+    index_path : Path, optional
+        Path to an on-disk listing index, which is reused, and refreshed, by
+        later calls. See ``walk_directory_tree``.
 
     Returns
     -------
@@ -60,6 +146,242 @@ def traverse_directory_tree(directory: Path) -> List[Path]:
     RuntimeError
         If ``directory`` is not a directory.
 
+    Notes
+    -----
+    See ``walk_directory_tree`` to stream, and filter, the files instead.
+
+    """
+    files = walk_directory_tree(
+        directory,
+        num_threads=num_threads,
+        index_path=index_path,
+    )
+    return sorted(files, key=lambda x: x.name)
+
+
+def walk_directory_tree(
+    directory: Path,
+    suffixes: Optional[Sequence[str]] = None,
+    pattern: Optional[str] = None,
+    sort: bool = False,
+    chunk_size: int = 1_000_000,
+    num_threads: int = 1,
+    index_path: Optional[Path] = None,
+) -> Iterator[Path]:
+    """Yield the files in ``directory`` as they are found.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory whose contents should be searched.
+    suffixes : Sequence[str], optional
+        If not ``None``, only files with these suffixes (e.g. ``".png"``) are
+        yielded.
+    pattern : str, optional
+        If not ``None``, only files whose names match this glob-style pattern
+        (e.g. ``"img_*"``) are yielded.
+    sort : bool, optional
+        If ``True``, the files are yielded sorted by name, like
+        ``traverse_directory_tree``. Otherwise, they are yielded in the
+        order they are found.
+    chunk_size : int, optional
+        When sorting, at most this many paths are held in memory: larger
+        trees are sorted in chunks which are spilled to temporary files and
+        then merged.
+    num_threads : int, optional
+        The number of threads to list directories with. If more than one,
+        the listing of subdirectories is fanned out over a thread pool,
+        which helps on network filesystems, where listing is bound by
+        metadata round-trips rather than CPU.
+    index_path : Path, optional
+        If not ``None``, the listing is stored in an SQLite database at this
+        path, and later walks of ``directory`` only relist the directories
+        (and archives) which have changed since. Cannot be used with more
+        than one thread.
+
+    Returns
+    -------
+    Iterator[Path]
+        The paths of the files in ``directory``. As with
+        ``traverse_directory_tree``, the contents of zip files and tar
+        archives are listed in place of the archives themselves.
+
+    Raises
+    ------
+    TypeError
+        If ``directory`` is not a ``Path``, ``suffixes`` is not a sequence of
+        ``str``, ``pattern`` is not a ``str``, ``sort`` is not a ``bool`` or
+        ``chunk_size`` or ``num_threads`` are not ``int``s, or
+        ``index_path`` is not a ``Path``.
+    ValueError
+        If ``chunk_size`` or ``num_threads`` are less than one, or
+        ``index_path`` is used with more than one thread.
+    FileNotFoundError
+        If ``directory`` does not exist.
+    RuntimeError
+        If ``directory`` is not a directory.
+
+    Notes
+    -----
+    The tree is walked with ``os.scandir``, whose entries carry the file
+    type, so no extra ``stat`` calls are needed. Entries are filtered by name
+    before any ``Path`` objects are built.
+
+    With one thread, the tree is walked depth first, in the order
+    ``os.scandir`` lists each directory. With several, it is walked breadth
+    first, with each directory's entries sorted by name, and the results are
+    yielded in the order the directories were queued—so the order is the same
+    from run to run, however the threads are scheduled. At most
+    ``4 * num_threads`` directory listings are in flight at once.
+
+    With an index, each directory's modification time is checked against
+    the index, and only directories which have changed (had entries added,
+    removed or renamed) are relisted. Archives are only reopened if their
+    modification time or size has changed. For an unchanged tree, the walk
+    costs one ``stat`` per directory and archive. Directories modified
+    within two seconds of being listed are always relisted next time, in
+    case the filesystem's timestamps are too coarse to show a later change.
+
+    """
+    _check_directory(directory)
+    suffix_set = _process_suffixes(suffixes)
+
+    if not isinstance(pattern, (str, type(None))):
+        msg = f"'pattern' should be a 'str' or 'None'. Got '{type(pattern)}'."
+        raise TypeError(msg)
+    if not isinstance(sort, bool):
+        raise TypeError(f"'sort' should be a bool. Got '{type(sort)}'.")
+    _process_positive_int(chunk_size, "chunk_size")
+    _process_positive_int(num_threads, "num_threads")
+
+    if not isinstance(index_path, (Path, type(None))):
+        msg = f"'index_path' should be a 'Path' or 'None'. Got '{type(index_path)}'."
+        raise TypeError(msg)
+    if index_path is not None and num_threads != 1:
+        raise ValueError("'index_path' cannot be used with 'num_threads' > 1.")
+
+    keep = partial(_keep, suffixes=suffix_set, pattern=pattern)
+    if index_path is not None:
+        files = _ListingIndex(index_path).walk(directory, keep)
+    elif num_threads == 1:
+        files = _walk(directory, keep)
+    else:
+        files = _parallel_walk(directory, keep, num_threads)
+    return _external_sort(files, chunk_size) if sort is True else files
+
+
+def traverse_directory_shard(
+    directory: Path,
+    rank: Optional[int] = None,
+    world_size: Optional[int] = None,
+    manifest_path: Optional[Path] = None,
+    num_threads: int = 1,
+    timeout: float = 600.0,
+) -> List[Path]:
+    """List the files in this rank's share of ``directory``.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory whose contents should be searched.
+    rank : int, optional
+        The index of this process's shard. If ``None``, it is read from the
+        ``RANK`` environment variable (as set by ``torchrun``), or zero.
+    world_size : int, optional
+        The number of shards. If ``None``, it is read from the
+        ``WORLD_SIZE`` environment variable, or one.
+    manifest_path : Path, optional
+        If not ``None``, rank zero lists the whole tree and writes a manifest
+        of it to this path, and every rank takes its share of the manifest.
+        See the notes.
+    num_threads : int, optional
+        The number of threads to list directories with. See
+        ``walk_directory_tree``.
+    timeout : float, optional
+        How long, in seconds, ranks other than zero wait for the manifest to
+        appear.
+
+    Returns
+    -------
+    List[Path]
+        This rank's files, sorted by name. Each file in ``directory`` is in
+        exactly one rank's list.
+
+    Raises
+    ------
+    TypeError
+        If ``rank`` or ``world_size`` are not ``int``s, or ``manifest_path``
+        is not a ``Path``.
+    ValueError
+        If ``rank`` is not in ``[0, world_size)``.
+    TimeoutError
+        If the manifest does not appear within ``timeout`` seconds.
+
+    Notes
+    -----
+    Without a manifest, no rank lists the whole tree. Every rank lists the
+    first few levels of the tree (the same, small, amount of work), until
+    there are at least four directories per rank. These directories are
+    dealt out to the ranks, in order, and each rank only walks its own. The
+    files met on the way are dealt out in the same way. Shards are balanced
+    in the number of directories, which balances the number of files as
+    long as the directories are of similar sizes.
+
+    With a manifest, rank zero walks the whole tree and the other ranks
+    wait for the manifest, then every rank keeps every ``world_size``-th
+    file, so the shards differ in size by at most one file. If the manifest
+    already exists, it is reused: delete it to pick up changes to the tree.
+
+    To shard over ``DataLoader`` workers too, use
+    ``rank * num_workers + worker_id`` as the rank and
+    ``world_size * num_workers`` as the world size.
+
+    """
+    _check_directory(directory)
+    rank = _from_env(rank, "RANK", 0)
+    world_size = _from_env(world_size, "WORLD_SIZE", 1)
+    _process_positive_int(world_size, "world_size")
+    if not 0 <= rank < world_size:
+        msg = f"'rank' should be in [0, {world_size}). Got '{rank}'."
+        raise ValueError(msg)
+
+    files: Iterable[Path]
+    if manifest_path is None:
+        files = _partitioned_walk(directory, rank, world_size, num_threads)
+    elif isinstance(manifest_path, Path):
+        files = _manifest_shard(
+            directory,
+            manifest_path,
+            rank,
+            world_size,
+            num_threads,
+            timeout,
+        )
+    else:
+        msg = "'manifest_path' should be a 'Path' or 'None'. Got "
+        msg += f"'{type(manifest_path)}'."
+        raise TypeError(msg)
+
+    return sorted(files, key=lambda x: x.name)
+
+
+def _check_directory(directory: Path):
+    """Check ``directory`` is a ``Path`` to an existing directory.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory to check.
+
+    Raises
+    ------
+    TypeError
+        If ``directory`` is not a ``Path``.
+    FileNotFoundError
+        If ``directory`` does not exist.
+    RuntimeError
+        If ``directory`` is not a directory.
+
     """
     if not isinstance(directory, Path):
         msg = f"'{directory}' should be a 'Path'. Got '{type(directory)}'."
@@ -71,35 +393,679 @@ def traverse_directory_tree(directory: Path) -> List[Path]:
     if not directory.is_dir():
         raise RuntimeError(f"'{directory}' is not a a directory.")
 
-    return sorted(_recursive_search(directory), key=lambda x: x.name)
+
+def _process_positive_int(value: int, name: str):
+    """Check ``value`` is a positive int.
+
+    Parameters
+    ----------
+    value : int
+        The value to check.
+    name : str
+        The name of the argument, for the error messages.
+
+    Raises
+    ------
+    TypeError
+        If ``value`` is not an int.
+    ValueError
+        If ``value`` is less than one.
+
+    """
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"'{name}' should be an int. Got '{type(value)}'.")
+    if value < 1:
+        raise ValueError(f"'{name}' should be at least 1. Got '{value}'.")
+
+
+def _process_suffixes(suffixes: Optional[Sequence[str]]) -> Optional[Set[str]]:
+    """Check ``suffixes`` and return them as a set.
+
+    Parameters
+    ----------
+    suffixes : Sequence[str], optional
+        File suffixes to keep.
+
+    Returns
+    -------
+    Set[str] or None
+        The suffixes, or ``None``.
+
+    Raises
+    ------
+    TypeError
+        If ``suffixes`` is not a sequence of ``str`` (or ``None``).
+
+    """
+    if suffixes is None:
+        return None
+    if isinstance(suffixes, str) or not all(
+        map(lambda x: isinstance(x, str), suffixes)
+    ):
+        msg = f"'suffixes' should be a sequence of str. Got '{suffixes}'."
+        raise TypeError(msg)
+    return set(suffixes)
+
+
+def _keep(name: str, suffixes: Optional[Set[str]], pattern: Optional[str]) -> bool:
+    """Decide whether to keep the file called ``name``.
+
+    Parameters
+    ----------
+    name : str
+        The file's name.
+    suffixes : Set[str], optional
+        The suffixes to keep (or ``None`` to keep any).
+    pattern : str, optional
+        The glob-style pattern to match (or ``None`` to match any).
+
+    Returns
+    -------
+    bool
+        Whether the file passes the filters.
+
+    """
+    if suffixes is not None and os.path.splitext(name)[1] not in suffixes:
+        return False
+    return pattern is None or fnmatchcase(name, pattern)
+
+
+def _walk(directory: Path, keep: Callable[[str], bool]) -> Iterator[Path]:
+    """Walk ``directory`` depth first, yielding the files ``keep`` accepts.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory to walk.
+    keep : Callable[[str], bool]
+        Filter applied to each file's name.
+
+    Yields
+    ------
+    Path
+        The path of each file kept.
+
+    Notes
+    -----
+    Subdirectories are descended into as they are met, so the order matches
+    a recursive search of ``directory``.
+
+    """
+    stack = [os.scandir(directory)]
+    try:
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop().close()
+            elif entry.name.endswith(_TAR_INDEX_SUFFIXES):
+                continue
+            elif entry.name.endswith(_ARCHIVE_SUFFIXES):
+                members = _ls_archive(Path(entry.path))
+                yield from (x for x in members if keep(x.name))
+            elif entry.is_file():
+                if keep(entry.name):
+                    yield Path(entry.path)
+            elif entry.is_dir():
+                stack.append(os.scandir(entry.path))
+    finally:
+        _ = list(map(lambda x: x.close(), stack))
+
+
+def _list_directory(
+    directory: str,
+    keep: Callable[[str], bool],
+) -> Tuple[List[Path], List[str]]:
+    """List the kept files, and the subdirectories, in ``directory``.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to list.
+    keep : Callable[[str], bool]
+        Filter applied to each file's name.
+
+    Returns
+    -------
+    List[Path]
+        The files kept, sorted by name, with the members of any archives
+        listed in place of the archives.
+    List[str]
+        The subdirectories, sorted by name.
+
+    """
+    with os.scandir(directory) as entries:
+        ordered = sorted(entries, key=lambda x: x.name)
+
+    files: List[Path] = []
+    subdirs: List[str] = []
+    for entry in ordered:
+        if entry.name.endswith(_TAR_INDEX_SUFFIXES):
+            continue
+        if entry.name.endswith(_ARCHIVE_SUFFIXES):
+            files.extend(x for x in _ls_archive(Path(entry.path)) if keep(x.name))
+        elif entry.is_file():
+            if keep(entry.name):
+                files.append(Path(entry.path))
+        elif entry.is_dir():
+            subdirs.append(entry.path)
+
+    return files, subdirs
 
 
-def _recursive_search(
+def _parallel_walk(
     directory: Path,
-    files: Optional[List[Path]] = None,
+    keep: Callable[[str], bool],
+    num_threads: int,
+) -> Iterator[Path]:
+    """Walk ``directory`` breadth first, listing directories in threads.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory to walk.
+    keep : Callable[[str], bool]
+        Filter applied to each file's name.
+    num_threads : int
+        The number of threads to list directories with.
+
+    Yields
+    ------
+    Path
+        The path of each file kept.
+
+    """
+    queued: Deque[str] = deque([str(directory)])
+    in_flight: Deque[Future] = deque()
+
+    pool = ThreadPoolExecutor(max_workers=num_threads)
+    try:
+        while queued or in_flight:
+            while queued and len(in_flight) < 4 * num_threads:
+                in_flight.append(pool.submit(_list_directory, queued.popleft(), keep))
+
+            files, subdirs = in_flight.popleft().result()
+            queued.extend(subdirs)
+            yield from files
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _ListingIndex:
+    """On-disk index of directory listings, stored in SQLite.
+
+    Parameters
+    ----------
+    index_path : Path
+        The path of the database. It is created if it doesn't exist.
+
+    Notes
+    -----
+    The ``dirs`` table holds, for each directory, its modification time and
+    the names of its files, archives and subdirectories. The ``archives``
+    table holds, for each zip file or tar archive, its modification time,
+    size and members. Paths and names are stored as bytes (encoded with
+    ``os.fsencode``), so names which aren't valid UTF-8 survive, and names
+    are joined with null characters, which cannot appear in paths. Indexes
+    written with an older schema are rebuilt.
+
+    """
+
+    _version = 3
+
+    _schema = """
+        DROP TABLE IF EXISTS dirs;
+        DROP TABLE IF EXISTS zips;
+        DROP TABLE IF EXISTS archives;
+        CREATE TABLE dirs (
+            path BLOB PRIMARY KEY,
+            mtime_ns INTEGER,
+            files BLOB,
+            archives BLOB,
+            subdirs BLOB
+        );
+        CREATE TABLE archives (
+            path BLOB PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            members BLOB
+        );
+    """
+
+    _racy_ns = 2_000_000_000
+
+    def __init__(self, index_path: Path):
+        """Build ``_ListingIndex``."""
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(index_path)
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self._version:
+            self._conn.executescript(self._schema)
+            self._conn.execute(f"PRAGMA user_version = {self._version}")
+
+    def walk(self, directory: Path, keep: Callable[[str], bool]) -> Iterator[Path]:
+        """Walk ``directory`` depth first, refreshing the index as we go.
+
+        Parameters
+        ----------
+        directory : Path
+            The directory to walk.
+        keep : Callable[[str], bool]
+            Filter applied to each file's name.
+
+        Yields
+        ------
+        Path
+            The path of each file kept.
+
+        Notes
+        -----
+        If the walk is completed, index entries for directories and archives
+        under ``directory`` which no longer exist are deleted.
+
+        """
+        seen: Set[str] = set()
+        stack = [str(directory)]
+        try:
+            while stack:
+                path = stack.pop()
+                seen.add(path)
+                files, archives, subdirs = self._listing(path)
+
+                yield from (Path(path, x) for x in files if keep(x))
+                for archive in map(lambda x: os.path.join(path, x), archives):
+                    seen.add(archive)
+                    members = self._archive_members(archive)
+                    yield from (Path(archive, x) for x in members if keep(Path(x).name))
+
+                stack.extend(os.path.join(path, x) for x in reversed(subdirs))
+
+            self._forget_unseen(str(directory), seen)
+        finally:
+            self._conn.commit()
+            self._conn.close()
+
+    def _listing(self, path: str) -> Tuple[List[str], List[str], List[str]]:
+        """Return the names of the files, archives and subdirs in ``path``.
+
+        Parameters
+        ----------
+        path : str
+            The directory to list.
+
+        Returns
+        -------
+        List[str]
+            The names of the files (excluding archives), sorted.
+        List[str]
+            The names of the zip files and tar archives, sorted.
+        List[str]
+            The names of the subdirectories, sorted.
+
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        query = "SELECT mtime_ns, files, archives, subdirs FROM dirs WHERE path = ?"
+        row = self._conn.execute(query, (os.fsencode(path),)).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            return _split_names(row[1]), _split_names(row[2]), _split_names(row[3])
+
+        files: List[str] = []
+        archives: List[str] = []
+        subdirs: List[str] = []
+        with os.scandir(path) as entries:
+            for entry in sorted(entries, key=lambda x: x.name):
+                if entry.name.endswith(_TAR_INDEX_SUFFIXES):
+                    continue
+                if entry.name.endswith(_ARCHIVE_SUFFIXES):
+                    archives.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+                elif entry.is_dir():
+                    subdirs.append(entry.name)
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)",
+            (
+                os.fsencode(path),
+                mtime_ns if time_ns() - mtime_ns > self._racy_ns else None,
+                _join_names(files),
+                _join_names(archives),
+                _join_names(subdirs),
+            ),
+        )
+        return files, archives, subdirs
+
+    def _archive_members(self, archive: str) -> List[str]:
+        """Return the members of the zip file or tar archive at ``archive``.
+
+        Parameters
+        ----------
+        archive : str
+            The path of the archive.
+
+        Returns
+        -------
+        List[str]
+            The members, in the order ``ls_zipfile`` or ``ls_tarfile`` list
+            them.
+
+        """
+        stat = os.stat(archive)
+        query = "SELECT mtime_ns, size, members FROM archives WHERE path = ?"
+        row = self._conn.execute(query, (os.fsencode(archive),)).fetchone()
+        if row is not None and tuple(row[:2]) == (stat.st_mtime_ns, stat.st_size):
+            return _split_names(row[2])
+
+        members = [str(x.relative_to(archive)) for x in _ls_archive(Path(archive))]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?)",
+            (
+                os.fsencode(archive),
+                stat.st_mtime_ns,
+                stat.st_size,
+                _join_names(members),
+            ),
+        )
+        return members
+
+    def _forget_unseen(self, root: str, seen: Set[str]):
+        """Delete index entries under ``root`` which were not ``seen``.
+
+        Parameters
+        ----------
+        root : str
+            The directory which was walked.
+        seen : Set[str]
+            The directories and archives found in the walk.
+
+        """
+        prefix = os.fsencode(os.path.join(root, ""))
+        seen_bytes = set(map(os.fsencode, seen))
+        for table in ("dirs", "archives"):
+            stale = [
+                (path,)
+                for (path,) in self._conn.execute(f"SELECT path FROM {table}")
+                if path.startswith(prefix) and path not in seen_bytes
+            ]
+            self._conn.executemany(f"DELETE FROM {table} WHERE path = ?", stale)
+
+
+def _join_names(names: List[str]) -> bytes:
+    """Encode ``names`` with ``os.fsencode`` and join them with null bytes.
+
+    Parameters
+    ----------
+    names : List[str]
+        The names.
+
+    Returns
+    -------
+    bytes
+        The joined names.
+
+    """
+    return b"\0".join(map(os.fsencode, names))
+
+
+def _split_names(joined: bytes) -> List[str]:
+    """Split names joined by ``_join_names``.
+
+    Parameters
+    ----------
+    joined : bytes
+        The joined names.
+
+    Returns
+    -------
+    List[str]
+        The names.
+
+    """
+    return list(map(os.fsdecode, joined.split(b"\0"))) if joined else []
+
+
+def _external_sort(files: Iterable[Path], chunk_size: int) -> Iterator[Path]:
+    """Sort ``files`` by name, spilling sorted chunks to disk.
+
+    Parameters
+    ----------
+    files : Iterable[Path]
+        The paths to sort.
+    chunk_size : int
+        The largest number of paths to hold in memory.
+
+    Yields
+    ------
+    Path
+        The paths in ``files``, sorted by name.
+
+    Notes
+    -----
+    Each chunk is sorted (stably) and written to a temporary file, and the
+    files are lazily merged with ``heapq.merge``, which is also stable, so
+    paths with the same name come out in the order they were found. If all
+    of ``files`` fits in one chunk, nothing is written to disk.
+
+    """
+    with TemporaryDirectory() as tmp_dir:
+        spills: List[Path] = []
+        chunk: List[Tuple[str, str]] = []
+
+        for path in files:
+            chunk.append((path.name, str(path)))
+            if len(chunk) == chunk_size:
+                spills.append(_spill(sorted(chunk, key=lambda x: x[0]), tmp_dir))
+                chunk = []
+
+        chunk.sort(key=lambda x: x[0])
+        if not spills:
+            yield from (Path(path) for _, path in chunk)
+            return
+
+        with ExitStack() as stack:
+            handles = [
+                stack.enter_context(
+                    open(x, "r", encoding="utf-8", errors="surrogateescape", newline="")
+                )
+                for x in spills
+            ]
+            runs = list(map(_read_spill, handles)) + [iter(chunk)]
+            merged = heapq.merge(*runs, key=lambda x: x[0])
+            yield from (Path(path) for _, path in merged)
+
+
+def _spill(chunk: List[Tuple[str, str]], tmp_dir: str) -> Path:
+    """Write a sorted chunk of ``(name, path)`` pairs to a temporary file.
+
+    Parameters
+    ----------
+    chunk : List[Tuple[str, str]]
+        The sorted pairs.
+    tmp_dir : str
+        The directory to write the file to.
+
+    Returns
+    -------
+    Path
+        The file written. Names and paths are separated by null characters,
+        which cannot appear in paths.
+
+    """
+    path = Path(tmp_dir) / f"{len(os.listdir(tmp_dir))}.spill"
+    with open(
+        path, "w", encoding="utf-8", errors="surrogateescape", newline=""
+    ) as spill:
+        spill.writelines(f"{name}\0{file}\0" for name, file in chunk)
+    return path
+
+
+def _read_spill(spill: IO[str], block_size: int = 2**16) -> Iterator[Tuple[str, str]]:
+    """Stream the ``(name, path)`` pairs back out of a spilled chunk.
+
+    Parameters
+    ----------
+    spill : IO[str]
+        The open spill file.
+    block_size : int, optional
+        The number of characters to read at a time.
+
+    Yields
+    ------
+    Tuple[str, str]
+        Each ``(name, path)`` pair, in order.
+
+    """
+    fields = _read_fields(spill, block_size)
+    yield from zip(fields, fields)
+
+
+def _read_fields(handle: IO[str], block_size: int = 2**16) -> Iterator[str]:
+    """Stream the null-terminated fields out of a text file.
+
+    Parameters
+    ----------
+    handle : IO[str]
+        The open file.
+    block_size : int, optional
+        The number of characters to read at a time.
+
+    Yields
+    ------
+    str
+        Each field, in order.
+
+    """
+    leftover = ""
+    while block := handle.read(block_size):
+        *fields, leftover = (leftover + block).split("\0")
+        yield from fields
+
+
+def _from_env(value: Optional[int], name: str, default: int) -> int:
+    """Return ``value``, or read it from an environment variable.
+
+    Parameters
+    ----------
+    value : int, optional
+        The value passed by the user.
+    name : str
+        The name of the argument's environment variable.
+    default : int
+        The value to use if neither are set.
+
+    Returns
+    -------
+    int
+        ``value``, or the environment variable, or ``default``.
+
+    Raises
+    ------
+    TypeError
+        If ``value`` is not an int.
+
+    """
+    if value is None:
+        return int(os.environ.get(name, default))
+    if not isinstance(value, int) or isinstance(value, bool):
+        msg = f"'{name.lower()}' should be an int. Got '{type(value)}'."
+        raise TypeError(msg)
+    return value
+
+
+def _partitioned_walk(
+    directory: Path,
+    rank: int,
+    world_size: int,
+    num_threads: int,
+) -> Iterator[Path]:
+    """Walk this rank's share of the directories in ``directory``.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory to walk.
+    rank : int
+        This rank.
+    world_size : int
+        The number of ranks.
+    num_threads : int
+        The number of threads to walk each directory with.
+
+    Yields
+    ------
+    Path
+        This rank's files.
+
+    """
+    keep = partial(_keep, suffixes=None, pattern=None)
+    frontier = [str(directory)]
+    shallow_files: List[Path] = []
+
+    while frontier and len(frontier) < 4 * world_size:
+        expanded: List[str] = []
+        for path in frontier:
+            files, subdirs = _list_directory(path, keep)
+            shallow_files.extend(files)
+            expanded.extend(subdirs)
+        frontier = expanded
+
+    yield from shallow_files[rank::world_size]
+    for path in frontier[rank::world_size]:
+        yield from walk_directory_tree(Path(path), num_threads=num_threads)
+
+
+def _manifest_shard(
+    directory: Path,
+    manifest_path: Path,
+    rank: int,
+    world_size: int,
+    num_threads: int,
+    timeout: float,
 ) -> List[Path]:
-    """Recursively descend through ``directory`` and list the files.
+    """Take this rank's share of the manifest, written by rank zero.
 
     Parameters
     ----------
     directory : Path
-        The directory to recursively search.
-    files : List[Path]
-        A list of files to append new ``Path``s to.
+        The directory to list.
+    manifest_path : Path
+        The manifest's path.
+    rank : int
+        This rank.
+    world_size : int
+        The number of ranks.
+    num_threads : int
+        The number of threads rank zero lists ``directory`` with.
+    timeout : float
+        How long to wait for the manifest.
 
     Returns
     -------
-    files : List[Path]
-        A list of file paths.
+    List[Path]
+        This rank's files.
+
+    Raises
+    ------
+    TimeoutError
+        If the manifest does not appear in time.
 
     """
-    files = [] if files is None else files
-    for item in directory.iterdir():
-        if item.suffix == ".zip":
-            files += ls_zipfile(item)
-        elif item.is_file():
-            files.append(item)
-        elif item.is_dir():
-            _ = _recursive_search(item, files=files)
+    if rank == 0 and not manifest_path.exists():
+        files = walk_directory_tree(directory, sort=True, num_threads=num_threads)
+        tmp_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+        with open(
+            tmp_path, "w", encoding="utf-8", errors="surrogateescape", newline=""
+        ) as manifest:
+            manifest.writelines(f"{path}\0" for path in files)
+        os.replace(tmp_path, manifest_path)
+
+    deadline = monotonic() + timeout
+    while not manifest_path.exists():
+        if monotonic() > deadline:
+            raise TimeoutError(f"Gave up waiting for manifest '{manifest_path}'.")
+        sleep(0.1)
 
-    return files
+    with open(
+        manifest_path, "r", encoding="utf-8", errors="surrogateescape", newline=""
+    ) as manifest:
+        fields = enumerate(_read_fields(manifest))
+        return [Path(path) for idx, path in fields if idx % world_size == rank]
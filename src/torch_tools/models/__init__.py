@@ -6,3 +6,4 @@ from torch_tools.models._encoder_2d import Encoder2d
 from torch_tools.models._decoder_2d import Decoder2d
 from torch_tools.models._autoencoder_2d import AutoEncoder2d
 from torch_tools.models._simple_conv_2d import SimpleConvNet2d
+from torch_tools.models._pad_to_multiple import PadToMultiple
@@ -1,4 +1,5 @@
 """A simple image encoder-decoder model."""
+from typing import Optional, Dict, Any
 
 from torch.nn import Module
 
@@ -6,6 +7,7 @@ from torch import Tensor, set_grad_enabled
 
 from torch_tools.models._encoder_2d import Encoder2d
 from torch_tools.models._decoder_2d import Decoder2d
+from torch_tools.models._input_normalisation import get_input_norm
 
 from torch_tools.models._argument_processing import (
     process_num_feats,
@@ -43,6 +45,12 @@ class AutoEncoder2d(Module):
     kernel_size : int, optional
         Size of the square convolutional kernel to use on the ``Conv2d``
         layers. Must be a positive, odd, int.
+    input_norm_kwargs : Dict[str, Any], optional
+        Keyword arguments for an ``InputNormalisation`` layer, which casts,
+        scales and normalises the inputs as the model's first operation (see
+        ``torch_tools.models._input_normalisation``). This lets you feed the
+        model ``uint8`` images directly. If ``None``, there is no input
+        normalisation.
 
 
     Notes
@@ -92,10 +100,13 @@ class AutoEncoder2d(Module):
         pool_style: str = "max",
         bilinear: bool = False,
         kernel_size: int = 3,
+        input_norm_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """Build ``EncoderDecoder2d``."""
         super().__init__()
 
+        self.input_norm = get_input_norm(input_norm_kwargs)
+
         self.encoder = Encoder2d(
             process_num_feats(in_chans),
             process_num_feats(features_start),
@@ -139,6 +150,9 @@ class AutoEncoder2d(Module):
             The result of passing ``batch`` through the model.
 
         """
+        if self.input_norm is not None:
+            batch = self.input_norm(batch)
+
         with set_grad_enabled(not frozen_encoder):
             encoded = self.encoder(batch)
 
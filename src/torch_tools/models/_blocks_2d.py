@@ -16,6 +16,7 @@ from torch_tools.models._argument_processing import (
     process_boolean_arg,
     process_str_arg,
 )
+from torch_tools.validation import check_shapes
 
 # pylint: disable=too-many-arguments
 
@@ -518,24 +519,31 @@ class UNetUpBlock(Module):
         Tensor
             The output of the UNet upsampling skip connection.
 
+        Notes
+        -----
+        The shape checks are skipped if the validation level is ``"off"``
+        (see ``torch_tools.validation``).
+
         """
-        self._channel_size_check(to_upsample, down_features)
-        self._to_upsample_channel_check(to_upsample)
-        self._input_size_check(to_upsample, down_features)
+        if check_shapes():
+            self._channel_size_check(to_upsample, down_features)
+            self._to_upsample_channel_check(to_upsample)
+            self._input_size_check(to_upsample, down_features)
 
         upsampled = self.upsample(to_upsample)
 
         height_diff = down_features.shape[2] - upsampled.shape[2]
         width_diff = down_features.shape[3] - upsampled.shape[3]
 
-        padding = (
-            width_diff // 2,  # Left padding
-            width_diff - width_diff // 2,  # Right padding
-            height_diff // 2,  # Top padding
-            height_diff - height_diff // 2,  # Bottom padding
-        )
-
-        upsampled = pad(upsampled, padding)
+        # Inputs of a suitable size (see ``PadToMultiple``) need no padding
+        if height_diff or width_diff:
+            padding = (
+                width_diff // 2,  # Left padding
+                width_diff - width_diff // 2,  # Right padding
+                height_diff // 2,  # Top padding
+                height_diff - height_diff // 2,  # Bottom padding
+            )
+            upsampled = pad(upsampled, padding)
 
         # Concatenate along the channel dimension (dim=1) (N, C, H, W)
         concatenated = cat([down_features, upsampled], dim=1)
@@ -8,6 +8,7 @@ from torch_tools.models._argument_processing import process_num_feats
 from torch_tools.models._torchvision_encoder_backbones_2d import get_backbone
 from torch_tools.models._adaptive_pools_2d import get_adaptive_pool
 from torch_tools.models._fc_net import FCNet
+from torch_tools.models._input_normalisation import get_input_norm
 
 # pylint: disable=too-many-arguments
 
@@ -49,6 +50,12 @@ class ConvNet2d(Module):
         Keyword arguments for
         ``torch_tools.models.fc_net.FCNet`` which serves as the
         classification/regression part of the model.
+    input_norm_kwargs : Dict[str, Any], optional
+        Keyword arguments for an ``InputNormalisation`` layer, which casts,
+        scales and normalises the inputs as the model's first operation (see
+        ``torch_tools.models._input_normalisation``). This lets you feed the
+        model ``uint8`` images directly. If ``None``, there is no input
+        normalisation.
 
     Examples
     --------
@@ -99,9 +106,11 @@ class ConvNet2d(Module):
         pretrained=True,
         pool_style: str = "avg-max-concat",
         fc_net_kwargs: Optional[Dict[str, Any]] = None,
+        input_norm_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """Build `ConvNet2d`."""
         super().__init__()
+        self.input_norm = get_input_norm(input_norm_kwargs)
         self.backbone, num_feats, pool_size = get_backbone(
             encoder_style,
             pretrained=pretrained,
@@ -171,6 +180,9 @@ class ConvNet2d(Module):
             The result of passing ``batch`` through the model.
 
         """
+        if self.input_norm is not None:
+            batch = self.input_norm(batch)
+
         with set_grad_enabled(not frozen_encoder):
             encoder_out = self.backbone(batch)
         pool_out = self.pool(encoder_out)
@@ -1,11 +1,13 @@
 """A fully connected neural network model."""
-from typing import Optional, Tuple, Union, List
+from typing import Optional, Tuple, Union, List, Dict, Any
 
 from torch.nn import Module, Sequential
 
 from torch_tools.models._blocks_1d import DenseBlock, InputBlock
 
 from torch_tools.models._argument_processing import process_hidden_sizes
+from torch_tools.models._input_normalisation import get_input_norm
+from torch_tools.models._input_normalisation import prepend_input_norm
 
 # pylint: disable=too-many-arguments
 
@@ -36,6 +38,12 @@ class FCNet(Sequential):
         Should we include batch norms in the hidden layers?
     negative_slope : float, optional
         The negative slope argument to use in the ``LeakyReLU`` layers.
+    input_norm_kwargs : Dict[str, Any], optional
+        Keyword arguments for an ``InputNormalisation`` layer, which casts,
+        scales and normalises the inputs as the model's first operation (see
+        ``torch_tools.models._input_normalisation``). This lets you feed the
+        model ``uint8`` images directly. If ``None``, there is no input
+        normalisation.
 
     Examples
     --------
@@ -61,8 +69,10 @@ class FCNet(Sequential):
         hidden_dropout: float = 0.25,
         hidden_bnorm: bool = True,
         negative_slope: float = 0.1,
+        input_norm_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """Build `DenseClassifier`."""
+        input_norm = get_input_norm(input_norm_kwargs)
         super().__init__(
             *self._list_all_blocks(
                 in_feats,
@@ -73,8 +83,9 @@ class FCNet(Sequential):
                 hidden_dropout,
                 hidden_bnorm,
                 negative_slope,
-            )
+            ),
         )
+        prepend_input_norm(self, input_norm)
 
     def _list_all_blocks(
         self,
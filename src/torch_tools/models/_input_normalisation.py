@@ -0,0 +1,233 @@
+"""Input-normalisation layer for models which take compact (uint8) inputs."""
+from typing import Optional, Tuple, Dict, Any, Union
+
+import torch
+from torch import Tensor, as_tensor, addcmul  # pylint: disable=no-name-in-module
+from torch import get_default_dtype, float64  # pylint: disable=no-name-in-module
+from torch.nn import Module, Sequential
+
+
+class InputNormalisation(Module):
+    """Cast, scale and normalise a mini-batch as a model's first operation.
+
+    Computes ``((batch * scale) - mean) / std`` in a single pass, so
+    datasets can hand models compact ``uint8`` images rather than float
+    tensors four times the size.
+
+    Parameters
+    ----------
+    scale : float, optional
+        Factor the inputs are multiplied by before normalising. The default,
+        ``1 / 255``, maps ``uint8`` images onto ``[0, 1]``.
+    mean : Tuple[float, ...], optional
+        The mean to subtract from each channel (or feature). Either a single
+        value, or one per channel. If ``None``, no mean is subtracted.
+    std : Tuple[float, ...], optional
+        The standard deviation to divide each channel (or feature) by. Either
+        a single value, or one per channel. If ``None``, there is no division.
+
+    Notes
+    -----
+    The output has the dtype of the layer's buffers, which follow the model
+    when it is cast (e.g. with ``model.half()``). The channel (or feature)
+    dimension is taken to be ``dim=1``.
+
+    The buffers are computed from ``scale``, ``mean`` and ``std``, so are not
+    saved in state dicts. A layer built on the meta device gets them from
+    ``reset_buffers``.
+
+    Examples
+    --------
+    >>> from torch import randint, uint8
+    >>> from torch_tools.models._input_normalisation import InputNormalisation
+    >>> norm = InputNormalisation(mean=(0.485, 0.456, 0.406),
+                                  std=(0.229, 0.224, 0.225))
+    >>> norm(randint(0, 256, (10, 3, 64, 64), dtype=uint8)).dtype
+    torch.float32
+
+    """
+
+    def __init__(
+        self,
+        scale: float = 1.0 / 255.0,
+        mean: Optional[Tuple[float, ...]] = None,
+        std: Optional[Tuple[float, ...]] = None,
+    ):
+        """Build ``InputNormalisation``."""
+        super().__init__()
+        self._scale = _process_scale(scale)
+        self._mean = _process_stat(mean, "mean", 0.0)
+        self._std = _process_stat(std, "std", 1.0)
+
+        self.register_buffer("mult", None, False)
+        self.register_buffer("shift", None, False)
+        self.reset_buffers()
+
+    mult: Tensor
+    shift: Tensor
+
+    def reset_buffers(self, device: Optional[Union[str, torch.device]] = None):
+        """Compute the buffers from ``scale``, ``mean`` and ``std``.
+
+        The buffers keep their dtype.
+
+        Parameters
+        ----------
+        device : str or torch.device, optional
+            The device to create the buffers on. If ``None``, the default
+            device is used.
+
+        """
+        dtype = get_default_dtype() if self.mult is None else self.mult.dtype
+        mean_t = as_tensor(self._mean, dtype=float64, device=device)
+        std_t = as_tensor(self._std, dtype=float64, device=device)
+
+        # y = x * (scale / std) - (mean / std)
+        self.mult = (self._scale / std_t).to(dtype)
+        self.shift = (-mean_t / std_t).to(dtype)
+
+    def forward(self, batch: Tensor) -> Tensor:
+        """Normalise ``batch``.
+
+        Parameters
+        ----------
+        batch : Tensor
+            A mini-batch of inputs, of any dtype.
+
+        Returns
+        -------
+        Tensor
+            The normalised mini-batch.
+
+        """
+        shape = (1, -1) + (1,) * (batch.dim() - 2)
+        return addcmul(self.shift.view(shape), batch, self.mult.view(shape))
+
+
+def _process_scale(scale: float) -> float:
+    """Check ``scale`` is a positive float.
+
+    Parameters
+    ----------
+    scale : float
+        The scale argument.
+
+    Returns
+    -------
+    float
+        ``scale``.
+
+    Raises
+    ------
+    TypeError
+        If ``scale`` is not a float.
+    ValueError
+        If ``scale`` is not positive.
+
+    """
+    if not isinstance(scale, float):
+        raise TypeError(f"'scale' should be a float. Got '{type(scale)}'.")
+    if scale <= 0.0:
+        raise ValueError(f"'scale' should be positive. Got '{scale}'.")
+    return scale
+
+
+def _process_stat(
+    stat: Optional[Tuple[float, ...]],
+    name: str,
+    default: float,
+) -> Tuple[float, ...]:
+    """Check a ``mean`` or ``std`` argument.
+
+    Parameters
+    ----------
+    stat : Tuple[float, ...], optional
+        The per-channel statistic.
+    name : str
+        The name of the argument, for the error messages.
+    default : float
+        The value to use if ``stat`` is ``None``.
+
+    Returns
+    -------
+    Tuple[float, ...]
+        ``stat``, or ``(default,)``.
+
+    Raises
+    ------
+    TypeError
+        If ``stat`` is not a tuple of floats.
+    ValueError
+        If ``stat`` is empty, or ``name`` is ``"std"`` and ``stat`` has values
+        which are not positive.
+
+    """
+    if stat is None:
+        return (default,)
+    if not isinstance(stat, tuple):
+        raise TypeError(f"'{name}' should be a tuple. Got '{type(stat)}'.")
+    if not all(map(lambda x: isinstance(x, float), stat)):
+        msg = f"'{name}' should only contain floats. Got types "
+        msg += f"'{list(map(type, stat))}'."
+        raise TypeError(msg)
+    if len(stat) == 0:
+        raise ValueError(f"'{name}' should not be empty.")
+    if name == "std" and any(map(lambda x: x <= 0.0, stat)):
+        raise ValueError(f"'std' values should be positive. Got '{stat}'.")
+    return stat
+
+
+def get_input_norm(
+    input_norm_kwargs: Optional[Dict[str, Any]],
+) -> Optional[InputNormalisation]:
+    """Build an ``InputNormalisation`` layer, if one is requested.
+
+    Parameters
+    ----------
+    input_norm_kwargs : Dict[str, Any], optional
+        Keyword arguments for ``InputNormalisation``, or ``None`` for no input
+        normalisation.
+
+    Returns
+    -------
+    InputNormalisation or None
+        The layer, or ``None``.
+
+    Raises
+    ------
+    TypeError
+        If ``input_norm_kwargs`` is not a dict or ``None``.
+
+    """
+    if input_norm_kwargs is None:
+        return None
+    if not isinstance(input_norm_kwargs, dict):
+        msg = "'input_norm_kwargs' should be a dict or None. Got "
+        msg += f"'{type(input_norm_kwargs)}'."
+        raise TypeError(msg)
+    return InputNormalisation(**input_norm_kwargs)
+
+
+def prepend_input_norm(model: Sequential, input_norm: Optional[InputNormalisation]):
+    """Make ``input_norm`` the first layer of ``model``, as ``model.input_norm``.
+
+    The layer is registered under the name ``"input_norm"``, rather than a
+    position, so the other layers keep their names—and ``model``'s state
+    dict keeps its keys. It is moved to the front, so ``Sequential.forward``
+    applies it first.
+
+    Parameters
+    ----------
+    model : Sequential
+        The model.
+    input_norm : InputNormalisation, optional
+        The input normalisation layer, or ``None`` for no input normalisation.
+
+    """
+    setattr(model, "input_norm", input_norm)
+    if input_norm is None:
+        return
+
+    # pylint: disable=protected-access
+    for name in [name for name in model._modules if name != "input_norm"]:
+        model._modules[name] = model._modules.pop(name)
@@ -0,0 +1,200 @@
+"""Wrapper which pads inputs to a size a model accepts, and crops back."""
+from typing import Optional, Tuple, Any
+from functools import lru_cache
+
+from torch import Tensor
+from torch.nn import Module
+from torch.nn.functional import pad
+
+from torch_tools.models._blocks_2d import DownBlock
+
+
+class PadToMultiple(Module):
+    """Pad image batches to a multiple of a model's downsampling factor.
+
+    Models like ``UNet`` and ``AutoEncoder2d`` halve the size of their
+    inputs ``num_layers - 1`` times, so they only reproduce the input size
+    exactly if the height and width are divisible by ``2 ** (num_layers -
+    1)``. This wrapper pads each batch, once, up to the smallest size the
+    model accepts, runs the model and crops the output back to the input's
+    size. Images of arbitrary size can then be used without resizing them.
+
+    Parameters
+    ----------
+    model : Module
+        The model to wrap. Its outputs should have the same height and width
+        as its inputs.
+    multiple : int, optional
+        The number the padded height and width should be divisible by. If
+        ``None``, it is ``2 ** n``, where ``n`` is the number of
+        ``DownBlock``s in ``model``.
+    mode : str, optional
+        The padding mode: ``"constant"`` (zeros), ``"reflect"`` or
+        ``"replicate"``. See ``torch.nn.functional.pad``.
+
+    Examples
+    --------
+    >>> from torch import rand
+    >>> from torch_tools import UNet
+    >>> from torch_tools.models import PadToMultiple
+    >>> model = PadToMultiple(UNet(in_chans=3, out_chans=2, num_layers=4))
+    >>> model(rand(10, 3, 100, 75)).shape
+    torch.Size([10, 2, 100, 75])
+
+    Notes
+    -----
+    The padding is split as evenly as possible between the two sides of each
+    dimension, and is computed once per input size and cached.
+
+    Keyword arguments to ``forward`` (such as ``AutoEncoder2d``'s
+    ``frozen_encoder``) are passed on to ``model``.
+
+    """
+
+    def __init__(
+        self,
+        model: Module,
+        multiple: Optional[int] = None,
+        mode: str = "constant",
+    ):
+        """Build ``PadToMultiple``."""
+        super().__init__()
+        if not isinstance(model, Module):
+            msg = f"'model' should be a 'Module'. Got '{type(model)}'."
+            raise TypeError(msg)
+        self.model = model
+        self._multiple = self._process_multiple(model, multiple)
+        self._mode = self._process_mode(mode)
+
+    @staticmethod
+    def _process_multiple(model: Module, multiple: Optional[int]) -> int:
+        """Process the ``multiple`` argument.
+
+        Parameters
+        ----------
+        model : Module
+            The model being wrapped.
+        multiple : int, optional
+            The user-requested multiple.
+
+        Returns
+        -------
+        int
+            The multiple.
+
+        Raises
+        ------
+        TypeError
+            If ``multiple`` is not an int (or ``None``).
+        ValueError
+            If ``multiple`` is not positive.
+
+        """
+        if multiple is None:
+            return 2 ** sum(map(lambda x: isinstance(x, DownBlock), model.modules()))
+        if not isinstance(multiple, int):
+            msg = f"'multiple' should be an int or None. Got '{type(multiple)}'."
+            raise TypeError(msg)
+        if multiple < 1:
+            raise ValueError(f"'multiple' should be positive. Got '{multiple}'.")
+        return multiple
+
+    @staticmethod
+    def _process_mode(mode: str) -> str:
+        """Process the ``mode`` argument.
+
+        Parameters
+        ----------
+        mode : str
+            The padding mode.
+
+        Returns
+        -------
+        str
+            The padding mode.
+
+        Raises
+        ------
+        TypeError
+            If ``mode`` is not a str.
+        ValueError
+            If ``mode`` is not one of the allowed options.
+
+        """
+        options = ("constant", "reflect", "replicate")
+        if not isinstance(mode, str):
+            raise TypeError(f"'mode' should be a str. Got '{type(mode)}'.")
+        if mode not in options:
+            raise ValueError(f"'mode' should be one of {options}. Got '{mode}'.")
+        return mode
+
+    @property
+    def multiple(self) -> int:
+        """The number the padded height and width are divisible by.
+
+        Returns
+        -------
+        int
+            The multiple.
+
+        """
+        return self._multiple
+
+    def forward(self, batch: Tensor, **kwargs: Any) -> Tensor:
+        """Pad ``batch``, pass it through the model and crop the output.
+
+        Parameters
+        ----------
+        batch : Tensor
+            A mini-batch of image-like inputs, of size ``(N, C, H, W)``.
+        kwargs : Any
+            Keyword arguments for the wrapped model's ``forward``.
+
+        Returns
+        -------
+        Tensor
+            The model's output, cropped to height ``H`` and width ``W``.
+
+        """
+        height, width = batch.shape[-2:]
+        left, right, top, bottom = padding_to_multiple(height, width, self._multiple)
+
+        if not left + right + top + bottom:
+            return self.model(batch, **kwargs)
+
+        out = self.model(pad(batch, (left, right, top, bottom), self._mode), **kwargs)
+        return out[..., top : top + height, left : left + width]
+
+
+@lru_cache(maxsize=256)
+def padding_to_multiple(
+    height: int,
+    width: int,
+    multiple: int,
+) -> Tuple[int, int, int, int]:
+    """Return the padding taking ``(height, width)`` up to a ``multiple``.
+
+    Parameters
+    ----------
+    height : int
+        The image height.
+    width : int
+        The image width.
+    multiple : int
+        The number the padded height and width should be divisible by.
+
+    Returns
+    -------
+    Tuple[int, int, int, int]
+        The left, right, top and bottom padding, in the order
+        ``torch.nn.functional.pad`` takes them.
+
+    """
+    height_diff = -height % multiple
+    width_diff = -width % multiple
+    return (
+        width_diff // 2,
+        width_diff - width_diff // 2,
+        height_diff // 2,
+        height_diff - height_diff // 2,
+    )
@@ -9,6 +9,8 @@ from torch_tools.models._fc_net import FCNet
 from torch_tools.models._conv_net_2d import _forbidden_args_in_dn_kwargs
 from torch_tools.models._argument_processing import process_num_feats
 from torch_tools.models._argument_processing import process_2d_kernel_size
+from torch_tools.models._input_normalisation import get_input_norm
+from torch_tools.models._input_normalisation import prepend_input_norm
 
 # pylint: disable=too-many-arguments
 
@@ -40,6 +42,12 @@ class SimpleConvNet2d(Sequential):
     fc_net_kwargs : Dict[str, Any], optional
         Keyword arguments for ``torch_tools.models.fc_net.FCNet`` which serves
         as the classification/regression part of the model.
+    input_norm_kwargs : Dict[str, Any], optional
+        Keyword arguments for an ``InputNormalisation`` layer, which casts,
+        scales and normalises the inputs as the model's first operation (see
+        ``torch_tools.models._input_normalisation``). This lets you feed the
+        model ``uint8`` images directly. If ``None``, there is no input
+        normalisation.
 
     Examples
     --------
@@ -68,6 +76,7 @@ class SimpleConvNet2d(Sequential):
         lr_slope: float = 0.1,
         kernel_size: int = 3,
         fc_net_kwargs: Optional[Dict[str, Any]] = None,
+        input_norm_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """Build ``SimpleConvNet2d``."""
         encoder_feats = self._num_output_features(
@@ -80,6 +89,8 @@ class SimpleConvNet2d(Sequential):
             _forbidden_args_in_dn_kwargs(fc_net_kwargs)
             self._dn_args.update(fc_net_kwargs)
 
+        input_norm = get_input_norm(input_norm_kwargs)
+
         super().__init__(
             Encoder2d(
                 process_num_feats(in_chans),
@@ -100,6 +111,7 @@ class SimpleConvNet2d(Sequential):
                 **self._dn_args,
             ),
         )
+        prepend_input_norm(self, input_norm)
 
     _dn_args: Dict[str, Any] = {
         "hidden_sizes": None,
@@ -2,6 +2,7 @@
 from typing import Tuple
 
 from torchvision import models  # type: ignore
+from torch import empty  # pylint: disable=no-name-in-module
 from torch.nn import Module, Sequential
 
 from torch_tools.models._argument_processing import process_boolean_arg
@@ -55,6 +56,10 @@ def get_backbone(
 
     weights = "DEFAULT" if process_boolean_arg(pretrained) is True else None
 
+    # On the meta device, the pretrained weights would be discarded anyway.
+    if empty(0).is_meta:
+        weights = None
+
     if "vgg" in option:
         full_vgg = _encoder_options[option](weights=weights)
         encoder = Sequential(*list(full_vgg.features.children()))
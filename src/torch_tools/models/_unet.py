@@ -1,5 +1,5 @@
 """UNet model for semantic segmentation."""
-from typing import List
+from typing import List, Optional, Dict, Any
 from torch import Tensor
 
 from torch.nn import Module, Conv2d, ModuleList
@@ -11,6 +11,7 @@ from torch_tools.models._argument_processing import (
 )
 
 from torch_tools.models._blocks_2d import DoubleConvBlock, DownBlock, UNetUpBlock
+from torch_tools.models._input_normalisation import get_input_norm
 
 
 # pylint: disable=too-many-arguments
@@ -41,6 +42,12 @@ class UNet(Module):
     kernel_size : int, optional
         Linear size of the square convolutional kernel to use in the ``Conv2d``
         layers. Should be a positive, odd, int.
+    input_norm_kwargs : Dict[str, Any], optional
+        Keyword arguments for an ``InputNormalisation`` layer, which casts,
+        scales and normalises the inputs as the model's first operation (see
+        ``torch_tools.models._input_normalisation``). This lets you feed the
+        model ``uint8`` images directly. If ``None``, there is no input
+        normalisation.
 
 
     Examples
@@ -69,10 +76,13 @@ class UNet(Module):
         bilinear: bool = False,
         lr_slope: float = 0.1,
         kernel_size: int = 3,
+        input_norm_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """Build `UNet`."""
         super().__init__()
 
+        self.input_norm = get_input_norm(input_norm_kwargs)
+
         self.in_conv = DoubleConvBlock(
             in_chans,
             process_num_feats(features_start),
@@ -252,6 +262,8 @@ class UNet(Module):
             The result of passing ``batch`` through the model.
 
         """
+        if self.input_norm is not None:
+            batch = self.input_norm(batch)
         batch = self.in_conv(batch)
         down_features = self._down_forward_pass(batch)
         return self.out_conv(self._up_forward_pass(down_features))
@@ -0,0 +1,1036 @@
+"""Incremental preprocessing of datasets stored as directory trees."""
+import os
+import json
+import sqlite3
+import hashlib
+import tarfile
+from time import perf_counter
+from pathlib import Path
+from zipfile import ZipFile
+from itertools import islice
+from contextlib import closing, contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple, IO
+from typing import Iterator, Sequence, Dict, Any
+
+import torch
+from torch import Tensor, uint8  # pylint: disable=no-name-in-module
+from torchvision.transforms import Compose  # type: ignore
+
+from torch_tools.archive_utils import TAR_SUFFIXES
+from torch_tools.file_utils import walk_directory_tree
+
+
+# pylint: disable=too-many-arguments, too-many-locals, too-many-lines
+
+_HASH_BLOCK = 2**20
+
+Artefact = Tuple[str, str]
+
+
+class ManifestChanges(NamedTuple):
+    """Files which have changed since a manifest was last updated.
+
+    Parameters
+    ----------
+    added : List[Path]
+        Files which are not in the manifest.
+    changed : List[Path]
+        Files whose contents have changed.
+    deleted : List[Path]
+        Files in the manifest which no longer exist.
+
+    """
+
+    added: List[Path]
+    changed: List[Path]
+    deleted: List[Path]
+
+
+class PreprocessingManifest:
+    """Record of the files in a dataset, and what was derived from them.
+
+    The manifest records, for each file, its size, modification time and
+    a hash of its contents, along with the derived artefacts (cache entries,
+    packed shards, etc.) preprocessing it produced. A rebuild then only
+    processes the files which are new or have changed, and removes the
+    artefacts of files which have changed or been deleted.
+
+    Parameters
+    ----------
+    manifest_path : Path
+        The path of the manifest (an SQLite database). It is created if it
+        doesn't exist.
+
+    Notes
+    -----
+    An artefact is a ``(store, key)`` pair of strings—for example
+    ``("shard", "shard_0003.pt")`` or ``("cache", "42")``—whose meaning is up
+    to the code which creates and removes them.
+
+    A file whose size or modification time differ from the manifest's has
+    its contents hashed, and only counts as changed if the hash differs, so
+    touching a file does not trigger reprocessing.
+
+    Members of zip files and tar archives (which ``walk_directory_tree``
+    lists in place of the archives) are tracked by their archive's size and
+    modification time, and the hash of their own contents.
+
+    Paths and artefact keys are stored as bytes (encoded with
+    ``os.fsencode``), so names which aren't valid UTF-8—and keys made from
+    them—are recorded like any other.
+
+    Use one manifest per dataset root.
+
+    Examples
+    --------
+    >>> from torch_tools.preprocessing import PreprocessingManifest
+    >>> manifest = PreprocessingManifest(Path("manifest.sqlite"))
+    >>> def process(path):
+            tensor = load_and_transform(path)
+            save(tensor, cache_dir / f"{path.stem}.pt")
+            return [("cache", f"{path.stem}.pt")]
+    >>> def remove(store, key):
+            (cache_dir / key).unlink(missing_ok=True)
+    >>> changes = manifest.update(Path("dataset/"), process, remove)
+
+    """
+
+    _version = 1
+
+    _schema = """
+        CREATE TABLE IF NOT EXISTS files (
+            path BLOB PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            digest TEXT
+        );
+        CREATE TABLE IF NOT EXISTS artefacts (
+            path BLOB,
+            store TEXT,
+            key BLOB,
+            PRIMARY KEY (path, store, key)
+        );
+    """
+
+    # Manifests written before paths and keys were stored as bytes hold them
+    # as text, whose UTF-8 encoding is what ``os.fsencode`` gives for them.
+    _migration = """
+        UPDATE files SET path = CAST(path AS BLOB) WHERE typeof(path) = 'text';
+        UPDATE artefacts SET path = CAST(path AS BLOB), key = CAST(key AS BLOB)
+        WHERE typeof(path) = 'text' OR typeof(key) = 'text';
+    """
+
+    def __init__(self, manifest_path: Path):
+        """Build ``PreprocessingManifest``."""
+        if not isinstance(manifest_path, Path):
+            msg = f"'manifest_path' should be a 'Path'. Got '{type(manifest_path)}'."
+            raise TypeError(msg)
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = manifest_path
+
+        with closing(self._connect()) as conn:
+            conn.executescript(self._schema)
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self._version:
+                conn.executescript(self._migration)
+                conn.execute(f"PRAGMA user_version = {self._version}")
+                conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the manifest.
+
+        Returns
+        -------
+        sqlite3.Connection
+            The connection.
+
+        """
+        return sqlite3.connect(self._manifest_path)
+
+    def changes(self, directory: Path, num_threads: int = 1) -> ManifestChanges:
+        """Compare the files in ``directory`` against the manifest.
+
+        Parameters
+        ----------
+        directory : Path
+            The dataset's root directory.
+        num_threads : int, optional
+            The number of threads to list ``directory`` with. See
+            ``torch_tools.file_utils.walk_directory_tree``.
+
+        Returns
+        -------
+        ManifestChanges
+            The added, changed and deleted files, each sorted.
+
+        Notes
+        -----
+        This does not modify the manifest, except to record the new sizes
+        and modification times of files which were touched but not changed.
+
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "CREATE TEMP TABLE seen (path BLOB PRIMARY KEY, size INT, mtime_ns INT)"
+            )
+            conn.executemany(
+                "INSERT INTO seen VALUES (?, ?, ?)",
+                map(
+                    lambda x: (os.fsencode(x), *_source_stat(x)),
+                    walk_directory_tree(directory, num_threads=num_threads),
+                ),
+            )
+
+            added = conn.execute(
+                """SELECT seen.path FROM seen LEFT JOIN files USING (path)
+                WHERE files.path IS NULL ORDER BY seen.path"""
+            )
+            added_paths = [Path(os.fsdecode(path)) for (path,) in added]
+
+            candidates = conn.execute(
+                """SELECT seen.path, seen.size, seen.mtime_ns, files.digest
+                FROM seen JOIN files USING (path)
+                WHERE seen.size != files.size OR seen.mtime_ns != files.mtime_ns
+                ORDER BY seen.path"""
+            ).fetchall()
+
+            candidate_paths = [Path(os.fsdecode(path)) for path, *_ in candidates]
+            digests = _source_digests(candidate_paths)
+
+            changed_paths = []
+            for source, (path, size, mtime_ns, digest) in zip(
+                candidate_paths, candidates
+            ):
+                if digests[source] != digest:
+                    changed_paths.append(source)
+                else:
+                    conn.execute(
+                        "UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                        (size, mtime_ns, path),
+                    )
+
+            prefix = os.fsencode(os.path.join(directory, ""))
+            deleted = conn.execute(
+                """SELECT files.path FROM files LEFT JOIN seen USING (path)
+                WHERE seen.path IS NULL ORDER BY files.path"""
+            )
+            deleted_paths = [
+                Path(os.fsdecode(x)) for (x,) in deleted if x.startswith(prefix)
+            ]
+
+            conn.commit()
+
+        return ManifestChanges(added_paths, changed_paths, deleted_paths)
+
+    def artefacts(self, path: Path) -> List[Artefact]:
+        """List the artefacts recorded for ``path``.
+
+        Parameters
+        ----------
+        path : Path
+            A source file.
+
+        Returns
+        -------
+        List[Tuple[str, str]]
+            The ``(store, key)`` pairs recorded for ``path``.
+
+        """
+        with closing(self._connect()) as conn:
+            query = "SELECT store, key FROM artefacts WHERE path = ? ORDER BY rowid"
+            rows = conn.execute(query, (os.fsencode(path),))
+            return [(store, os.fsdecode(key)) for store, key in rows]
+
+    def record(self, path: Path, artefacts: Iterable[Artefact]):
+        """Record that ``path`` has been processed into ``artefacts``.
+
+        Parameters
+        ----------
+        path : Path
+            The source file, whose size, modification time and hash are
+            recorded.
+        artefacts : Iterable[Tuple[str, str]]
+            The ``(store, key)`` pairs produced from ``path``. They replace
+            any previously recorded for ``path``.
+
+        """
+        self.record_many([(path, artefacts)])
+
+    def record_many(self, records: Iterable[Tuple[Path, Iterable[Artefact]]]):
+        """Record several processed files in a single transaction.
+
+        Parameters
+        ----------
+        records : Iterable[Tuple[Path, Iterable[Tuple[str, str]]]]
+            Pairs of a source file and the artefacts produced from it. See
+            ``record``.
+
+        Notes
+        -----
+        The files are hashed together, so each archive is read once however
+        many of its members are recorded, and the manifest is committed (and
+        synced to disk) once, rather than once per file.
+
+        """
+        listed = [(path, list(artefacts)) for path, artefacts in records]
+        self._write_records(listed, _source_states([path for path, _ in listed]))
+
+    def _write_records(
+        self,
+        records: Sequence[Tuple[Path, List[Artefact]]],
+        states: Dict[Path, Tuple[int, int, str]],
+    ):
+        """Write ``records`` to the manifest in a single transaction.
+
+        Parameters
+        ----------
+        records : Sequence[Tuple[Path, List[Tuple[str, str]]]]
+            Pairs of a source file and its artefacts.
+        states : Dict[Path, Tuple[int, int, str]]
+            The size, modification time and digest of each source file.
+
+        """
+        with closing(self._connect()) as conn:
+            for path, artefacts in records:
+                conn.execute(
+                    "DELETE FROM artefacts WHERE path = ?", (os.fsencode(path),)
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO artefacts VALUES (?, ?, ?)",
+                    (
+                        (os.fsencode(path), store, os.fsencode(key))
+                        for store, key in artefacts
+                    ),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                    (os.fsencode(path), *states[path]),
+                )
+            conn.commit()
+
+    def forget(self, path: Path):
+        """Remove ``path``, and its artefacts, from the manifest.
+
+        Parameters
+        ----------
+        path : Path
+            The source file.
+
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM artefacts WHERE path = ?", (os.fsencode(path),))
+            conn.execute("DELETE FROM files WHERE path = ?", (os.fsencode(path),))
+            conn.commit()
+
+    def update(
+        self,
+        directory: Path,
+        process: Callable[[Path], Iterable[Artefact]],
+        remove: Optional[Callable[[str, str], None]] = None,
+        num_threads: int = 1,
+        commit_every: int = 1000,
+    ) -> ManifestChanges:
+        """Bring the derived stores, and the manifest, up to date.
+
+        Parameters
+        ----------
+        directory : Path
+            The dataset's root directory.
+        process : Callable[[Path], Iterable[Tuple[str, str]]]
+            Called with each new or changed file. It should write the file's
+            artefacts to the derived stores, and return their
+            ``(store, key)`` pairs.
+        remove : Callable[[str, str], None], optional
+            Called with the ``store`` and ``key`` of each artefact of a
+            changed or deleted file, to remove it from its store. If
+            ``None``, the artefacts are only forgotten.
+        num_threads : int, optional
+            The number of threads to list ``directory`` with.
+        commit_every : int, optional
+            The number of processed files to record in each transaction.
+
+        Returns
+        -------
+        ManifestChanges
+            The files which were added, changed and deleted.
+
+        Raises
+        ------
+        TypeError
+            If ``commit_every`` is not an int.
+        ValueError
+            If ``commit_every`` is less than one.
+
+        Notes
+        -----
+        Progress is saved after every ``commit_every`` files, so an
+        interrupted update can be rerun and will pick up (nearly) where it
+        stopped. Up to ``commit_every`` files may therefore be processed
+        again, and ``remove`` may be called for artefacts which were already
+        removed, so neither should fail if the artefacts already exist or are
+        missing.
+
+        The sizes, modification times and hashes of the files are read
+        before they are processed—each archive in a single pass—so a file
+        modified while it is processed counts as changed next time.
+
+        """
+        if not isinstance(commit_every, int):
+            msg = f"'commit_every' should be an int. Got '{type(commit_every)}'."
+            raise TypeError(msg)
+        if commit_every < 1:
+            msg = f"'commit_every' should be at least one. Got '{commit_every}'."
+            raise ValueError(msg)
+
+        changes = self.changes(directory, num_threads=num_threads)
+
+        with closing(self._connect()) as conn:
+            for path in changes.changed + changes.deleted:
+                query = "SELECT store, key FROM artefacts WHERE path = ?"
+                for store, key in conn.execute(query, (os.fsencode(path),)).fetchall():
+                    if remove is not None:
+                        remove(store, os.fsdecode(key))
+                conn.execute(
+                    "DELETE FROM artefacts WHERE path = ?", (os.fsencode(path),)
+                )
+                conn.execute("DELETE FROM files WHERE path = ?", (os.fsencode(path),))
+            conn.commit()
+
+        todo = changes.added + changes.changed
+        states = _source_states(todo)
+
+        for start in range(0, len(todo), commit_every):
+            chunk = todo[start : start + commit_every]
+            self._write_records([(x, list(process(x))) for x in chunk], states)
+
+        return changes
+
+
+def _split_archive_path(path: Path) -> Optional[Tuple[Path, str]]:
+    """Split the path of an archive member into the archive and member name.
+
+    Parameters
+    ----------
+    path : Path
+        A path yielded by ``walk_directory_tree``.
+
+    Returns
+    -------
+    Tuple[Path, str] or None
+        The archive's path and the member's name, or ``None`` if ``path`` is
+        not in an archive.
+
+    """
+    for parent in path.parents:
+        if parent.name.endswith((".zip",) + TAR_SUFFIXES) and parent.is_file():
+            return parent, path.relative_to(parent).as_posix()
+    return None
+
+
+def _source_stat(path: Path) -> Tuple[int, int]:
+    """Return the size and modification time of a source file.
+
+    Parameters
+    ----------
+    path : Path
+        A source file, or a member of an archive.
+
+    Returns
+    -------
+    Tuple[int, int]
+        The size and modification time (in nanoseconds) of the file, or of
+        its archive.
+
+    """
+    split = _split_archive_path(path) if not path.is_file() else None
+    stat = os.stat(split[0] if split is not None else path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+@contextmanager
+def _open_source(path: Path) -> Iterator[IO[bytes]]:
+    """Open a source file, or archive member, for reading.
+
+    Parameters
+    ----------
+    path : Path
+        A source file, or a member of an archive.
+
+    Yields
+    ------
+    IO[bytes]
+        The open file.
+
+    Raises
+    ------
+    FileNotFoundError
+        If ``path`` does not exist.
+
+    """
+    split = _split_archive_path(path) if not path.is_file() else None
+    if split is None:
+        with open(path, "rb") as source:
+            yield source
+        return
+
+    archive, name = split
+    if archive.name.endswith(".zip"):
+        with ZipFile(archive) as zip_file, zip_file.open(name) as source:
+            yield source
+        return
+
+    with tarfile.open(archive, mode="r:*") as tar_file:
+        extracted = tar_file.extractfile(name)
+        if extracted is None:
+            raise FileNotFoundError(path)
+        yield extracted
+
+
+def _hash_stream(source: IO[bytes]) -> str:
+    """Hash the contents of an open file.
+
+    Parameters
+    ----------
+    source : IO[bytes]
+        The open file.
+
+    Returns
+    -------
+    str
+        The BLAKE2b (128-bit) hex digest of the contents.
+
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    while block := source.read(_HASH_BLOCK):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_digest(path: Path) -> str:
+    """Hash the contents of a source file.
+
+    Parameters
+    ----------
+    path : Path
+        A source file, or a member of an archive.
+
+    Returns
+    -------
+    str
+        The BLAKE2b (128-bit) hex digest of the contents.
+
+    """
+    with _open_source(path) as source:
+        return _hash_stream(source)
+
+
+def _source_digests(paths: Iterable[Path]) -> Dict[Path, str]:
+    """Hash the contents of several source files.
+
+    Parameters
+    ----------
+    paths : Iterable[Path]
+        Source files, or members of archives.
+
+    Returns
+    -------
+    Dict[Path, str]
+        The digest of each file (see ``_source_digest``).
+
+    Notes
+    -----
+    Members are grouped by archive, and each archive is opened once. Tar
+    archives are read in a single pass, so compressed archives aren't
+    decompressed again for every member.
+
+    """
+    digests: Dict[Path, str] = {}
+    archives: Dict[Path, Dict[str, Path]] = {}
+
+    for path in paths:
+        split = _split_archive_path(path) if not path.is_file() else None
+        if split is None:
+            digests[path] = _source_digest(path)
+        else:
+            archives.setdefault(split[0], {})[split[1]] = path
+
+    for archive, members in archives.items():
+        digests.update(_archive_digests(archive, members))
+
+    return digests
+
+
+def _archive_digests(archive: Path, members: Dict[str, Path]) -> Dict[Path, str]:
+    """Hash the contents of ``members`` of ``archive``, opening it once.
+
+    Parameters
+    ----------
+    archive : Path
+        A zip file or tar archive.
+    members : Dict[str, Path]
+        The paths of the members to hash, keyed by their names in
+        ``archive``.
+
+    Returns
+    -------
+    Dict[Path, str]
+        The digest of each member.
+
+    Raises
+    ------
+    FileNotFoundError
+        If any of ``members`` are not in ``archive``.
+
+    """
+    digests: Dict[Path, str] = {}
+
+    if archive.name.endswith(".zip"):
+        with ZipFile(archive) as zip_file:
+            for name, path in members.items():
+                with zip_file.open(name) as source:
+                    digests[path] = _hash_stream(source)
+        return digests
+
+    with tarfile.open(archive, mode="r:*") as tar_file:
+        for info in tar_file:
+            if info.name in members and (extracted := tar_file.extractfile(info)):
+                digests[members[info.name]] = _hash_stream(extracted)
+
+    missing = [path for path in members.values() if path not in digests]
+    if missing:
+        raise FileNotFoundError(missing[0])
+    return digests
+
+
+def _source_states(paths: Sequence[Path]) -> Dict[Path, Tuple[int, int, str]]:
+    """Return the size, modification time and digest of each source file.
+
+    Parameters
+    ----------
+    paths : Sequence[Path]
+        Source files, or members of archives.
+
+    Returns
+    -------
+    Dict[Path, Tuple[int, int, str]]
+        The size and modification time (see ``_source_stat``) and digest of
+        each file.
+
+    """
+    stats = {path: _source_stat(path) for path in paths}
+    digests = _source_digests(paths)
+    return {path: (*stats[path], digests[path]) for path in paths}
+
+
+class TensorStore:
+    """Packed, memory-mapped store of tensors of the same shape and dtype.
+
+    A store is a directory holding:
+
+        - ``data.bin``: the tensors, packed back to back.
+        - ``done.bin``: one byte per tensor, set once the tensor is written.
+        - ``sources.txt``: the source file of each tensor.
+        - ``meta.json``: the number, shape and dtype of the tensors.
+
+    Parameters
+    ----------
+    directory : Path
+        The store's directory, as written by ``convert_directory_tree``.
+
+    Attributes
+    ----------
+    shape : Tuple[int, ...]
+        The shape of each tensor.
+    dtype : torch.dtype
+        The dtype of the tensors.
+    done : Tensor
+        The memory-mapped ``done.bin``: ``1`` for each tensor which has been
+        written, otherwise ``0``.
+
+    Notes
+    -----
+    Items are views into the memory-mapped ``data.bin``, so indexing the
+    store does not read or copy anything until the tensor's values are used.
+
+    Examples
+    --------
+    >>> from torch_tools import DataSet
+    >>> from torch_tools.preprocessing import TensorStore
+    >>> store = TensorStore(Path("converted/"))
+    >>> dataset = DataSet(inputs=list(store), targets=...)
+
+    """
+
+    def __init__(self, directory: Path):
+        """Build ``TensorStore``."""
+        if not isinstance(directory, Path):
+            msg = f"'directory' should be a 'Path'. Got '{type(directory)}'."
+            raise TypeError(msg)
+
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        self.shape = tuple(meta["shape"])
+        self.dtype = getattr(torch, meta["dtype"].split(".")[-1])
+        self._directory = directory
+        self._num_items = meta["num_items"]
+
+        full_shape = (self._num_items,) + self.shape
+        self._data = _map_file(directory / "data.bin", self.dtype, full_shape)
+        self.done = _map_file(directory / "done.bin", uint8, (self._num_items,))
+
+    @property
+    def sources(self) -> List[Path]:
+        """List the source file of each tensor.
+
+        Returns
+        -------
+        List[Path]
+            The source files, in the order of the tensors.
+
+        """
+        with open(
+            self._directory / "sources.txt", encoding="utf-8", errors="surrogateescape"
+        ) as handle:
+            return [Path(x) for x in handle.read().split("\0")[:-1]]
+
+    @property
+    def complete(self) -> bool:
+        """Check every tensor in the store has been written.
+
+        Returns
+        -------
+        bool
+            Whether the store is complete.
+
+        """
+        return bool(self.done.all())
+
+    def __len__(self) -> int:
+        """Return the number of tensors in the store.
+
+        Returns
+        -------
+        int
+            The number of tensors.
+
+        """
+        return self._num_items
+
+    def __getitem__(self, idx: int) -> Tensor:
+        """Return the tensor at ``idx``.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the tensor.
+
+        Returns
+        -------
+        Tensor
+            A view of the tensor in the memory-mapped store.
+
+        """
+        return self._data[idx]
+
+
+def convert_directory_tree(
+    directory: Path,
+    store_dir: Path,
+    input_tfms: Compose,
+    num_workers: Optional[int] = None,
+    chunk_size: int = 64,
+    suffixes: Optional[Sequence[str]] = None,
+    verbose: bool = False,
+) -> Dict[str, float]:
+    """Convert the files in ``directory`` to tensors, in a process pool.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory of raw files (images, etc.).
+    store_dir : Path
+        The directory of the ``TensorStore`` to write the tensors to. If it
+        already holds a store, the conversion is resumed.
+    input_tfms : Compose
+        Transforms mapping each file's path to a tensor, as you'd give
+        ``DataSet``'s ``input_tfms``. Every tensor must have the same shape
+        and dtype.
+    num_workers : int, optional
+        The number of worker processes. If ``None``, one per CPU. If zero,
+        the files are converted in this process.
+    chunk_size : int, optional
+        The number of files sent to a worker at a time.
+    suffixes : Sequence[str], optional
+        If not ``None``, only files with these suffixes are converted.
+    verbose : bool, optional
+        If ``True``, print progress and throughput as the conversion runs.
+
+    Returns
+    -------
+    Dict[str, float]
+        A report with the number of files ``"converted"`` in this call, the
+        number ``"skipped"`` (converted by an earlier call), the
+        ``"seconds"`` taken and the throughput in ``"files_per_sec"``.
+
+    Raises
+    ------
+    TypeError
+        If ``store_dir`` is not a ``Path``, or ``input_tfms`` is not a
+        ``Compose``, or the transforms do not return tensors.
+    ValueError
+        If ``num_workers`` is negative, ``chunk_size`` is not positive,
+        ``directory`` holds no matching files, or the transforms return
+        tensors of different shapes or dtypes.
+
+    Notes
+    -----
+    Workers write their tensors straight into the memory-mapped store, so
+    tensors are never sent between processes. Each tensor is marked as done
+    once its chunk is complete: if the conversion crashes, or is stopped,
+    calling this function again carries on from where it stopped, skipping
+    the tensors already written. A resumed conversion keeps the original
+    list of files—to pick up new files, convert them to a new store.
+
+    The transforms are sent to the workers once, when the pool starts,
+    and must be picklable if the platform starts processes by spawning them
+    (e.g. macOS and Windows).
+
+    """
+    if not isinstance(store_dir, Path):
+        raise TypeError(f"'store_dir' should be a 'Path'. Got '{type(store_dir)}'.")
+    if not isinstance(input_tfms, Compose):
+        msg = f"'input_tfms' should be a 'Compose'. Got '{type(input_tfms)}'."
+        raise TypeError(msg)
+    num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+    if not isinstance(num_workers, int) or num_workers < 0:
+        raise ValueError(
+            f"'num_workers' should be a non-negative int. Got '{num_workers}'."
+        )
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        raise ValueError(f"'chunk_size' should be a positive int. Got '{chunk_size}'.")
+
+    if not (store_dir / "meta.json").exists():
+        _create_store(directory, store_dir, input_tfms, suffixes)
+
+    store = TensorStore(store_dir)
+    done = store.done.tolist()
+    todo = [(idx, str(x)) for idx, x in enumerate(store.sources) if not done[idx]]
+    chunks = [todo[i : i + chunk_size] for i in range(0, len(todo), chunk_size)]
+
+    start, converted = perf_counter(), 0
+    full_shape = (len(store),) + store.shape
+    init_args = (input_tfms, store_dir / "data.bin", store.dtype, full_shape)
+
+    for indices in _converted_chunks(chunks, init_args, num_workers):
+        store.done[indices] = 1
+        converted += len(indices)
+        if verbose is True:
+            rate = converted / (perf_counter() - start)
+            print(f"Converted {converted}/{len(todo)} files ({rate:.1f} files/s).")
+
+    seconds = perf_counter() - start
+    return {
+        "converted": float(converted),
+        "skipped": float(len(store) - len(todo)),
+        "seconds": seconds,
+        "files_per_sec": converted / max(seconds, 1e-9),
+    }
+
+
+def _create_store(
+    directory: Path,
+    store_dir: Path,
+    input_tfms: Compose,
+    suffixes: Optional[Sequence[str]],
+):
+    """List ``directory`` and create an empty store for its tensors.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory of raw files.
+    store_dir : Path
+        The store's directory.
+    input_tfms : Compose
+        The transforms, which are applied to the first file to find the shape
+        and dtype of the tensors.
+    suffixes : Sequence[str], optional
+        The suffixes of the files to convert.
+
+    Raises
+    ------
+    ValueError
+        If ``directory`` holds no matching files.
+    TypeError
+        If the transforms do not return a ``Tensor``.
+
+    """
+    sources = list(walk_directory_tree(directory, suffixes=suffixes, sort=True))
+    if len(sources) == 0:
+        raise ValueError(f"No files to convert in '{directory}'.")
+
+    first = input_tfms(sources[0])
+    if not isinstance(first, Tensor):
+        msg = f"'input_tfms' should return tensors. Got '{type(first)}'."
+        raise TypeError(msg)
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    with open(
+        store_dir / "sources.txt", "w", encoding="utf-8", errors="surrogateescape"
+    ) as handle:
+        handle.writelines(f"{x}\0" for x in sources)
+
+    nbytes = len(sources) * first.numel() * first.element_size()
+    os.truncate(_touch(store_dir / "data.bin"), nbytes)
+    os.truncate(_touch(store_dir / "done.bin"), len(sources))
+
+    meta = {
+        "shape": list(first.shape),
+        "dtype": str(first.dtype),
+        "num_items": len(sources),
+    }
+    tmp_path = store_dir / "meta.json.tmp"
+    tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp_path, store_dir / "meta.json")
+
+
+def _touch(path: Path) -> Path:
+    """Create an empty file at ``path``.
+
+    Parameters
+    ----------
+    path : Path
+        The file to create (or empty).
+
+    Returns
+    -------
+    Path
+        ``path``.
+
+    """
+    path.write_bytes(b"")
+    return path
+
+
+def _map_file(path: Path, dtype: torch.dtype, shape: Tuple[int, ...]) -> Tensor:
+    """Memory-map ``path`` as a tensor.
+
+    Parameters
+    ----------
+    path : Path
+        The file to map.
+    dtype : torch.dtype
+        The tensor's dtype.
+    shape : Tuple[int, ...]
+        The tensor's shape.
+
+    Returns
+    -------
+    Tensor
+        A tensor whose storage is the file. Writes to it go to the file.
+
+    """
+    size = int(torch.Size(shape).numel())
+    return torch.from_file(str(path), shared=True, size=size, dtype=dtype).view(shape)
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_converter(
+    input_tfms: Compose,
+    data_path: Path,
+    dtype: torch.dtype,
+    shape: Tuple[int, ...],
+):
+    """Set up a conversion worker.
+
+    Parameters
+    ----------
+    input_tfms : Compose
+        The transforms to apply.
+    data_path : Path
+        The path of the store's ``data.bin``.
+    dtype : torch.dtype
+        The dtype of the tensors.
+    shape : Tuple[int, ...]
+        The shape of the whole store.
+
+    """
+    _WORKER["tfms"] = input_tfms
+    _WORKER["data"] = _map_file(data_path, dtype, shape)
+
+
+def _convert_chunk(items: List[Tuple[int, str]]) -> List[int]:
+    """Convert a chunk of files, writing the tensors into the store.
+
+    Parameters
+    ----------
+    items : List[Tuple[int, str]]
+        The index in the store, and the path, of each file.
+
+    Returns
+    -------
+    List[int]
+        The indices of the tensors written.
+
+    Raises
+    ------
+    ValueError
+        If a tensor's shape or dtype don't match the store's.
+
+    """
+    data = _WORKER["data"]
+    for idx, source in items:
+        tensor = _WORKER["tfms"](Path(source))
+        if tensor.shape != data.shape[1:] or tensor.dtype != data.dtype:
+            msg = f"Expected a {tuple(data.shape[1:])} {data.dtype} tensor from "
+            msg += f"'{source}'. Got {tuple(tensor.shape)} {tensor.dtype}."
+            raise ValueError(msg)
+        data[idx].copy_(tensor)
+    return [idx for idx, _ in items]
+
+
+def _converted_chunks(
+    chunks: List[List[Tuple[int, str]]],
+    init_args: Tuple[Any, ...],
+    num_workers: int,
+) -> Iterator[List[int]]:
+    """Convert ``chunks``, yielding each chunk's indices once it's written.
+
+    Parameters
+    ----------
+    chunks : List[List[Tuple[int, str]]]
+        The chunks of ``(index, path)`` pairs to convert.
+    init_args : Tuple[Any, ...]
+        The arguments to ``_init_converter``.
+    num_workers : int
+        The number of worker processes (zero to work in this process).
+
+    Yields
+    ------
+    List[int]
+        The indices written by each chunk, in the order they complete.
+
+    Notes
+    -----
+    At most ``2 * num_workers`` chunks are queued at once.
+
+    """
+    if num_workers == 0:
+        _init_converter(*init_args)
+        yield from map(_convert_chunk, chunks)
+        _WORKER.clear()
+        return
+
+    remaining = iter(chunks)
+    with ProcessPoolExecutor(num_workers, None, _init_converter, init_args) as pool:
+        pending = {
+            pool.submit(_convert_chunk, x) for x in islice(remaining, 2 * num_workers)
+        }
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+                pending |= {
+                    pool.submit(_convert_chunk, x) for x in islice(remaining, 1)
+                }
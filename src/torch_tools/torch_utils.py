@@ -1,13 +1,29 @@
 """PyTorch utilities."""
-from itertools import chain
+from typing import Tuple, NamedTuple, Optional
+from functools import lru_cache
 
+import torch
 from torch import (  # pylint: disable=no-name-in-module
     Tensor,
-    eye,
-    concat,
+    zeros,
+    aminmax,
+    stack,
+    float32,
+    uint8,
+    iinfo,
     log2,
     as_tensor,
+    ones,
+    arange,
+    exp,
+    outer,
+    float64,
 )
+from torch.nn.functional import pad, unfold, fold
+
+from torch_tools.validation import check_values
+
+# pylint: disable=too-many-arguments
 
 
 def target_from_mask_img(mask_img: Tensor, num_classes: int) -> Tensor:
@@ -43,29 +59,288 @@ def target_from_mask_img(mask_img: Tensor, num_classes: int) -> Tensor:
     RuntimeError
         If ``mask_img`` is not two-dimensional.
 
+    Notes
+    -----
+    See ``target_from_mask_img_batch``, which does the work, for compact
+    output dtypes and ignored pixels.
+
     """
     if not isinstance(mask_img, Tensor):
         msg = f"'mask_img' should be a Tensor. Got {type(mask_img)}."
         raise TypeError(msg)
+    if mask_img.dim() != 2:
+        msg = f"'mask_img' should have two dimensions. Got {mask_img.dim()}."
+        raise RuntimeError(msg)
+    return target_from_mask_img_batch(mask_img.unsqueeze(0), num_classes)[0]
+
+
+def target_from_mask_img_batch(
+    mask_batch: Tensor,
+    num_classes: int,
+    ignore_index: Optional[int] = None,
+    dtype: torch.dtype = float32,
+) -> Tensor:
+    """Convert a batch of masks to one-hot targets for semantic segmentation.
+
+    Parameters
+    ----------
+    mask_batch : Tensor
+        A mini-batch of segmentation masks, with shape ``(N, H, W)``. Its
+        values should be on ``[0, num_classes)``, or equal ``ignore_index``.
+    num_classes : int
+        The number of classes.
+    ignore_index : int, optional
+        A mask value marking pixels to ignore (such as the ``255`` often
+        used for unlabelled boundaries). Ignored pixels have all-zero target
+        vectors. Should not be on ``[0, num_classes)``.
+    dtype : torch.dtype, optional
+        The dtype of the targets. ``bool``, ``uint8`` and ``float16``
+        targets take 4, 4 and 2 times less memory than ``float32``.
+
+    Returns
+    -------
+    Tensor
+        Target Tensor of shape ``(N, num_classes, H, W)``, on the same device
+        as ``mask_batch`` and contiguous. Each element, ``target[n, :, i, j]``
+        is a one-hot-encoded vector.
+
+    Raises
+    ------
+    TypeError
+        If ``mask_batch`` is not a ``Tensor``, ``num_classes`` or
+        ``ignore_index`` are not ints, or ``dtype`` is not a ``torch.dtype``.
+    ValueError
+        If any of the values in ``mask_batch`` cannot be cast as int.
+    ValueError
+        If ``num_classes < 2``, or ``ignore_index`` is on
+        ``[0, num_classes)``.
+    ValueError
+        If ``mask_batch`` has values (other than ``ignore_index``) less than
+        zero, or greater than/equal to ``num_classes``.
+    RuntimeError
+        If ``mask_batch`` is not three-dimensional.
+
+    Notes
+    -----
+    The range of the mask values is checked with a single ``aminmax``
+    reduction (floating-point masks also need a check for remainders), and
+    the one-hot vectors are written directly into the channel-first output
+    with ``scatter_``.
+
+    """
+    _mask_args_check(mask_batch, num_classes, ignore_index, dtype)
+    if mask_batch.dim() != 3:
+        msg = f"'mask_batch' should have three dimensions. Got {mask_batch.dim()}."
+        raise RuntimeError(msg)
+
+    indices, valid = _mask_class_indices(mask_batch, num_classes, ignore_index)
+
+    batch, height, width = mask_batch.shape
+    target = zeros(
+        (batch, num_classes, height, width),
+        dtype=dtype,
+        device=mask_batch.device,
+    )
+    if valid is None:
+        return target.scatter_(1, indices.unsqueeze(1), 1)
+    return target.scatter_(1, indices.unsqueeze(1), valid.unsqueeze(1).to(dtype))
+
+
+def index_map_from_mask_img(
+    mask_img: Tensor,
+    num_classes: int,
+    ignore_index: Optional[int] = None,
+    dtype: torch.dtype = uint8,
+) -> Tensor:
+    """Convert 1-channel image to a compact class-index target.
+
+    The class-index map holds the same information as the one-hot target
+    from ``target_from_mask_img``, in ``num_classes`` times fewer elements
+    (and, as ``uint8``, four times fewer bytes per element). Use it in
+    ``target_tfms`` so the compact maps flow through the ``DataLoader``'s
+    workers and collation, and expand them into one-hot targets, with
+    ``target_from_mask_img_batch``, only in the training step.
+
+    Parameters
+    ----------
+    mask_img : Tensor
+        An image holding the segmentation mask, with shape ``(H, W)`` or
+        ``(1, H, W)`` (as ``ToTensor`` produces). Its values should be on
+        ``[0, num_classes)``, or equal ``ignore_index``.
+    num_classes : int
+        The number of classes.
+    ignore_index : int, optional
+        A mask value marking pixels to ignore. Ignored pixels keep this value
+        in the output. Should not be on ``[0, num_classes)``.
+    dtype : torch.dtype, optional
+        The integer dtype of the output. It should be able to hold
+        ``num_classes - 1`` and ``ignore_index``.
+
+    Returns
+    -------
+    Tensor
+        The class indices, with shape ``(H, W)``.
+
+    Raises
+    ------
+    TypeError
+        If ``mask_img`` is not a ``Tensor``, ``num_classes`` or
+        ``ignore_index`` are not ints, or ``dtype`` is not a ``torch.dtype``.
+    ValueError
+        If ``dtype`` is not an integer dtype which can hold the indices.
+    ValueError
+        If any of the values in ``mask_img`` cannot be cast as int.
+    ValueError
+        If ``num_classes < 2``, or ``ignore_index`` is on
+        ``[0, num_classes)``.
+    ValueError
+        If ``mask_img`` has values (other than ``ignore_index``) less than
+        zero, or greater than/equal to ``num_classes``.
+    RuntimeError
+        If ``mask_img`` is not two-dimensional (or three-dimensional with
+        one channel).
+
+    Notes
+    -----
+    A batch of these maps can be used directly as the target of
+    ``torch.nn.CrossEntropyLoss`` (after ``.long()``), which never needs
+    one-hot targets at all.
+
+    """
+    _mask_args_check(mask_img, num_classes, ignore_index, dtype)
+    if not (mask_img.dim() == 2 or (mask_img.dim() == 3 and len(mask_img) == 1)):
+        msg = "'mask_img' should have shape (H, W) or (1, H, W). Got "
+        msg += f"'{tuple(mask_img.shape)}'."
+        raise RuntimeError(msg)
+
+    largest = max(num_classes - 1, ignore_index if ignore_index is not None else 0)
+    smallest = min(0, ignore_index if ignore_index is not None else 0)
+    if dtype.is_floating_point or dtype.is_complex or dtype == torch.bool:
+        raise ValueError(f"'dtype' should be an integer dtype. Got '{dtype}'.")
+    if not iinfo(dtype).min <= smallest <= largest <= iinfo(dtype).max:
+        msg = f"'dtype' '{dtype}' cannot hold the values on "
+        msg += f"[{smallest}, {largest}]."
+        raise ValueError(msg)
+
+    indices, valid = _mask_class_indices(mask_img, num_classes, ignore_index)
+    if valid is not None and ignore_index is not None:
+        indices = indices.masked_fill(~valid, ignore_index)
+
+    return indices.reshape(mask_img.shape[-2:]).to(dtype)
+
+
+def _mask_class_indices(
+    mask: Tensor,
+    num_classes: int,
+    ignore_index: Optional[int],
+) -> Tuple[Tensor, Optional[Tensor]]:
+    """Check the values of ``mask`` and convert them to class indices.
+
+    Parameters
+    ----------
+    mask : Tensor
+        A segmentation mask, or a mini-batch of them.
+    num_classes : int
+        The number of classes.
+    ignore_index : int, optional
+        A mask value to ignore.
+
+    Returns
+    -------
+    Tensor
+        The class indices, as ``int64``. Ignored pixels are set to zero.
+    Tensor or None
+        ``False`` at the ignored pixels, or ``None`` if there are none.
+
+    Raises
+    ------
+    ValueError
+        If any of the values in ``mask`` cannot be cast as int.
+    ValueError
+        If ``mask`` has values (other than ``ignore_index``) less than
+        zero, or greater than/equal to ``num_classes``.
+
+    Notes
+    -----
+    The values are only checked if the validation level is ``"full"`` (see
+    ``torch_tools.validation``).
+
+    """
+    indices = mask.long()
+    if not check_values():
+        if ignore_index is None:
+            return indices, None
+        keep = indices != ignore_index
+        return indices.masked_fill(~keep, 0), keep
+
+    if mask.is_floating_point() and (indices != mask).any():
+        msg = "'mask' values should have no remainder when dividing by "
+        msg += f"1. Got values '{mask.unique()}'."
+        raise ValueError(msg)
+
+    valid: Optional[Tensor] = None
+    low, high = stack(aminmax(indices)).tolist()
+    if ignore_index is not None and not 0 <= low <= high < num_classes:
+        valid = indices != ignore_index
+        indices = indices.masked_fill(~valid, 0)
+        low, high = stack(aminmax(indices)).tolist()
+
+    if not 0 <= low <= high < num_classes:
+        msg = f"'mask' values should be on [0, {num_classes}). Got "
+        msg += f"values on [{low}, {high}]."
+        raise ValueError(msg)
+
+    return indices, valid
+
+
+def _mask_args_check(
+    mask_batch: Tensor,
+    num_classes: int,
+    ignore_index: Optional[int],
+    dtype: torch.dtype,
+):
+    """Check the arguments of the mask conversion functions.
+
+    Parameters
+    ----------
+    mask_batch : Tensor
+        A segmentation mask, or a mini-batch of them.
+    num_classes : int
+        The number of classes.
+    ignore_index : int, optional
+        A mask value to ignore.
+    dtype : torch.dtype
+        The dtype of the targets.
+
+    Raises
+    ------
+    TypeError
+        If any of the arguments have the wrong type.
+    ValueError
+        If ``num_classes < 2``, or ``ignore_index`` is on
+        ``[0, num_classes)``.
+
+    """
+    if not isinstance(mask_batch, Tensor):
+        msg = f"'mask_batch' should be a Tensor. Got {type(mask_batch)}."
+        raise TypeError(msg)
     if not isinstance(num_classes, int):
         msg = f"'num_classes' should be an int. Got {type(num_classes)}."
         raise TypeError(msg)
-    if not (mask_img % 1 == 0).all():
-        msg = "'mask_img' values should have no remainder when dividing by "
-        msg += f"1. Got values '{mask_img.unique()}'."
-        raise ValueError(msg)
+    if not isinstance(ignore_index, (int, type(None))):
+        msg = f"'ignore_index' should be an int or None. Got {type(ignore_index)}."
+        raise TypeError(msg)
+    if not isinstance(dtype, torch.dtype):
+        msg = f"'dtype' should be a torch.dtype. Got {type(dtype)}."
+        raise TypeError(msg)
     if num_classes < 2:
         msg = "There should be a minimum of two classes (foreground and "
         msg += f"background). Got '{num_classes}'."
         raise ValueError(msg)
-    if mask_img.min() < 0 or mask_img.max() >= num_classes:
-        msg = f"'mask_img' values should be on [0, {num_classes}). Got "
-        msg += f"values on [{mask_img.min()}, {mask_img.max()}]."
+    if ignore_index is not None and 0 <= ignore_index < num_classes:
+        msg = f"'ignore_index' should not be on [0, {num_classes}). Got "
+        msg += f"'{ignore_index}'."
         raise ValueError(msg)
-    if mask_img.dim() != 2:
-        msg = f"'mask_img' should have two dimensions. Got {mask_img.dim()}."
-        raise RuntimeError(msg)
-    return eye(num_classes)[mask_img.long()].permute(2, 0, 1)
 
 
 def _img_batch_check(img_batch: Tensor):
@@ -151,21 +426,422 @@ def patchify_img_batch(img_batch: Tensor, patch_size: int) -> Tensor:
         For example: using a batch of 10 RGB images of size 16x16, and a patch
         size of 4, will return a ``Tensor`` of shape ``(160, 3, 4, 4)``.
 
+    Notes
+    -----
+    The patches are ordered by image, then row, then column. They are
+    gathered with a single reshape–permute–reshape, which makes one copy of
+    ``img_batch``. ``unpatchify_img_batch`` is the inverse.
+
     """
     _img_batch_check(img_batch)
     _patch_size_check(img_batch, patch_size)
 
-    _, channels, _, _ = img_batch.shape
+    batch, channels, height, width = img_batch.shape
+    rows, cols = height // patch_size, width // patch_size
+
+    return (
+        img_batch.reshape(batch, channels, rows, patch_size, cols, patch_size)
+        .permute(0, 2, 4, 1, 3, 5)
+        .reshape(batch * rows * cols, channels, patch_size, patch_size)
+    )
+
+
+def _img_size_check(img_size: Tuple[int, int]):
+    """Check ``img_size`` is a tuple of two ints.
+
+    Parameters
+    ----------
+    img_size : Tuple[int, int]
+        The height and width of some images.
+
+    Raises
+    ------
+    TypeError
+        If ``img_size`` is not a tuple of two ints.
+
+    """
+    if not (
+        isinstance(img_size, tuple)
+        and len(img_size) == 2
+        and all(map(lambda x: isinstance(x, int), img_size))
+    ):
+        msg = f"'img_size' should be a tuple of two ints. Got '{img_size}'."
+        raise TypeError(msg)
+
+
+def unpatchify_img_batch(patches: Tensor, img_size: Tuple[int, int]) -> Tensor:
+    """Reassemble the patches made by ``patchify_img_batch`` into images.
+
+    Note: gradient flow works through this function.
+
+    Parameters
+    ----------
+    patches : Tensor
+        A collection of square patches, of size ``(N * h * w, C, p, p)``,
+        ordered as ``patchify_img_batch`` orders them.
+    img_size : Tuple[int, int]
+        The height and width, ``(H, W)``, of the images. Both should be
+        divisible by the patch size ``p``.
+
+    Returns
+    -------
+    Tensor
+        The images, with size ``(N, C, H, W)``.
+
+    Raises
+    ------
+    TypeError
+        If ``img_size`` is not a tuple of two ints.
+    ValueError
+        If the patches are not square, or ``img_size`` is not divisible by
+        the patch size.
+    RuntimeError
+        If the number of patches is not a multiple of the number of patches
+        per image.
+
+    """
+    _img_batch_check(patches)
+    _img_size_check(img_size)
+
+    num_patches, channels, patch_size, patch_width = patches.shape
+    height, width = img_size
+
+    if patch_size != patch_width:
+        msg = "The patches should be square. Got size "
+        msg += f"'{(patch_size, patch_width)}'."
+        raise ValueError(msg)
+    if height <= 0 or width <= 0 or height % patch_size or width % patch_size:
+        msg = f"'img_size' '{img_size}' should be positive and divisible by "
+        msg += f"the patch size '{patch_size}'."
+        raise ValueError(msg)
+
+    rows, cols = height // patch_size, width // patch_size
+    if num_patches % (rows * cols) != 0:
+        msg = f"The number of patches '{num_patches}' should be a multiple of "
+        msg += f"the number per image '{rows * cols}'."
+        raise RuntimeError(msg)
+
+    return (
+        patches.reshape(-1, rows, cols, channels, patch_size, patch_size)
+        .permute(0, 3, 1, 4, 2, 5)
+        .reshape(-1, channels, height, width)
+    )
+
+
+class PatchGeometry(NamedTuple):
+    """Geometry of overlapping patches tiling an image.
+
+    Parameters
+    ----------
+    rows : int
+        The number of rows of patches.
+    cols : int
+        The number of columns of patches.
+    end_pad_h : int
+        Extra padding added to the bottom of the image, so the last row of
+        patches reaches the image's edge.
+    end_pad_w : int
+        Extra padding added to the right of the image, so the last column
+        of patches reaches the image's edge.
+
+    """
+
+    rows: int
+    cols: int
+    end_pad_h: int
+    end_pad_w: int
+
+
+def _overlap_args_check(patch_size: int, stride: int, padding: int):
+    """Check the patch size, stride and padding of overlapping patches.
+
+    Parameters
+    ----------
+    patch_size : int
+        The size of the square patches.
+    stride : int
+        The step between neighbouring patches.
+    padding : int
+        The padding added to each side of the images.
+
+    Raises
+    ------
+    TypeError
+        If ``patch_size``, ``stride`` or ``padding`` is not an int.
+    ValueError
+        If ``patch_size`` or ``stride`` are not positive, ``stride`` exceeds
+        ``patch_size``, or ``padding`` is negative.
+
+    """
+    for name, value in zip(
+        ("patch_size", "stride", "padding"), (patch_size, stride, padding)
+    ):
+        if not isinstance(value, int):
+            msg = f"'{name}' should be int. Got '{type(value)}'."
+            raise TypeError(msg)
+    if patch_size <= 0 or stride <= 0:
+        msg = "'patch_size' and 'stride' should exceed zero. Got "
+        msg += f"'{patch_size}' and '{stride}'."
+        raise ValueError(msg)
+    if stride > patch_size:
+        msg = f"'stride' '{stride}' should not exceed 'patch_size' "
+        msg += f"'{patch_size}', or parts of the images would be missed."
+        raise ValueError(msg)
+    if padding < 0:
+        msg = f"'padding' should not be negative. Got '{padding}'."
+        raise ValueError(msg)
+
+
+@lru_cache(maxsize=256, typed=True)
+def patch_geometry(
+    img_size: Tuple[int, int],
+    patch_size: int,
+    stride: int,
+    padding: int = 0,
+) -> PatchGeometry:
+    """Work out how overlapping patches tile images of size ``img_size``.
+
+    Parameters
+    ----------
+    img_size : Tuple[int, int]
+        The height and width of the images.
+    patch_size : int
+        The size of the square patches.
+    stride : int
+        The step between neighbouring patches.
+    padding : int, optional
+        The padding added to each side of the images.
+
+    Returns
+    -------
+    PatchGeometry
+        The number of rows and columns of patches, and the extra padding
+        needed at the bottom and right of the images.
+
+    """
+    _overlap_args_check(patch_size, stride, padding)
+
+    def _tiling(size: int) -> Tuple[int, int]:
+        padded = max(size + 2 * padding, patch_size)
+        steps = -(-(padded - patch_size) // stride)
+        return steps + 1, patch_size + steps * stride - size - 2 * padding
+
+    (rows, end_pad_h), (cols, end_pad_w) = map(_tiling, img_size)
+    return PatchGeometry(rows, cols, end_pad_h, end_pad_w)
+
+
+def extract_overlapping_patches(
+    img_batch: Tensor,
+    patch_size: int,
+    stride: int,
+    padding: int = 0,
+) -> Tensor:
+    """Break ``img_batch`` into (possibly overlapping) square patches.
+
+    Note: gradient flow works through this function.
+
+    Parameters
+    ----------
+    img_batch : Tensor
+        A mini-batch of images, of size ``(N, C, H, W)``.
+    patch_size : int
+        The size of the square patches.
+    stride : int
+        The step between neighbouring patches. Patches overlap if
+        ``stride < patch_size``.
+    padding : int, optional
+        The zero padding added to each side of the images before the
+        patches are taken.
+
+    Returns
+    -------
+    Tensor
+        The patches, of size ``(N * rows * cols, C, patch_size, patch_size)``
+        and ordered by image, then row, then column.
+
+    Notes
+    -----
+    If the patches don't fit the padded images exactly, the images are
+    zero-padded at the bottom and right until they do, so every pixel is in
+    at least one patch. See ``patch_geometry``.
+
+    The patches are taken with a single ``unfold``, and
+    ``blend_overlapping_patches`` reassembles them.
+
+    """
+    _img_batch_check(img_batch)
+    batch, channels, height, width = img_batch.shape
+    geom = patch_geometry((height, width), patch_size, stride, padding)
+
+    padded = pad(
+        img_batch,
+        (padding, padding + geom.end_pad_w, padding, padding + geom.end_pad_h),
+    )
+    return (
+        unfold(padded, kernel_size=patch_size, stride=stride)
+        .transpose(1, 2)
+        .reshape(batch * geom.rows * geom.cols, channels, patch_size, patch_size)
+    )
+
+
+@lru_cache(maxsize=32)
+def _blend_weights(patch_size: int, weighting: str) -> Tensor:
+    """Return the weights each patch's pixels are blended with.
+
+    Parameters
+    ----------
+    patch_size : int
+        The size of the square patches.
+    weighting : str
+        ``"uniform"`` or ``"gaussian"``.
+
+    Returns
+    -------
+    Tensor
+        The weights, of size ``(patch_size, patch_size)``.
+
+    """
+    if weighting == "uniform":
+        return ones(patch_size, patch_size)
+
+    coords = arange(patch_size, dtype=float64) - (patch_size - 1) / 2
+    profile = exp(-0.5 * (coords / (patch_size / 8)) ** 2)
+    weights = outer(profile, profile)
+    return (weights / weights.max()).clamp_min(1e-3).float()
+
+
+@lru_cache(maxsize=64)
+def _blend_normaliser(
+    img_size: Tuple[int, int],
+    patch_size: int,
+    stride: int,
+    padding: int,
+    weighting: str,
+) -> Tensor:
+    """Return the summed blending weights at each pixel of the padded image.
+
+    Parameters
+    ----------
+    img_size : Tuple[int, int]
+        The height and width of the images.
+    patch_size : int
+        The size of the square patches.
+    stride : int
+        The step between neighbouring patches.
+    padding : int
+        The padding added to each side of the images.
+    weighting : str
+        ``"uniform"`` or ``"gaussian"``.
+
+    Returns
+    -------
+    Tensor
+        The summed weights, of size ``(1, 1, H_padded, W_padded)``.
+
+    """
+    geom = patch_geometry(img_size, patch_size, stride, padding)
+    height, width = img_size
+    output_size = (
+        height + 2 * padding + geom.end_pad_h,
+        width + 2 * padding + geom.end_pad_w,
+    )
+    weights = _blend_weights(patch_size, weighting).reshape(1, -1, 1)
+    return fold(
+        weights.expand(1, -1, geom.rows * geom.cols),
+        output_size=output_size,
+        kernel_size=patch_size,
+        stride=stride,
+    )
+
+
+def blend_overlapping_patches(
+    patches: Tensor,
+    img_size: Tuple[int, int],
+    patch_size: int,
+    stride: int,
+    padding: int = 0,
+    weighting: str = "uniform",
+) -> Tensor:
+    """Reassemble images from the patches of ``extract_overlapping_patches``.
+
+    Where patches overlap, their pixels are averaged using the blending
+    weights given by ``weighting``.
+
+    Note: gradient flow works through this function.
+
+    Parameters
+    ----------
+    patches : Tensor
+        Patches, of size ``(N * rows * cols, C, patch_size, patch_size)``,
+        ordered as ``extract_overlapping_patches`` orders them.
+    img_size : Tuple[int, int]
+        The height and width, ``(H, W)``, of the images.
+    patch_size : int
+        The size of the square patches.
+    stride : int
+        The stride the patches were taken with.
+    padding : int, optional
+        The padding the patches were taken with.
+    weighting : str, optional
+        ``"uniform"`` weights every pixel of a patch equally. ``"gaussian"``
+        weights the centre of each patch more than its edges (with a
+        standard deviation of an eighth of the patch size), which hides the
+        seams between patches predicted separately by a model.
+
+    Returns
+    -------
+    Tensor
+        The images, of size ``(N, C, H, W)``.
+
+    Raises
+    ------
+    TypeError
+        If ``img_size`` is not a tuple of two ints.
+    ValueError
+        If ``weighting`` is not ``"uniform"`` or ``"gaussian"``.
+    RuntimeError
+        If the patches don't have the size ``patch_size``, or their number is
+        not a multiple of the number per image.
+
+    Notes
+    -----
+    The patches are overlap-added with a single ``fold``. The blending
+    weights, and their sum at each pixel, are computed once per geometry
+    and cached.
+
+    """
+    _img_batch_check(patches)
+    _img_size_check(img_size)
+    if weighting not in ("uniform", "gaussian"):
+        msg = "'weighting' should be 'uniform' or 'gaussian'. Got "
+        msg += f"'{weighting}'."
+        raise ValueError(msg)
+
+    geom = patch_geometry(img_size, patch_size, stride, padding)
+    num_patches, _, *size = patches.shape
+    per_img = geom.rows * geom.cols
+
+    if size != [patch_size, patch_size] or num_patches % per_img != 0:
+        msg = f"Expected a multiple of '{per_img}' patches of size "
+        msg += f"'{(patch_size, patch_size)}'. Got '{tuple(patches.shape)}'."
+        raise RuntimeError(msg)
+
+    normaliser = _blend_normaliser(img_size, patch_size, stride, padding, weighting)
+    weights = _blend_weights(patch_size, weighting).to(patches.device, patches.dtype)
 
-    unfolded = (
-        concat(list(img_batch), dim=1)
-        .unfold(0, channels, channels)
-        .unfold(1, patch_size, patch_size)
-        .unfold(2, patch_size, patch_size)
+    blended = fold(
+        (patches * weights)
+        .reshape(num_patches // per_img, per_img, -1)
+        .transpose(1, 2),
+        output_size=normaliser.shape[2:],
+        kernel_size=patch_size,
+        stride=stride,
     )
+    blended = blended / normaliser.to(patches.device, patches.dtype)
 
-    unfolded_list = list(chain(*chain(*unfolded)))
-    return concat(list(map(lambda x: x.unsqueeze(0), unfolded_list)), dim=0)
+    return blended[
+        :, :, padding : padding + img_size[0], padding : padding + img_size[1]
+    ]
 
 
 def img_batch_dims_power_of_2(batch: Tensor):
@@ -0,0 +1,160 @@
+"""Library-wide control of the runtime checks done in hot paths."""
+import os
+from typing import Iterator, Optional
+from warnings import warn
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+VALIDATION_LEVELS = ("full", "shapes", "off")
+
+_ENV_VAR = "TORCH_TOOLS_VALIDATION"
+
+
+def _process_level(level: str) -> str:
+    """Check ``level`` is one of the validation levels.
+
+    Parameters
+    ----------
+    level : str
+        The validation level.
+
+    Returns
+    -------
+    str
+        ``level``.
+
+    Raises
+    ------
+    TypeError
+        If ``level`` is not a str.
+    ValueError
+        If ``level`` is not one of ``VALIDATION_LEVELS``.
+
+    """
+    if not isinstance(level, str):
+        raise TypeError(f"'level' should be a str. Got '{type(level)}'.")
+    if level not in VALIDATION_LEVELS:
+        msg = f"'level' should be one of {VALIDATION_LEVELS}. Got '{level}'."
+        raise ValueError(msg)
+    return level
+
+
+def _level_from_environment() -> str:
+    """Return the validation level set by the environment variable.
+
+    Returns
+    -------
+    str
+        The level in ``TORCH_TOOLS_VALIDATION``, or ``"full"`` if it is unset
+        or not one of ``VALIDATION_LEVELS`` (with a warning).
+
+    """
+    level = os.environ.get(_ENV_VAR, "full").strip().lower()
+    if level not in VALIDATION_LEVELS:
+        msg = f"'{_ENV_VAR}' should be one of {VALIDATION_LEVELS}. Got '{level}'. "
+        msg += "Falling back to 'full'."
+        warn(msg, stacklevel=2)
+        return "full"
+    return level
+
+
+_DEFAULT_LEVEL = _level_from_environment()
+
+_LEVEL: ContextVar[Optional[str]] = ContextVar("validation_level", default=None)
+
+
+def get_validation_level() -> str:
+    """Return the current validation level.
+
+    Returns
+    -------
+    str
+        ``"full"``, ``"shapes"`` or ``"off"``. See ``set_validation_level``.
+
+    """
+    return _LEVEL.get() or _DEFAULT_LEVEL
+
+
+def set_validation_level(level: str):
+    """Set how much checking is done at runtime in forward passes.
+
+    Parameters
+    ----------
+    level : str
+        One of:
+
+            - ``"full"`` (the default): every check is done.
+            - ``"shapes"``: shapes and channel numbers are checked, but the
+              checks on tensors' values—reductions over whole tensors, which
+              force a device synchronisation—are skipped.
+            - ``"off"``: the runtime checks are skipped.
+
+    Notes
+    -----
+    The level only affects checks made every time a model's ``forward`` (or
+    a ``torch_utils`` helper) is called, like those in ``UNetUpBlock``.
+    Arguments to constructors are always checked.
+
+    This sets the default level, used by every thread. Within a
+    ``validation_level`` block, that block's level is used instead.
+
+    The initial level is read from the ``TORCH_TOOLS_VALIDATION``
+    environment variable, if it is set.
+
+    """
+    global _DEFAULT_LEVEL  # pylint: disable=global-statement
+    _DEFAULT_LEVEL = _process_level(level)
+
+
+@contextmanager
+def validation_level(level: str) -> Iterator[None]:
+    """Set the validation level in a ``with`` block.
+
+    Parameters
+    ----------
+    level : str
+        The validation level. See ``set_validation_level``.
+
+    Notes
+    -----
+    The level is held in a context variable, so it only applies to the
+    thread (or ``asyncio`` task) which enters the block. Other threads keep
+    using the default level.
+
+    Examples
+    --------
+    >>> from torch_tools.validation import validation_level
+    >>> with validation_level("off"):
+            preds = model(batch)
+
+    """
+    token = _LEVEL.set(_process_level(level))
+    try:
+        yield
+    finally:
+        _LEVEL.reset(token)
+
+
+def check_shapes() -> bool:
+    """Return whether shapes should be checked at runtime.
+
+    Returns
+    -------
+    bool
+        ``True`` unless the validation level is ``"off"``.
+
+    """
+    return get_validation_level() != "off"
+
+
+def check_values() -> bool:
+    """Return whether tensors' values should be checked at runtime.
+
+    Returns
+    -------
+    bool
+        ``True`` if the validation level is ``"full"``.
+
+    """
+    return get_validation_level() == "full"
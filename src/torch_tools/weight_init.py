@@ -1,6 +1,21 @@
 """Weight initialisation functions."""
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
 
+import torch
+from torch import Tensor, Generator, empty  # pylint: disable=no-name-in-module
+from torch import (  # pylint: disable=no-name-in-module
+    no_grad,
+    linalg,
+    diagonal,
+    float32,
+)
 from torch.nn import Module, init, Conv1d, Conv2d, Conv3d, Linear
+from torch.nn import ConvTranspose1d, ConvTranspose2d, ConvTranspose3d
+from torch.nn import GroupNorm, LayerNorm
+from torch.nn.modules.batchnorm import _BatchNorm
+
+# pylint: disable=too-many-arguments
 
 
 def normal_init(model: Module, mean: float = 0.0, std: float = 0.02):
@@ -41,3 +56,541 @@ def normal_init(model: Module, mean: float = 0.0, std: float = 0.02):
         init.normal_(model.weight, mean=mean, std=std)
         if model.bias is not None:
             init.normal_(model.bias, mean=mean, std=std)
+
+
+_SCHEMES = (
+    "normal",
+    "uniform",
+    "kaiming_normal",
+    "kaiming_uniform",
+    "xavier_normal",
+    "xavier_uniform",
+    "orthogonal",
+    "zeros",
+    "ones",
+)
+
+_SCHEME_OPTIONS = {
+    "normal": ("mean", "std"),
+    "uniform": ("a", "b"),
+    "kaiming_normal": ("a", "mode", "nonlinearity"),
+    "kaiming_uniform": ("a", "mode", "nonlinearity"),
+    "xavier_normal": ("gain",),
+    "xavier_uniform": ("gain",),
+    "orthogonal": ("gain",),
+    "zeros": (),
+    "ones": (),
+}
+
+_MATRIX_SCHEMES = (
+    "kaiming_normal",
+    "kaiming_uniform",
+    "xavier_normal",
+    "xavier_uniform",
+    "orthogonal",
+)
+
+_WEIGHTED_LAYERS = (
+    Conv1d,
+    Conv2d,
+    Conv3d,
+    ConvTranspose1d,
+    ConvTranspose2d,
+    ConvTranspose3d,
+    Linear,
+)
+
+_NORM_LAYERS = (_BatchNorm, GroupNorm, LayerNorm)
+
+_GROUP_NUMEL = 2**16
+
+
+def init_model(
+    model: Module,
+    scheme: str = "kaiming_normal",
+    rules: Optional[Dict[Type[Module], str]] = None,
+    bias: str = "zeros",
+    seed: Optional[int] = None,
+    scheme_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, str]:
+    """Initialise the parameters of every layer in ``model`` at once.
+
+    Parameters
+    ----------
+    model : Module
+        The model to initialise.
+    scheme : str, optional
+        The scheme used for the weights of the convolutional and linear
+        layers. One of ``"normal"``, ``"uniform"``, ``"kaiming_normal"``,
+        ``"kaiming_uniform"``, ``"xavier_normal"``, ``"xavier_uniform"``,
+        ``"orthogonal"``, ``"zeros"`` or ``"ones"``.
+    rules : Dict[Type[Module], str], optional
+        Schemes for the weights of particular layer types, which take
+        precedence over ``scheme``—for example ``{Linear: "xavier_normal"}``.
+        The first type a layer is an instance of is used. The weights of
+        normalisation layers are set to one, unless a rule says otherwise.
+    bias : str, optional
+        The scheme used for the biases. Biases are one-dimensional, so the
+        Kaiming, Xavier and orthogonal schemes can't be used for them.
+    seed : int, optional
+        If given, each parameter is drawn from a generator seeded with
+        ``seed`` and the parameter's name, so a parameter's initial values
+        only depend on ``seed``, its name and its shape—not on the rest of
+        the model. If ``None``, the global random state is used.
+    scheme_kwargs : Dict[str, Dict[str, Any]], optional
+        Options for each scheme, keyed by the scheme's name—for example
+        ``{"kaiming_normal": {"a": 0.1}}``. The options are ``mean`` and
+        ``std`` (``"normal"``, defaults ``0.0`` and ``0.02``), ``a`` and
+        ``b`` (``"uniform"``, defaults ``0.0`` and ``1.0``), ``a``, ``mode``
+        and ``nonlinearity`` (the Kaiming schemes, defaults ``0.0``,
+        ``"fan_in"`` and ``"leaky_relu"``) and ``gain`` (the Xavier and
+        orthogonal schemes, default ``1.0``).
+
+    Returns
+    -------
+    Dict[str, str]
+        The name of each parameter initialised, mapped to its scheme.
+
+    Raises
+    ------
+    TypeError
+        If ``model`` is not a ``Module``, ``rules`` is not a dict (or
+        ``None``), ``seed`` is not an int (or ``None``) or ``scheme_kwargs``
+        is not a dict of dicts (or ``None``).
+    ValueError
+        If any of the schemes, or any of the options in ``scheme_kwargs``,
+        are not recognised.
+    ValueError
+        If a Kaiming, Xavier or orthogonal scheme would be used for a
+        parameter with fewer than two dimensions.
+    RuntimeError
+        If any of the parameters to initialise are on the meta device.
+
+    Examples
+    --------
+    >>> from torch.nn import Linear
+    >>> from torch_tools import UNet
+    >>> from torch_tools.weight_init import init_model
+    >>> model = UNet(in_chans=3, out_chans=2)
+    >>> init_model(
+    ...     model,
+    ...     "kaiming_normal",
+    ...     rules={Linear: "xavier_normal"},
+    ...     seed=123,
+    ...     scheme_kwargs={"kaiming_normal": {"a": 0.1}},
+    ... )
+
+    Notes
+    -----
+    Rather than visiting each layer and sampling each parameter separately
+    (as ``model.apply(normal_init)`` does), parameters with the same scheme,
+    shape, dtype and device are filled together: one random draw (and, for
+    ``"orthogonal"``, one batched QR decomposition) for the whole group,
+    copied into the parameters with a single ``foreach`` copy. Large
+    parameters, and every parameter if there is a ``seed`` (when each has
+    its own generator), are filled in place, one at a time.
+
+    Parameters of layers which are neither convolutional, linear nor
+    normalisation layers are left untouched.
+
+    Parameters on the meta device (see
+    ``torch_tools.checkpoints.meta_model``) have no values to initialise:
+    materialise the model first.
+
+    """
+    if not isinstance(model, Module):
+        msg = "Weight init can only be applied to torch.nn.Module. "
+        msg += f"Got '{type(model)}'."
+        raise TypeError(msg)
+    if not isinstance(rules, (dict, type(None))):
+        raise TypeError(f"'rules' should be a dict or None. Got '{type(rules)}'.")
+    if not isinstance(seed, (int, type(None))):
+        raise TypeError(f"'seed' should be an int or None. Got '{type(seed)}'.")
+    _ = list(map(_process_scheme, [scheme, *(rules or {}).values()]))
+    _process_scheme(bias, one_dim=True)
+    options = _process_scheme_kwargs(scheme_kwargs)
+
+    schemes = _parameter_schemes(model, scheme, rules or {}, bias)
+    params: Dict[str, Tensor] = dict(model.named_parameters())
+    _check_parameters(schemes, params)
+
+    with no_grad():
+        for names in _group_parameters(schemes, params, seed is not None):
+            members = [params[name] for name in names]
+            generator = _name_generator(seed, names[0], members[0].device)
+
+            if len(members) == 1:
+                _fill(
+                    members[0].unsqueeze(0),
+                    schemes[names[0]],
+                    generator,
+                    **options.get(schemes[names[0]], {}),
+                )
+                continue
+
+            stack = empty(
+                (len(members), *members[0].shape),
+                dtype=members[0].dtype,
+                device=members[0].device,
+            )
+            _fill(
+                stack,
+                schemes[names[0]],
+                generator,
+                **options.get(schemes[names[0]], {}),
+            )
+            _copy(members, stack.unbind(0))
+
+    return schemes
+
+
+def _process_scheme(scheme: str, one_dim: bool = False) -> str:
+    """Check ``scheme`` is one of the initialisation schemes.
+
+    Parameters
+    ----------
+    scheme : str
+        The scheme.
+    one_dim : bool, optional
+        Whether the scheme is used for one-dimensional parameters.
+
+    Returns
+    -------
+    str
+        ``scheme``.
+
+    Raises
+    ------
+    ValueError
+        If ``scheme`` is not one of the schemes.
+    ValueError
+        If ``one_dim`` is ``True`` and ``scheme`` needs a parameter with two
+        or more dimensions.
+
+    """
+    if scheme not in _SCHEMES:
+        raise ValueError(f"Scheme should be one of {_SCHEMES}. Got '{scheme}'.")
+    if one_dim and scheme in _MATRIX_SCHEMES:
+        msg = f"Scheme '{scheme}' needs parameters with two or more dimensions, "
+        msg += "so can't be used for one-dimensional parameters like biases."
+        raise ValueError(msg)
+    return scheme
+
+
+def _process_scheme_kwargs(
+    scheme_kwargs: Optional[Dict[str, Dict[str, Any]]],
+) -> Dict[str, Dict[str, Any]]:
+    """Check the options given for each scheme.
+
+    Parameters
+    ----------
+    scheme_kwargs : Dict[str, Dict[str, Any]], optional
+        The options for each scheme.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        ``scheme_kwargs``, or an empty dict if it is ``None``.
+
+    Raises
+    ------
+    TypeError
+        If ``scheme_kwargs`` is not a dict of dicts (or ``None``).
+    ValueError
+        If any of the schemes, or their options, are not recognised.
+
+    """
+    if scheme_kwargs is None:
+        return {}
+    if not isinstance(scheme_kwargs, dict):
+        msg = "'scheme_kwargs' should be a dict or None. "
+        msg += f"Got '{type(scheme_kwargs)}'."
+        raise TypeError(msg)
+
+    for scheme, options in scheme_kwargs.items():
+        _process_scheme(scheme)
+        if not isinstance(options, dict):
+            msg = f"The options for '{scheme}' should be a dict. "
+            msg += f"Got '{type(options)}'."
+            raise TypeError(msg)
+        unknown = sorted(set(options) - set(_SCHEME_OPTIONS[scheme]))
+        if unknown:
+            msg = f"Scheme '{scheme}' takes the options "
+            msg += f"{_SCHEME_OPTIONS[scheme]}. Got '{unknown}'."
+            raise ValueError(msg)
+
+    return scheme_kwargs
+
+
+def _check_parameters(schemes: Dict[str, str], params: Dict[str, Tensor]):
+    """Check each parameter can be initialised with its scheme.
+
+    Parameters
+    ----------
+    schemes : Dict[str, str]
+        Each parameter's name mapped to its scheme.
+    params : Dict[str, Tensor]
+        Each parameter's name mapped to the parameter.
+
+    Raises
+    ------
+    ValueError
+        If a Kaiming, Xavier or orthogonal scheme is used for a parameter
+        with fewer than two dimensions.
+    RuntimeError
+        If any of the parameters are on the meta device.
+
+    """
+    on_meta = [name for name in schemes if params[name].is_meta]
+    if on_meta:
+        msg = f"Parameters '{on_meta}' are on the meta device, so have no values "
+        msg += "to initialise. Materialise the model first."
+        raise RuntimeError(msg)
+
+    for name, scheme in schemes.items():
+        if scheme in _MATRIX_SCHEMES and params[name].dim() < 2:
+            msg = f"Scheme '{scheme}' needs parameters with two or more "
+            msg += f"dimensions. Parameter '{name}' has shape "
+            msg += f"{tuple(params[name].shape)}."
+            raise ValueError(msg)
+
+
+def _parameter_schemes(
+    model: Module,
+    scheme: str,
+    rules: Dict[Type[Module], str],
+    bias: str,
+) -> Dict[str, str]:
+    """Choose the scheme for each parameter of ``model``.
+
+    Parameters
+    ----------
+    model : Module
+        The model.
+    scheme : str
+        The default scheme for weights.
+    rules : Dict[Type[Module], str]
+        Schemes for particular layer types.
+    bias : str
+        The scheme for biases.
+
+    Returns
+    -------
+    Dict[str, str]
+        Each parameter's name mapped to its scheme, in the order of
+        ``model.named_parameters``.
+
+    """
+    layer_types: Tuple[Type[Module], ...] = _WEIGHTED_LAYERS + _NORM_LAYERS
+    layer_types += tuple(rules)
+    layers = dict(model.named_modules())
+
+    schemes = {}
+    for full_name, _ in model.named_parameters():
+        prefix, _, name = full_name.rpartition(".")
+        layer = layers[prefix]
+        if not isinstance(layer, layer_types) or name not in ("weight", "bias"):
+            continue
+
+        if name == "bias":
+            schemes[full_name] = bias
+        else:
+            schemes[full_name] = next(
+                (value for key, value in rules.items() if isinstance(layer, key)),
+                "ones" if isinstance(layer, _NORM_LAYERS) else scheme,
+            )
+
+    return schemes
+
+
+def _group_parameters(
+    schemes: Dict[str, str],
+    params: Dict[str, Tensor],
+    separate: bool,
+) -> List[List[str]]:
+    """Group the parameters which can be filled together.
+
+    Parameters
+    ----------
+    schemes : Dict[str, str]
+        Each parameter's name mapped to its scheme.
+    params : Dict[str, Tensor]
+        Each parameter's name mapped to the parameter.
+    separate : bool
+        If ``True``, each parameter is put in a group of its own.
+
+    Returns
+    -------
+    List[List[str]]
+        The names of the parameters in each group. Parameters in the same
+        group have the same scheme, shape, dtype and device.
+
+    Notes
+    -----
+    Parameters with ``_GROUP_NUMEL`` or more elements are put in groups of
+    their own, and filled in place: for them, the cost of the Python call
+    is negligible next to the cost of the fill, and stacking would only add
+    a copy.
+
+    """
+    groups: Dict[Tuple[Any, ...], List[str]] = {}
+    for name, scheme in schemes.items():
+        param = params[name]
+        alone = separate or param.numel() >= _GROUP_NUMEL
+        key = (name,) if alone else (scheme, param.shape, param.dtype, param.device)
+        groups.setdefault(key, []).append(name)
+    return list(groups.values())
+
+
+def _name_generator(
+    seed: Optional[int],
+    name: str,
+    on_device: torch.device,
+) -> Optional[Generator]:
+    """Return a generator seeded with ``seed`` and ``name``.
+
+    Parameters
+    ----------
+    seed : int, optional
+        The user's seed.
+    name : str
+        The parameter's name.
+    on_device : torch.device
+        The device the parameter is on.
+
+    Returns
+    -------
+    Generator or None
+        The generator, or ``None`` if ``seed`` is ``None``.
+
+    """
+    if seed is None:
+        return None
+    digest = blake2b(f"{seed}:{name}".encode(), digest_size=8).digest()
+    return Generator(device=on_device).manual_seed(
+        int.from_bytes(digest, "little") >> 1
+    )
+
+
+def _fill(
+    stack: Tensor,
+    scheme: str,
+    generator: Optional[Generator],
+    **kwargs: Any,
+):
+    """Fill ``stack``, a stack of same-shaped parameters, using ``scheme``.
+
+    Parameters
+    ----------
+    stack : Tensor
+        The stacked values, with shape ``(num_params, *param_shape)``.
+    scheme : str
+        The initialisation scheme.
+    generator : Generator, optional
+        The generator to draw random values from.
+    kwargs : Any
+        Options for the scheme. See ``init_model``.
+
+    """
+    if scheme in ("zeros", "ones"):
+        stack.fill_(float(scheme == "ones"))
+    elif scheme == "normal":
+        stack.normal_(
+            kwargs.get("mean", 0.0), kwargs.get("std", 0.02), generator=generator
+        )
+    elif scheme == "uniform":
+        stack.uniform_(kwargs.get("a", 0.0), kwargs.get("b", 1.0), generator=generator)
+    elif scheme == "orthogonal":
+        _fill_orthogonal(stack, kwargs.get("gain", 1.0), generator)
+    else:
+        std = _scheme_std(stack[0], scheme, **kwargs)
+        if scheme.endswith("normal"):
+            stack.normal_(0.0, std, generator=generator)
+        else:
+            stack.uniform_(-(3.0**0.5) * std, (3.0**0.5) * std, generator=generator)
+
+
+def _scheme_std(param: Tensor, scheme: str, **kwargs: Any) -> float:
+    """Return the standard deviation of a Kaiming or Xavier scheme.
+
+    Parameters
+    ----------
+    param : Tensor
+        One of the parameters.
+    scheme : str
+        The scheme.
+    kwargs : Any
+        Options for the scheme. See ``init_model``.
+
+    Returns
+    -------
+    float
+        The standard deviation the values should be drawn with.
+
+    """
+    (
+        fan_in,
+        fan_out,
+    ) = init._calculate_fan_in_and_fan_out(  # pylint: disable=protected-access
+        param
+    )
+    if scheme.startswith("xavier"):
+        return kwargs.get("gain", 1.0) * (2.0 / (fan_in + fan_out)) ** 0.5
+
+    fan = fan_in if kwargs.get("mode", "fan_in") == "fan_in" else fan_out
+    gain = init.calculate_gain(
+        kwargs.get("nonlinearity", "leaky_relu"),
+        kwargs.get("a", 0.0),
+    )
+    return gain / fan**0.5
+
+
+def _fill_orthogonal(stack: Tensor, gain: float, generator: Optional[Generator]):
+    """Fill each parameter in ``stack`` with a (semi-)orthogonal matrix.
+
+    Parameters
+    ----------
+    stack : Tensor
+        The stacked values, with shape ``(num_params, *param_shape)``.
+    gain : float
+        The factor to scale the matrices by.
+    generator : Generator, optional
+        The generator to draw random values from.
+
+    Notes
+    -----
+    This follows ``torch.nn.init.orthogonal_``, using one batched QR
+    decomposition for the whole stack.
+
+    """
+    rows = stack.shape[1]
+    cols = stack[0].numel() // rows
+    flat = stack.new_empty(len(stack), rows, cols, dtype=float32)
+    flat.normal_(0.0, 1.0, generator=generator)
+
+    if rows < cols:
+        flat = flat.transpose(1, 2)
+    q_mat, r_mat = linalg.qr(flat)
+    q_mat *= diagonal(r_mat, dim1=1, dim2=2).sign().unsqueeze(1)
+    if rows < cols:
+        q_mat = q_mat.transpose(1, 2)
+
+    stack.copy_(q_mat.reshape(stack.shape) * gain)
+
+
+def _copy(params: Sequence[Tensor], values: Sequence[Tensor]):
+    """Copy ``values`` into ``params``.
+
+    Parameters
+    ----------
+    params : Sequence[Tensor]
+        The parameters.
+    values : Sequence[Tensor]
+        Their new values.
+
+    """
+    foreach_copy = getattr(torch, "_foreach_copy_", None)
+    if foreach_copy is not None:
+        foreach_copy(params, values)
+    else:
+        _ = list(map(lambda x: x[0].copy_(x[1]), zip(params, values)))
@@ -2,7 +2,8 @@
 import pytest
 
 
-from torch import zeros, ones  # pylint: disable=no-name-in-module
+from torch import zeros, ones, randint, uint8, rand  # pylint: disable=no-name-in-module
+from torch import float32, int64  # pylint: disable=no-name-in-module
 from torchvision.transforms import Compose  # type: ignore
 
 from torch_tools.datasets import DataSet
@@ -114,3 +115,62 @@ def test_len_method(inputs_and_targets):
 
     msg = "Wrong length value."
     assert len(DataSet(inputs=inputs, targets=targets)) == len(inputs), msg
+
+
+def test_both_transforms_preserve_compact_dtypes():
+    """Test `uint8` images and integer targets keep their dtypes."""
+    inputs = [randint(0, 256, (3, 8, 8), dtype=uint8) for _ in range(2)]
+    targets = [randint(0, 3, (1, 8, 8)) for _ in range(2)]
+
+    dataset = DataSet(
+        inputs=inputs,
+        targets=targets,
+        both_tfms=Compose([lambda x: x.flip(-1)]),
+    )
+
+    for (x_item, y_item), in_item, tgt_item in zip(dataset, inputs, targets):
+        assert x_item.dtype == uint8, "Input dtype not preserved."
+        assert y_item.dtype == tgt_item.dtype, "Target dtype not preserved."
+        assert (x_item == in_item.flip(-1)).all()
+        assert (y_item == tgt_item.flip(-1)).all()
+
+
+def test_both_transforms_with_index_map_targets():
+    """Test `(H, W)` index-map targets go through `both_tfms` intact."""
+    inputs = [randint(0, 256, (3, 8, 6), dtype=uint8) for _ in range(2)]
+    targets = [randint(0, 3, (8, 6), dtype=uint8) for _ in range(2)]
+
+    dataset = DataSet(
+        inputs=inputs,
+        targets=targets,
+        both_tfms=Compose([lambda x: x.flip(-1)]),
+    )
+
+    for (x_item, y_item), in_item, tgt_item in zip(dataset, inputs, targets):
+        assert x_item.shape == (3, 8, 6) and y_item.shape == (8, 6)
+        assert y_item.dtype == uint8
+        assert (x_item == in_item.flip(-1)).all()
+        assert (y_item == tgt_item.flip(-1)).all()
+
+
+def test_both_transforms_keep_float_and_transform_dtypes():
+    """Test only compact integer pairs are cast back after the transforms."""
+    # Float inputs with integer targets get the promoted dtype, as ever
+    dataset = DataSet(
+        inputs=[rand(3, 8, 8)],
+        targets=[randint(0, 3, (1, 8, 8))],
+        both_tfms=Compose([lambda x: x.flip(-1)]),
+    )
+    x_item, y_item = dataset[0]
+    assert x_item.dtype == float32 and y_item.dtype == float32
+
+    # A transform producing floats from integer items is not truncated
+    dataset = DataSet(
+        inputs=[randint(0, 256, (3, 8, 8), dtype=uint8)],
+        targets=[randint(0, 3, (1, 8, 8), dtype=int64)],
+        both_tfms=Compose([lambda x: x.float() / 2.0]),
+    )
+    x_item, y_item = dataset[0]
+    assert x_item.dtype == float32 and y_item.dtype == float32
+    assert (x_item == dataset.inputs[0].float() / 2.0).all()
+    assert (y_item == dataset.targets[0].float() / 2.0).all()
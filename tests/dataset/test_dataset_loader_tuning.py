@@ -0,0 +1,138 @@
+"""Test the `DataLoader` autotuner in `torch_tools.datasets`."""
+from pathlib import Path
+import json
+
+import pytest
+
+from torch import rand  # pylint: disable=no-name-in-module
+from torch.nn import Linear, Sequential, BatchNorm1d
+
+from torch_tools.datasets import DataSet, tune_data_loader
+from torch_tools.datasets._loader_tuning import _fingerprint
+
+
+def _dataset() -> DataSet:
+    """Return a small dataset of random vectors."""
+    return DataSet(inputs=list(rand(32, 8)), targets=list(rand(32, 1)))
+
+
+def test_tune_data_loader_returns_loader_kwargs(tmp_path: Path):
+    """Test the tuner returns settings from the search space."""
+    kwargs = tune_data_loader(
+        _dataset(),
+        Linear(8, 1),
+        num_workers=(0, 1),
+        prefetch_factors=(2,),
+        batch_sizes=(4, 8),
+        num_batches=3,
+        cache_dir=tmp_path,
+    )
+
+    assert set(kwargs) == {"batch_size", "num_workers", "prefetch_factor"}
+    assert kwargs["batch_size"] in (4, 8)
+    assert kwargs["num_workers"] in (0, 1)
+
+    cached = json.loads((tmp_path / "loader_tuning.json").read_text())
+    (entry,) = cached.values()
+    assert entry["best"] == kwargs
+    assert len(entry["trials"]) == 4
+    for trial in entry["trials"]:
+        assert trial["samples_per_sec"] > 0.0
+        assert 0.0 <= trial["worker_idle"] <= 1.0
+
+
+def test_tune_data_loader_uses_cached_results(tmp_path: Path):
+    """Test later calls return the cached settings without rerunning."""
+    settings = {
+        "num_workers": (0,),
+        "batch_sizes": (4, 8),
+        "num_batches": 2,
+        "cache_dir": tmp_path,
+    }
+    first = tune_data_loader(_dataset(), Linear(8, 1), **settings)
+
+    # Doctor the cache: a cache hit should hand the doctored settings back
+    cache_file = tmp_path / "loader_tuning.json"
+    cache = json.loads(cache_file.read_text())
+    (key,) = cache.keys()
+    cache[key]["best"] = {"batch_size": 3, "num_workers": 0, "prefetch_factor": None}
+    cache_file.write_text(json.dumps(cache))
+
+    assert tune_data_loader(_dataset(), Linear(8, 1), **settings)["batch_size"] == 3
+    retuned = tune_data_loader(_dataset(), Linear(8, 1), retune=True, **settings)
+    assert retuned["batch_size"] in (4, 8)
+    assert first["batch_size"] in (4, 8)
+
+
+def test_tune_data_loader_memory_cap(tmp_path: Path):
+    """Test we are told if no settings fit under the memory cap."""
+    with pytest.raises(RuntimeError):
+        tune_data_loader(
+            _dataset(),
+            Linear(8, 1),
+            num_workers=(0,),
+            batch_sizes=(4,),
+            num_batches=2,
+            max_rss_bytes=1,
+            cache_dir=tmp_path,
+        )
+
+
+def test_tune_data_loader_argument_types(tmp_path: Path):
+    """Test the types and values accepted by `tune_data_loader`."""
+    with pytest.raises(TypeError):
+        tune_data_loader(_dataset(), "Saruman", cache_dir=tmp_path)
+    with pytest.raises(TypeError):
+        tune_data_loader(_dataset(), Linear(8, 1), cache_dir=str(tmp_path))
+    with pytest.raises(TypeError):
+        tune_data_loader(_dataset(), Linear(8, 1), batch_sizes=(4.0,))
+    with pytest.raises(ValueError):
+        tune_data_loader(_dataset(), Linear(8, 1), num_workers=(-1,))
+    with pytest.raises(ValueError):
+        tune_data_loader(_dataset(), Linear(8, 1), batch_sizes=(), cache_dir=tmp_path)
+
+
+def test_tune_data_loader_leaves_model_unchanged(tmp_path: Path):
+    """Test the trials don't update batch-norm stats, or change the mode."""
+    model = Sequential(BatchNorm1d(8), Linear(8, 1)).train()
+    before = {key: value.clone() for key, value in model.state_dict().items()}
+
+    _ = tune_data_loader(
+        _dataset(),
+        model,
+        num_workers=(0,),
+        batch_sizes=(4,),
+        num_batches=2,
+        cache_dir=tmp_path,
+    )
+
+    assert model.training
+    for key, value in model.state_dict().items():
+        assert (value == before[key]).all(), key
+
+    _ = tune_data_loader(
+        _dataset(),
+        model.eval(),
+        num_workers=(0,),
+        batch_sizes=(4,),
+        retune=True,
+        cache_dir=tmp_path,
+    )
+    assert not model.training
+
+
+def test_tune_data_loader_empty_dataset(tmp_path: Path):
+    """Test empty datasets are rejected with a ``ValueError``."""
+    with pytest.raises(ValueError):
+        tune_data_loader([], Linear(8, 1), cache_dir=tmp_path)
+
+
+def test_tune_data_loader_fingerprint_is_stable():
+    """Test the fingerprint ignores reprs, but not the model's shapes."""
+    space = [{"batch_size": 4, "num_workers": 0, "prefetch_factor": None}]
+    mordor = [Path("Mordor") / f"{idx}.png" for idx in range(4)]
+    shire = [Path("Shire") / f"{idx}.png" for idx in range(4)]
+
+    first = _fingerprint(mordor, Linear(8, 1), space, None)
+    assert _fingerprint(shire, Linear(8, 1), space, None) == first
+    assert _fingerprint(shire, Linear(8, 2), space, None) != first
@@ -0,0 +1,118 @@
+"""Test the numpy-to-tensor conversion in `torch_tools.datasets.DataSet`."""
+import warnings
+
+import numpy as np
+import pytest
+
+from torch import Tensor, float32, uint8  # pylint: disable=no-name-in-module
+
+from torch_tools.datasets import DataSet
+from torch_tools.datasets._numpy_conversion import ndarray_to_tensor
+
+
+def test_from_numpy_argument_types():
+    """Test the types accepted by the numpy conversion arguments."""
+    inputs = [np.zeros((2, 2)) for _ in range(3)]
+
+    # Should work with bools and torch dtypes
+    _ = DataSet(inputs=inputs, from_numpy=False)
+    _ = DataSet(inputs=inputs, numpy_dtype=float32)
+    _ = DataSet(inputs=inputs, hwc_to_chw=True)
+
+    # Should break with non-bools and non-dtypes
+    with pytest.raises(TypeError):
+        _ = DataSet(inputs=inputs, from_numpy=1)
+    with pytest.raises(TypeError):
+        _ = DataSet(inputs=inputs, hwc_to_chw="Gollum")
+    with pytest.raises(TypeError):
+        _ = DataSet(inputs=inputs, numpy_dtype="float32")
+
+
+def test_from_numpy_shares_memory_with_writable_arrays():
+    """Test writable arrays are not copied, and that we are warned."""
+    inputs = [np.zeros((4, 5, 3), dtype=np.uint8) for _ in range(3)]
+
+    with pytest.warns(UserWarning):
+        dataset = DataSet(inputs=inputs, from_numpy=True)
+
+    for idx, array in enumerate(inputs):
+        tensor = dataset[idx]
+        assert isinstance(tensor, Tensor)
+        assert tensor.data_ptr() == array.ctypes.data, "Array was copied."
+
+
+def test_from_numpy_copies_read_only_arrays():
+    """Test read-only arrays are copied, without warnings."""
+    inputs = [np.ones((4, 5), dtype=np.float32) for _ in range(3)]
+    _ = list(map(lambda x: x.setflags(write=False), inputs))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        dataset = DataSet(inputs=inputs, from_numpy=True)
+        tensor = dataset[0]
+
+    assert tensor.data_ptr() != inputs[0].ctypes.data
+    assert (tensor == 1).all()
+
+
+def test_from_numpy_warns_only_when_memory_is_shared():
+    """Test the warning depends on whether the arrays will be viewed."""
+    inputs = [np.zeros((4, 5), dtype=np.float32) for _ in range(3)]
+
+    with pytest.warns(UserWarning):
+        _ = DataSet(inputs=inputs, from_numpy=True, numpy_dtype=float32)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        _ = DataSet(inputs=inputs, from_numpy=True, numpy_dtype=uint8)
+        _ = DataSet(inputs=[x.astype(">f4") for x in inputs], from_numpy=True)
+        _ = DataSet(inputs=[x[::-1] for x in inputs], from_numpy=True)
+
+
+def test_from_numpy_cast_and_permute():
+    """Test the dtype cast and channel permutation are applied."""
+    array = np.random.randint(0, 255, size=(4, 5, 3)).astype(np.uint8)
+    target = np.random.randint(0, 3, size=(4, 5)).astype(np.uint8)
+
+    # The cast copies the arrays, so nothing is shared and there's no warning
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        dataset = DataSet(
+            inputs=[array],
+            targets=[target],
+            from_numpy=True,
+            numpy_dtype=float32,
+            hwc_to_chw=True,
+        )
+
+    x_item, y_item = dataset[0]
+
+    assert x_item.shape == (3, 4, 5)
+    assert x_item.dtype == float32
+    assert x_item.is_contiguous()
+    assert (x_item.numpy() == array.transpose(2, 0, 1)).all()
+
+    # Two-dimensional arrays should not be permuted
+    assert y_item.shape == (4, 5)
+    assert (y_item.numpy() == target).all()
+
+
+def test_from_numpy_off_leaves_arrays_alone():
+    """Test the arrays are returned unchanged if `from_numpy` is `False`."""
+    inputs = [np.zeros((2, 2)) for _ in range(3)]
+    dataset = DataSet(inputs=inputs)
+    assert all(map(lambda x: isinstance(x, np.ndarray), dataset))
+
+
+def test_ndarray_to_tensor_handles_awkward_arrays():
+    """Test arrays with negative strides and non-native byte order."""
+    array = np.arange(12, dtype=">i4").reshape(3, 4)[::-1]
+
+    tensor = ndarray_to_tensor(array)
+    assert (tensor.numpy() == array).all()
+
+    tensor = ndarray_to_tensor(np.zeros((2, 2, 3), dtype=np.uint8), uint8, True)
+    assert tensor.shape == (3, 2, 2)
+
+    with pytest.raises(TypeError):
+        ndarray_to_tensor([1, 2, 3])
@@ -0,0 +1,177 @@
+"""Test the SQLite sample index and the datasets it builds."""
+import pickle
+from pathlib import Path
+from zipfile import ZipFile
+
+import pytest
+
+from torch import Tensor, full  # pylint: disable=no-name-in-module
+from torch.utils.data import DataLoader
+from torchvision.transforms import Compose  # type: ignore
+
+from torch_tools.datasets import SampleIndex, DataSet
+from torch_tools.datasets._indexed_column import IndexedColumn
+from torch_tools.archive_utils import list_zip_members, zip_member_offset
+
+
+_SITES = ["Rivendell", "Lorien", "Moria"]
+
+
+def _load_number(path: Path) -> Tensor:
+    """Load the number in the file at ``path`` into a small tensor."""
+    return full((3,), float(path.read_text()))
+
+
+def _build_index(tmp_path: Path, count: int = 12) -> SampleIndex:
+    """Write ``count`` files and index them."""
+    (tmp_path / "imgs").mkdir()
+    for idx in range(count):
+        (tmp_path / "imgs" / f"{idx:02d}.txt").write_text(str(idx))
+
+    index = SampleIndex(
+        tmp_path / "index.sqlite",
+        columns={"site": "TEXT", "label": "INTEGER", "date": "text"},
+    )
+    index.add(
+        (
+            {
+                "sample_id": f"elf-{idx:02d}",
+                "path": str(tmp_path / "imgs" / f"{idx:02d}.txt"),
+                "site": _SITES[idx % 3],
+                "label": idx % 2,
+                "date": f"2024-01-{idx + 1:02d}",
+            }
+            for idx in range(count)
+        ),
+        batch_size=5,
+    )
+    return index
+
+
+def test_filtered_dataset(tmp_path: Path):
+    """Test a filtered query builds the right dataset."""
+    index = _build_index(tmp_path)
+
+    dataset = index.dataset(
+        target_column="label",
+        filters={"site": ["Rivendell", "Lorien"]},
+        where="date < ?",
+        params=("2024-01-09",),
+        input_tfms=Compose([_load_number]),
+    )
+
+    assert isinstance(dataset, DataSet)
+    assert isinstance(dataset.inputs, IndexedColumn)
+    assert len(dataset) == index.count(
+        {"site": ["Rivendell", "Lorien"]}, "date < ?", ("2024-01-09",)
+    )
+
+    numbers = [int(dataset[idx][0][0]) for idx in range(len(dataset))]
+    assert numbers == [0, 1, 3, 4, 6, 7]
+    assert [int(dataset[idx][1]) for idx in range(len(dataset))] == [0, 1, 1, 0, 0, 1]
+
+
+def test_dataset_in_worker_processes(tmp_path: Path):
+    """Test the dataset's lazy columns work in ``DataLoader`` workers."""
+    index = _build_index(tmp_path)
+    dataset = index.dataset(
+        filters={"site": "Moria"},
+        order_by="date",
+        input_tfms=Compose([_load_number]),
+    )
+
+    batches = list(DataLoader(dataset, batch_size=2, num_workers=2))
+
+    assert [int(x) for batch in batches for x in batch[:, 0]] == [2, 5, 8, 11]
+    assert len(pickle.loads(pickle.dumps(dataset.inputs))) == 4
+
+
+@pytest.mark.parametrize("dir_name", ["Barad#dur", "Orthanc?tower", "p%41lantir"])
+def test_dataset_index_path_with_uri_characters(tmp_path: Path, dir_name: str):
+    """Test the index is found even if its path has URI-special characters."""
+    (tmp_path / dir_name).mkdir()
+    index = _build_index(tmp_path / dir_name)
+    dataset = index.dataset(filters={"site": "Moria"}, order_by="date")
+
+    assert dataset.inputs[0] == tmp_path / dir_name / "imgs" / "02.txt"
+
+
+def test_add_replaces_and_remove(tmp_path: Path):
+    """Test adding an existing id replaces it, and samples can be removed."""
+    index = _build_index(tmp_path)
+    assert len(index) == 12
+
+    index.add([{"sample_id": "elf-00", "path": "Mordor.txt", "label": 7}])
+    assert len(index) == 12 and index.count({"label": 7}) == 1
+
+    index.remove(["elf-00", "elf-01"])
+    assert len(index) == 10
+
+    # The columns should survive reopening
+    assert SampleIndex(tmp_path / "index.sqlite").columns["label"] == "INTEGER"
+
+
+def test_add_keeps_earlier_selections_valid(tmp_path: Path):
+    """Test replacing a sample doesn't break datasets built before."""
+    index = _build_index(tmp_path)
+    dataset = index.dataset(target_column="label", order_by="sample_id")
+
+    index.add([{"sample_id": "elf-00", "path": "Mordor.txt"}])
+
+    assert len(dataset) == 12
+    assert dataset.inputs[0] == Path("Mordor.txt")
+    assert dataset.targets is not None
+    assert dataset.targets[1] == 1
+    assert index.count({"site": "Rivendell"}) == 3
+
+    index.remove(["elf-00"])
+    with pytest.raises(RuntimeError, match="removed"):
+        _ = dataset.inputs[0]
+
+
+def test_read_bytes_from_archive_offset(tmp_path: Path):
+    """Test samples are read directly from their offset in an archive."""
+    with ZipFile(tmp_path / "Shire.zip", "w") as archive:
+        archive.writestr("frodo.txt", b"Frodo Baggins")
+
+    offset = zip_member_offset(list_zip_members(tmp_path / "Shire.zip")[0])
+    index = SampleIndex(tmp_path / "index.sqlite")
+    index.add(
+        [
+            {
+                "sample_id": "frodo",
+                "path": str(tmp_path / "Shire.zip" / "frodo.txt"),
+                "archive": str(tmp_path / "Shire.zip"),
+                "offset": offset,
+                "size": 13,
+            }
+        ]
+    )
+
+    assert index.read_bytes("frodo") == b"Frodo Baggins"
+    with pytest.raises(KeyError):
+        index.read_bytes("Gollum")
+
+
+def test_sample_index_argument_checks(tmp_path: Path):
+    """Test the index's arguments are checked."""
+    with pytest.raises(TypeError):
+        _ = SampleIndex(str(tmp_path / "index.sqlite"))  # type: ignore
+    with pytest.raises(TypeError):
+        _ = SampleIndex(tmp_path / "index.sqlite", columns=["site"])  # type: ignore
+    with pytest.raises(ValueError):
+        _ = SampleIndex(tmp_path / "index.sqlite", columns={"site; DROP": "TEXT"})
+    with pytest.raises(ValueError):
+        _ = SampleIndex(tmp_path / "index.sqlite", columns={"site": "BLOB"})
+
+    index = _build_index(tmp_path)
+    with pytest.raises(ValueError):
+        _ = SampleIndex(tmp_path / "index.sqlite", columns={"site": "REAL"})
+    with pytest.raises(ValueError):
+        index.add([{"sample_id": "Sam", "path": "sam.txt", "hobbit": True}])
+    with pytest.raises(ValueError):
+        index.add([{"sample_id": "Sam"}])
+    with pytest.raises(ValueError):
+        _ = index.dataset(filters={"hobbit": True})
+    with pytest.raises(ValueError):
+        _ = index.dataset(filters={"site": "Mordor"})
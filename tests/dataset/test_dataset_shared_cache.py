@@ -0,0 +1,115 @@
+"""Test the shared-memory sample cache used by `DataSet`."""
+import pytest
+
+from torch import rand, arange, zeros, equal  # pylint: disable=no-name-in-module
+from torch import float16, bool as torch_bool  # pylint: disable=no-name-in-module
+from torch.utils.data import DataLoader
+from torchvision.transforms import Compose  # type: ignore
+
+from torch_tools.datasets import DataSet
+from torch_tools.datasets._shared_cache import SharedSampleCache
+
+
+def test_shared_sample_cache_argument_types():
+    """Test the types and values accepted by `SharedSampleCache`."""
+    # Should work with non-negative ints
+    _ = SharedSampleCache(num_items=10, max_bytes=1024)
+    _ = SharedSampleCache(num_items=0, max_bytes=1)
+
+    # Should break with non-ints
+    with pytest.raises(TypeError):
+        _ = SharedSampleCache(num_items=10.0, max_bytes=1024)
+    with pytest.raises(TypeError):
+        _ = SharedSampleCache(num_items=10, max_bytes="Shelob")
+
+    # Should break with values which are too small
+    with pytest.raises(ValueError):
+        _ = SharedSampleCache(num_items=-1, max_bytes=1024)
+    with pytest.raises(ValueError):
+        _ = SharedSampleCache(num_items=10, max_bytes=0)
+
+
+def test_shared_sample_cache_round_trip():
+    """Test samples come back out of the cache unchanged."""
+    cache = SharedSampleCache(num_items=3, max_bytes=4096)
+
+    samples = [
+        (rand(3, 4, 5), arange(7)),
+        (rand(2).to(float16),),
+        (zeros(2, 3, dtype=torch_bool), rand(())),
+    ]
+
+    for idx, sample in enumerate(samples):
+        assert cache.get(idx) is None
+        assert cache.put(idx, sample)
+
+    for idx, sample in enumerate(samples):
+        cached = cache.get(idx)
+        assert len(cached) == len(sample)
+        for cached_tensor, tensor in zip(cached, sample):
+            assert cached_tensor.dtype == tensor.dtype
+            assert equal(cached_tensor, tensor)
+
+    assert cache.hits == 3
+    assert cache.misses == 3
+
+
+def test_shared_sample_cache_rejects_uncacheable_samples():
+    """Test non-tensor and over-sized samples are not stored."""
+    cache = SharedSampleCache(num_items=2, max_bytes=64)
+
+    assert not cache.put(0, ("Not a tensor",))
+    assert not cache.put(0, (rand(100),))
+    assert not cache.put(0, (rand(1), rand(1), rand(1)))
+    assert cache.get(0) is None
+
+
+def test_shared_sample_cache_evicts_oldest_samples_first():
+    """Test the first-in-first-out eviction policy."""
+    # Room for exactly three 32-byte samples
+    cache = SharedSampleCache(num_items=10, max_bytes=96)
+
+    for idx in range(5):
+        assert cache.put(idx, (rand(8),))
+
+    assert cache.get(0) is None
+    assert cache.get(1) is None
+    for idx in range(2, 5):
+        assert cache.get(idx) is not None
+
+
+def test_dataset_cache_shared_between_workers():
+    """Test samples cached by one worker are hits in every other worker."""
+    dataset = DataSet(
+        inputs=list(map(str, range(8))),
+        input_tfms=Compose([lambda x: rand(3, 4, 4)]),
+        cache_bytes=2**16,
+    )
+
+    loader = DataLoader(dataset, batch_size=2, num_workers=2)
+
+    first = list(loader)
+    second = list(loader)
+
+    for batch_one, batch_two in zip(first, second):
+        assert equal(batch_one, batch_two), "Cached samples not reused."
+
+    assert dataset._cache.misses == 8  # pylint: disable=protected-access
+    assert dataset._cache.hits == 8  # pylint: disable=protected-access
+
+
+def test_dataset_cache_still_applies_both_tfms():
+    """Test `both_tfms` are applied to cached samples on every fetch."""
+    dataset = DataSet(
+        inputs=list(map(str, range(4))),
+        targets=list(map(str, range(4))),
+        input_tfms=Compose([lambda x: zeros(1, 2, 2)]),
+        target_tfms=Compose([lambda x: zeros(1, 2, 2)]),
+        both_tfms=Compose([lambda x: x + rand(1)]),
+        cache_bytes=2**12,
+    )
+
+    x_one, _ = dataset[0]
+    x_two, _ = dataset[0]
+
+    assert not equal(x_one, x_two), "both_tfms not applied to cached sample."
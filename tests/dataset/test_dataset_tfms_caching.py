@@ -0,0 +1,147 @@
+"""Test the caching of deterministic transforms in `DataSet`."""
+from pathlib import Path
+from typing import Dict, Any
+
+import pytest
+
+from torch import rand, zeros, Tensor  # pylint: disable=no-name-in-module
+from torchvision.transforms import Compose, RandomHorizontalFlip  # type: ignore
+from torchvision.transforms import Normalize  # type: ignore
+
+from torch_tools.datasets import DataSet, CacheBoundary
+from torch_tools.datasets._tfms_caching import split_tfms, DiskSampleCache
+
+# pylint: disable=too-few-public-methods
+
+
+class _CountingTfm:
+    """Identity transform which counts how many times it is called."""
+
+    def __init__(self):
+        """Build `_CountingTfm`."""
+        self.calls = 0
+
+    def __call__(self, item: Tensor) -> Tensor:
+        """Count the call and return `item`."""
+        self.calls += 1
+        return item
+
+
+class RandomNoise:
+    """Add fresh noise to a tensor each time it is called."""
+
+    def __call__(self, item: Tensor) -> Tensor:
+        """Add noise to `item`."""
+        return item + rand(item.shape)
+
+
+def test_split_tfms_at_first_random_transform():
+    """Test `split_tfms` splits just before the first random transform."""
+    counter = _CountingTfm()
+    flip = RandomHorizontalFlip()
+    norm = Normalize(mean=(0.5,), std=(0.5,))
+
+    prefix, tail = split_tfms(Compose([counter, norm, flip, counter]))
+    assert prefix.transforms == [counter, norm]
+    assert tail.transforms == [flip, counter]
+
+    prefix, tail = split_tfms(Compose([counter, norm]))
+    assert prefix.transforms == [counter, norm]
+    assert tail is None
+
+    assert split_tfms(None) == (None, None)
+
+
+def test_split_tfms_at_cache_boundary():
+    """Test `split_tfms` splits at (and drops) the first `CacheBoundary`."""
+    counter = _CountingTfm()
+    flip = RandomHorizontalFlip()
+
+    prefix, tail = split_tfms(Compose([counter, CacheBoundary(), flip]))
+    assert prefix.transforms == [counter]
+    assert tail.transforms == [flip]
+
+    # The boundary should win over the random-transform detection
+    prefix, tail = split_tfms(Compose([flip, counter, CacheBoundary()]))
+    assert prefix.transforms == [flip, counter]
+    assert tail is None
+
+    assert CacheBoundary()("Smeagol") == "Smeagol"
+
+
+@pytest.mark.parametrize("cache", ["cache_bytes", "cache_dir"])
+def test_cached_prefix_runs_once_and_tail_every_fetch(cache, tmp_path: Path):
+    """Test the prefix is only run once, while the random tail is rerun."""
+    counter = _CountingTfm()
+    cache_kwargs: Dict[str, Any] = {"cache_bytes": 2**16, "cache_dir": tmp_path}
+
+    dataset = DataSet(
+        inputs=[zeros(1, 4, 4) for _ in range(3)],
+        input_tfms=Compose([counter, CacheBoundary(), RandomNoise()]),
+        **{cache: cache_kwargs[cache]},
+    )
+
+    first = [dataset[idx] for idx in range(len(dataset))]
+    second = [dataset[idx] for idx in range(len(dataset))]
+
+    assert counter.calls == len(dataset)
+    assert all(map(lambda x, y: not (x == y).all(), first, second))
+
+
+def test_tails_only_split_when_caching():
+    """Test the transforms are left whole if there is no cache."""
+    counter = _CountingTfm()
+    dataset = DataSet(
+        inputs=[zeros(1, 4, 4) for _ in range(3)],
+        input_tfms=Compose([counter, CacheBoundary(), counter]),
+    )
+
+    _ = [dataset[idx] for idx in range(len(dataset))]
+    _ = [dataset[idx] for idx in range(len(dataset))]
+
+    assert counter.calls == 4 * len(dataset)
+
+
+def test_targets_tail_applied_with_disk_cache(tmp_path: Path):
+    """Test the target tail is applied to cached targets."""
+    dataset = DataSet(
+        inputs=[zeros(1, 4, 4) for _ in range(2)],
+        targets=[zeros(1, 4, 4) for _ in range(2)],
+        target_tfms=Compose([RandomNoise()]),
+        cache_dir=tmp_path,
+    )
+
+    x_item, first = dataset[0]
+    _, second = dataset[0]
+
+    assert (x_item == 0).all()
+    assert not (first == second).all()
+    assert len(list(tmp_path.glob("*.pt"))) == 1
+
+
+def test_disk_sample_cache(tmp_path: Path):
+    """Test `DiskSampleCache` round trips samples and skips non-tensors."""
+    cache = DiskSampleCache(tmp_path / "Mordor")
+
+    assert cache.get(0) is None
+    assert cache.put(0, (rand(2, 3), rand(3))) is True
+    assert cache.put(1, (rand(2, 3), "Bilbo")) is False
+
+    sample = cache.get(0)
+    assert isinstance(sample, tuple) and len(sample) == 2
+    assert sample[0].shape == (2, 3)
+    assert cache.get(1) is None
+
+    # No temporary files should be left behind
+    assert list(map(lambda x: x.name, (tmp_path / "Mordor").iterdir())) == ["0.pt"]
+
+
+def test_cache_argument_types(tmp_path: Path):
+    """Test the types accepted by the cache arguments."""
+    inputs = [zeros(1, 2, 2) for _ in range(2)]
+
+    with pytest.raises(TypeError):
+        _ = DataSet(inputs=inputs, cache_dir=str(tmp_path))  # type: ignore
+
+    with pytest.raises(ValueError):
+        _ = DataSet(inputs=inputs, cache_dir=tmp_path, cache_bytes=2**16)
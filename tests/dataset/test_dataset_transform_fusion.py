@@ -0,0 +1,120 @@
+"""Test the fusion of pointwise transforms in `torch_tools.datasets`."""
+import numpy as np
+import pytest
+
+from PIL import Image
+
+from torch import rand, allclose, float64  # pylint: disable=no-name-in-module
+from torch import uint8, randint, int32  # pylint: disable=no-name-in-module
+from torchvision.transforms import (  # type: ignore
+    Compose,
+    ToTensor,
+    PILToTensor,
+    ConvertImageDtype,
+    Normalize,
+    CenterCrop,
+)
+
+from torch_tools.datasets import DataSet
+from torch_tools.datasets._transform_fusion import fuse_tfms, FusedPointwiseTfms
+
+
+_mean, _std = (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)
+
+
+def test_fuse_tfms_argument_type():
+    """Test `fuse_tfms` only accepts `Compose`."""
+    _ = fuse_tfms(Compose([ToTensor()]))
+
+    with pytest.raises(TypeError):
+        _ = fuse_tfms([ToTensor(), Normalize(_mean, _std)])
+
+
+def test_fuse_tfms_groups_runs_correctly():
+    """Test the runs of fusable transforms are identified."""
+    crop = CenterCrop(4)
+    tfms = fuse_tfms(
+        Compose(
+            [
+                crop,
+                ToTensor(),
+                Normalize(_mean, _std),
+                crop,
+                Normalize(_mean, _std),
+                ConvertImageDtype(float64),
+                ToTensor(),
+            ]
+        )
+    ).transforms
+
+    assert len(tfms) == 5
+    assert tfms[0] is crop
+    assert isinstance(tfms[1], FusedPointwiseTfms) and len(tfms[1].tfms) == 2
+    assert tfms[2] is crop
+    assert isinstance(tfms[3], FusedPointwiseTfms) and len(tfms[3].tfms) == 2
+    assert isinstance(tfms[4], ToTensor)
+
+
+def test_fused_tfms_match_unfused_with_arrays():
+    """Test the fused transforms give the same results on uint8 arrays."""
+    tfms = Compose([ToTensor(), Normalize(_mean, _std)])
+    img = np.random.randint(0, 256, size=(16, 8, 3)).astype(np.uint8)
+
+    fused = fuse_tfms(tfms)(img)
+    expected = tfms(img)
+
+    assert fused.shape == expected.shape
+    assert fused.dtype == expected.dtype
+    assert allclose(fused, expected, atol=1e-5)
+
+
+def test_fused_tfms_match_unfused_with_pil_images():
+    """Test the fused transforms give the same results on PIL images."""
+    array = np.random.randint(0, 256, size=(16, 8, 3)).astype(np.uint8)
+
+    for img in (Image.fromarray(array), Image.fromarray(array[:, :, 0])):
+        for tfms in (
+            Compose([ToTensor(), Normalize((0.5,), (0.25,))]),
+            Compose([PILToTensor(), ConvertImageDtype(float64)]),
+        ):
+            assert allclose(fuse_tfms(tfms)(img), tfms(img), atol=1e-5)
+
+
+def test_fused_tfms_match_unfused_with_tensors():
+    """Test the fused transforms give the same results on tensors."""
+    img = randint(0, 256, (2, 3, 8, 8)).to(uint8)
+    tfms = Compose([ConvertImageDtype(float64), Normalize(_mean, _std)])
+    assert allclose(fuse_tfms(tfms)(img), tfms(img))
+
+
+def test_fused_tfms_fall_back_to_originals():
+    """Test inputs the fused path can't handle go through the originals."""
+    img = Image.fromarray(np.zeros((4, 4), dtype=np.int32), mode="I")
+    tfms = Compose([ToTensor(), ConvertImageDtype(float64)])
+    assert allclose(fuse_tfms(tfms)(img), tfms(img))
+
+    tfms = Compose([PILToTensor(), ConvertImageDtype(int32)])
+    img = Image.fromarray(np.zeros((4, 4, 3), dtype=np.uint8))
+    assert (fuse_tfms(tfms)(img) == tfms(img)).all()
+
+
+def test_dataset_fuse_tfms():
+    """Test `DataSet` applies fused transforms when asked to."""
+    inputs = [np.random.randint(0, 256, (8, 8, 3)).astype(np.uint8)]
+    tfms = Compose([ToTensor(), Normalize(_mean, _std)])
+
+    fused = DataSet(inputs=inputs, input_tfms=tfms, fuse_tfms=True)
+    unfused = DataSet(inputs=inputs, input_tfms=tfms)
+
+    assert allclose(fused[0], unfused[0], atol=1e-5)
+
+    with pytest.raises(TypeError):
+        _ = DataSet(inputs=inputs, input_tfms=tfms, fuse_tfms=1)
+
+
+def test_fused_tfms_do_not_modify_inputs():
+    """Test the fused transforms never write to their input."""
+    img = rand(3, 4, 4)
+    copy = img.clone()
+    _ = fuse_tfms(Compose([Normalize(_mean, _std), Normalize(_mean, _std)]))(img)
+    assert (img == copy).all()
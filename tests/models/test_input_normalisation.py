@@ -0,0 +1,126 @@
+"""Tests for ``torch_tools.models._input_normalisation``."""
+import pytest
+
+from torch import (
+    randint,
+    rand,
+    uint8,
+    float16,
+    allclose,
+    tensor,
+)  # pylint: disable=no-name-in-module
+from torch.nn import Sequential
+
+from torch_tools import UNet, ConvNet2d, SimpleConvNet2d, AutoEncoder2d, FCNet
+from torch_tools.models._input_normalisation import InputNormalisation
+
+
+def test_input_normalisation_argument_types():
+    """Test the types accepted by ``InputNormalisation``."""
+    # Should work with floats and tuples of floats
+    _ = InputNormalisation(scale=1.0, mean=(0.5,), std=(0.1, 0.2, 0.3))
+
+    # Should break with non-floats
+    with pytest.raises(TypeError):
+        _ = InputNormalisation(scale=1)
+    with pytest.raises(TypeError):
+        _ = InputNormalisation(mean=[0.5])
+    with pytest.raises(TypeError):
+        _ = InputNormalisation(std=(1, 2, 3))
+
+
+def test_input_normalisation_argument_values():
+    """Test the values accepted by ``InputNormalisation``."""
+    with pytest.raises(ValueError):
+        _ = InputNormalisation(scale=0.0)
+    with pytest.raises(ValueError):
+        _ = InputNormalisation(mean=())
+    with pytest.raises(ValueError):
+        _ = InputNormalisation(std=(0.5, 0.0))
+
+
+def test_input_normalisation_return_values():
+    """Test ``InputNormalisation`` computes ``((x * scale) - mean) / std``."""
+    mean, std = (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)
+    norm = InputNormalisation(mean=mean, std=std)
+
+    batch = randint(0, 256, (4, 3, 8, 8), dtype=uint8)
+    expected = ((batch / 255.0) - tensor(mean).view(1, 3, 1, 1)) / tensor(std).view(
+        1, 3, 1, 1
+    )
+
+    assert allclose(norm(batch), expected, atol=1e-5)
+
+    # Should work with feature vectors too
+    features = randint(0, 256, (4, 3), dtype=uint8)
+    assert norm(features).shape == (4, 3)
+
+    # Should follow the model's dtype
+    assert norm.half()(batch).dtype == float16
+
+
+def test_input_norm_kwargs_type():
+    """Test the models only accept dicts (or ``None``) for input norm."""
+    with pytest.raises(TypeError):
+        _ = FCNet(4, 2, input_norm_kwargs=(0.5,))
+    with pytest.raises(TypeError):
+        _ = UNet(3, 2, input_norm_kwargs="Faramir")
+
+
+def test_models_accept_uint8_with_input_norm():
+    """Test each model can be fed ``uint8`` inputs with input norm."""
+    norm = {"mean": (0.5,), "std": (0.25,)}
+    images = randint(0, 256, (2, 3, 16, 16), dtype=uint8)
+
+    model = UNet(3, 2, features_start=4, num_layers=2, input_norm_kwargs=norm)
+    assert model(images).shape == (2, 2, 16, 16)
+
+    model = AutoEncoder2d(3, 3, 2, 4, input_norm_kwargs=norm)
+    assert model(images).shape == (2, 3, 16, 16)
+
+    model = ConvNet2d(
+        2,
+        encoder_style="resnet18",
+        pretrained=False,
+        input_norm_kwargs=norm,
+    )
+    assert model(images).shape == (2, 2)
+
+    model = SimpleConvNet2d(3, 2, 4, 2, input_norm_kwargs=norm)
+    assert isinstance(model[0], InputNormalisation)
+    assert model(images).shape == (2, 2)
+
+    model = FCNet(8, 2, input_norm_kwargs=norm)
+    assert isinstance(model[0], InputNormalisation)
+    assert model(randint(0, 256, (2, 8), dtype=uint8)).shape == (2, 2)
+
+
+def test_input_norm_does_not_change_state_dict():
+    """Test the input norm adds no keys to the models' state dicts."""
+    plain = UNet(3, 2, features_start=4, num_layers=2)
+    normed = UNet(3, 2, features_start=4, num_layers=2, input_norm_kwargs={})
+    assert plain.state_dict().keys() == normed.state_dict().keys()
+
+    assert isinstance(FCNet(8, 2, input_norm_kwargs={}), Sequential)
+    assert FCNet(8, 2)(rand(2, 8)).shape == (2, 2)
+
+
+def test_input_norm_loads_checkpoints_from_before_input_norm():
+    """Test ``Sequential`` models load state dicts saved without input norm."""
+    for build in [
+        lambda **x: FCNet(8, 2, **x),
+        lambda **x: SimpleConvNet2d(3, 2, 4, 2, **x),
+    ]:
+        old = build()
+        new = build(input_norm_kwargs={"scale": 1.0})
+
+        assert list(new.state_dict().keys()) == list(old.state_dict().keys())
+        new.load_state_dict(old.state_dict(), strict=True)
+        assert isinstance(new.input_norm, InputNormalisation)
+
+    model, old = FCNet(8, 2, input_norm_kwargs={"scale": 1.0}), FCNet(8, 2)
+    model.load_state_dict(old.state_dict())
+    model.eval()
+    old.eval()
+    batch = rand(3, 8)
+    assert allclose(model(batch), old(batch))
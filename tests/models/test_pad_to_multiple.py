@@ -0,0 +1,65 @@
+"""Tests for the ``PadToMultiple`` model wrapper."""
+import pytest
+
+from torch import rand, no_grad  # pylint:disable=no-name-in-module
+from torch.nn import Identity
+
+from torch_tools import UNet, AutoEncoder2d, PadToMultiple
+from torch_tools.models._pad_to_multiple import padding_to_multiple
+
+
+def test_padding_to_multiple():
+    """Test the padding takes the sizes up to the multiple."""
+    assert padding_to_multiple(64, 64, 8) == (0, 0, 0, 0)
+    assert padding_to_multiple(61, 64, 8) == (0, 0, 1, 2)
+    assert padding_to_multiple(64, 57, 8) == (3, 4, 0, 0)
+    assert padding_to_multiple(5, 5, 1) == (0, 0, 0, 0)
+
+
+def test_multiple_from_model():
+    """Test the multiple is found from the number of ``DownBlock``s."""
+    assert PadToMultiple(UNet(3, 2, features_start=8, num_layers=4)).multiple == 8
+    assert PadToMultiple(UNet(3, 2, features_start=8, num_layers=2)).multiple == 2
+
+    autoencoder = AutoEncoder2d(3, 3, num_layers=3, features_start=8)
+    assert PadToMultiple(autoencoder).multiple == 4
+
+    assert PadToMultiple(Identity(), multiple=16).multiple == 16
+
+
+@pytest.mark.parametrize("mode", ["constant", "reflect", "replicate"])
+@pytest.mark.parametrize("size", [(64, 64), (61, 50), (37, 99)])
+def test_unet_output_matches_input_size(mode, size):
+    """Test a wrapped ``UNet`` gives outputs the size of its inputs."""
+    model = PadToMultiple(UNet(3, 2, features_start=8, num_layers=3), mode=mode)
+
+    with no_grad():
+        assert model(rand(2, 3, *size)).shape == (2, 2, *size)
+
+
+def test_autoencoder_output_matches_input_size():
+    """Test a wrapped ``AutoEncoder2d`` gives outputs the size of its inputs."""
+    model = PadToMultiple(AutoEncoder2d(3, 3, num_layers=3, features_start=8))
+
+    with no_grad():
+        assert model(rand(2, 3, 37, 21), frozen_encoder=True).shape == (2, 3, 37, 21)
+
+
+def test_crop_gives_the_unpadded_region():
+    """Test the cropped output is the unpadded part of the batch."""
+    batch = rand(2, 3, 13, 7)
+    assert (PadToMultiple(Identity(), multiple=8)(batch) == batch).all()
+
+
+def test_pad_to_multiple_argument_checks():
+    """Test the arguments of ``PadToMultiple`` are checked."""
+    with pytest.raises(TypeError):
+        _ = PadToMultiple("Sauron")
+    with pytest.raises(TypeError):
+        _ = PadToMultiple(Identity(), multiple=8.0)
+    with pytest.raises(ValueError):
+        _ = PadToMultiple(Identity(), multiple=0)
+    with pytest.raises(TypeError):
+        _ = PadToMultiple(Identity(), mode=1)
+    with pytest.raises(ValueError):
+        _ = PadToMultiple(Identity(), mode="circular-ish")
@@ -0,0 +1,174 @@
+"""Tests for ``torch_tools.archive_utils``."""
+import io
+import os
+import tarfile
+from pathlib import Path
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+
+import pytest
+
+from torch_tools.archive_utils import list_zip_members, read_zip_member
+from torch_tools.archive_utils import zip_member_offset, ZipMember
+from torch_tools.archive_utils import list_tar_members, read_tar_member
+from torch_tools.archive_utils import tar_index_path, TarMember
+from torch_tools.archive_utils import _cached_tar_members
+
+
+@pytest.fixture(name="zip_path")
+def create_nested_zip(tmp_path: Path) -> Path:
+    """Create a zip file with stored, deflated and nested members."""
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w") as inner:
+        inner.writestr("Sting.txt", b"It glows blue")
+
+    path = tmp_path / "Erebor.zip"
+    with ZipFile(path, "w") as archive:
+        archive.writestr("Arkenstone.txt", b"Heart of the mountain", ZIP_STORED)
+        archive.writestr("Smaug.txt", b"I am fire " * 100, ZIP_DEFLATED)
+        archive.writestr("Bilbo.zip", buffer.getvalue(), ZIP_STORED)
+
+    return path
+
+
+def test_list_zip_members_records(zip_path: Path):
+    """Test the member records match ``zipfile``'s."""
+    members = list_zip_members(zip_path)
+
+    assert all(map(lambda x: isinstance(x, ZipMember), members))
+    assert [x.name for x in members] == ["Arkenstone.txt", "Smaug.txt", "Bilbo.zip"]
+
+    with ZipFile(zip_path) as archive:
+        for member, info in zip(members, archive.infolist()):
+            assert member.archive == zip_path
+            assert member.file_size == info.file_size
+            assert member.compressed_size == info.compress_size
+            assert member.header_offset == info.header_offset
+            assert member.crc == info.CRC
+            assert member.compress_type == info.compress_type
+            assert not member.parents
+
+
+def test_list_zip_members_nested(zip_path: Path):
+    """Test nested zip files are descended into on request."""
+    members = list_zip_members(zip_path, nested=True)
+
+    assert [x.name for x in members][-1] == "Sting.txt"
+    assert members[-1].parents == ("Bilbo.zip",)
+    assert read_zip_member(members[-1]) == b"It glows blue"
+
+
+def test_list_zip_members_cache_follows_changes(zip_path: Path):
+    """Test the cached listing is refreshed when the zip file changes."""
+    assert len(list_zip_members(zip_path)) == 3
+
+    with ZipFile(zip_path, "a") as archive:
+        archive.writestr("Thorin.txt", b"King under the mountain")
+    os.utime(zip_path, ns=(1, 1))
+
+    assert len(list_zip_members(zip_path)) == 4
+
+
+def test_read_zip_member(zip_path: Path):
+    """Test stored members are read by seeking, and others decompressed."""
+    members = list_zip_members(zip_path)
+    arkenstone, smaug = members[0], members[1]
+
+    offset = zip_member_offset(arkenstone)
+    with open(zip_path, "rb") as raw:
+        raw.seek(offset)
+        assert raw.read(arkenstone.file_size) == b"Heart of the mountain"
+
+    assert read_zip_member(arkenstone) == b"Heart of the mountain"
+    assert read_zip_member(smaug) == b"I am fire " * 100
+
+    with pytest.raises(ValueError):
+        zip_member_offset(smaug)
+
+
+def test_archive_utils_argument_types(zip_path: Path):
+    """Test the argument types are checked."""
+    with pytest.raises(TypeError):
+        list_zip_members(str(zip_path))
+    with pytest.raises(TypeError):
+        list_zip_members(zip_path, nested=1)
+    with pytest.raises(TypeError):
+        read_zip_member(str(zip_path))
+    with pytest.raises(TypeError):
+        zip_member_offset(("Erebor.zip", "Arkenstone.txt"))
+
+
+@pytest.fixture(name="tar_path")
+def create_tar(tmp_path: Path) -> Path:
+    """Create an uncompressed tar archive with a directory and two files."""
+    path = tmp_path / "Moria.tar"
+    with tarfile.open(path, "w") as archive:
+        for name, data in [("Balin.txt", b"Lord of Moria"), ("Durin/Bane.txt", b"")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        directory = tarfile.TarInfo("Durin")
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+    return path
+
+
+def test_list_tar_members_and_read(tar_path: Path):
+    """Test tar members are listed, indexed and read by seeking."""
+    members = list_tar_members(tar_path)
+
+    assert [x.name for x in members] == ["Balin.txt", "Durin/Bane.txt"]
+    assert all(map(lambda x: isinstance(x, TarMember), members))
+    assert not any(map(lambda x: x.compressed, members))
+    assert read_tar_member(members[0]) == b"Lord of Moria"
+
+    with open(tar_path, "rb") as raw:
+        raw.seek(members[0].offset)
+        assert raw.read(members[0].size) == b"Lord of Moria"
+
+    assert tar_index_path(tar_path).exists()
+
+
+def test_list_tar_members_reuses_index(tar_path: Path, monkeypatch):
+    """Test later listings read the index instead of scanning the archive."""
+    expected = list_tar_members(tar_path)
+
+    # Clear the in-memory cache and make scanning the archive impossible
+    _cached_tar_members.cache_clear()
+
+    def no_scanning(*args, **kwargs):
+        raise AssertionError("The archive was scanned.")
+
+    monkeypatch.setattr(tarfile, "open", no_scanning)
+    assert list_tar_members(tar_path) == expected
+
+
+def test_list_tar_members_rebuilds_stale_index(tar_path: Path):
+    """Test the index is rebuilt if the archive changes."""
+    _ = list_tar_members(tar_path)
+
+    with tarfile.open(tar_path, "a") as archive:
+        info = tarfile.TarInfo("Gandalf.txt")
+        info.size = 5
+        archive.addfile(info, io.BytesIO(b"Flee!"))
+
+    members = list_tar_members(tar_path)
+    assert members[-1].name == "Gandalf.txt"
+    assert read_tar_member(members[-1]) == b"Flee!"
+
+
+def test_list_tar_members_compressed(tmp_path: Path):
+    """Test compressed tar archives are listed and read."""
+    path = tmp_path / "Isengard.tar.gz"
+    with tarfile.open(path, "w:gz") as archive:
+        info = tarfile.TarInfo("Saruman.txt")
+        info.size = 5
+        archive.addfile(info, io.BytesIO(b"White"))
+
+    (member,) = list_tar_members(path)
+    assert member.compressed
+    assert read_tar_member(member) == b"White"
+
+    with pytest.raises(TypeError):
+        list_tar_members(str(path))
+    with pytest.raises(TypeError):
+        read_tar_member(str(path))
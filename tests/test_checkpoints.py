@@ -0,0 +1,530 @@
+"""Tests for ``torch_tools.checkpoints``."""
+import os
+from pathlib import Path
+
+import pytest
+
+import torch
+from torch import (  # pylint: disable=no-name-in-module
+    zeros,
+    ones,
+    arange,
+    float32,
+    rand,
+)  # pylint: disable=no-name-in-module
+from torch.nn import Module, Sequential, Conv2d, Linear, BatchNorm2d
+from torch.optim import Adam
+
+from torch_tools import ConvNet2d, FCNet, UNet
+from torch_tools.models import _torchvision_encoder_backbones_2d as backbones
+from torch_tools.checkpoints import load_checkpoint, LoadReport
+from torch_tools.checkpoints import CheckpointWriter, load_sharded_checkpoint
+from torch_tools.checkpoints import list_checkpoints, latest_checkpoint
+from torch_tools.checkpoints import read_manifest
+from torch_tools.checkpoints import meta_model, materialise_model
+
+
+def _model(in_channels: int = 3) -> Sequential:
+    """Return a small model, with zeroed parameters and buffers."""
+    model = Sequential(Conv2d(in_channels, 4, 3), BatchNorm2d(4), Linear(4, 2))
+    with torch.no_grad():
+        for tensor in model.state_dict(keep_vars=True).values():
+            tensor.zero_()
+    return model
+
+
+def _save(state, path: Path) -> Path:
+    """Save ``state`` to ``path`` and return ``path``."""
+    torch.save(state, path)
+    return path
+
+
+def test_load_checkpoint_loads_everything_when_model_matches(tmp_path: Path):
+    """Test all of the tensors are copied when the model matches."""
+    source = Sequential(Conv2d(3, 4, 3), BatchNorm2d(4), Linear(4, 2))
+    path = _save(source.state_dict(), tmp_path / "Mordor.pt")
+
+    model = _model()
+    report = load_checkpoint(model, path, strict=True)
+
+    assert isinstance(report, LoadReport)
+    assert report.loaded == list(model.state_dict().keys())
+    assert not report.partial + report.skipped + report.missing + report.unexpected
+
+    for key, value in source.state_dict().items():
+        assert (model.state_dict()[key] == value).all(), key
+
+
+def test_load_checkpoint_keeps_parameters_and_grad(tmp_path: Path):
+    """Test the tensors are copied into, not replaced."""
+    path = _save(Sequential(Linear(4, 2)).state_dict(), tmp_path / "Shire.pt")
+
+    model = Sequential(Linear(4, 2))
+    weight = model[0].weight
+    load_checkpoint(model, path)
+
+    assert model[0].weight is weight
+    assert model[0].weight.requires_grad
+
+
+def test_load_checkpoint_with_state_key(tmp_path: Path):
+    """Test the state dict is found with ``state_key``."""
+    state = {"model": _model().state_dict(), "epoch": 3}
+    path = _save(state, tmp_path / "Rohan.pt")
+
+    report = load_checkpoint(_model(), path, state_key="model")
+    assert len(report.loaded) == len(state["model"])
+
+    with pytest.raises(KeyError):
+        _ = load_checkpoint(_model(), path, state_key="Gondor")
+
+
+def test_load_checkpoint_prefix_map(tmp_path: Path):
+    """Test the checkpoint's key prefixes are remapped."""
+    state = {
+        f"module.{key}": ones(value.shape)
+        for key, value in _model().state_dict().items()
+    }
+    state["module.2.bias"] = arange(2, dtype=float32)
+    path = _save(state, tmp_path / "Isengard.pt")
+
+    model = _model()
+    report = load_checkpoint(model, path)
+    assert report.loaded == []
+    assert report.unexpected == list(state.keys())
+
+    report = load_checkpoint(model, path, prefix_map={"module.": ""})
+    assert report.unexpected == []
+    assert (model[2].bias == arange(2)).all()
+
+
+def test_load_checkpoint_prefix_map_uses_longest_prefix(tmp_path: Path):
+    """Test the longest of the matching prefixes is used."""
+    path = _save({"encoder.0.weight": ones(2, 4)}, tmp_path / "Moria.pt")
+
+    model = Sequential(Sequential(Linear(4, 2)))
+    report = load_checkpoint(
+        model,
+        path,
+        prefix_map={"encoder.": "Balrog.", "encoder.0.": "0.0."},
+    )
+
+    assert report.loaded == ["0.0.weight"]
+    assert (model[0][0].weight == 1).all()
+
+
+def test_load_checkpoint_shape_mismatch_skip(tmp_path: Path):
+    """Test shape-mismatched tensors are skipped by default."""
+    path = _save(_model(in_channels=3).state_dict(), tmp_path / "Bree.pt")
+
+    report = load_checkpoint(_model(in_channels=1), path)
+    assert report.skipped == ["0.weight"]
+    assert "0.weight" not in report.loaded
+    assert "0.bias" in report.loaded
+
+
+def test_load_checkpoint_shape_mismatch_partial(tmp_path: Path):
+    """Test shape-mismatched tensors are loaded in part."""
+    source = _model(in_channels=3)
+    with torch.no_grad():
+        source[0].weight.copy_(arange(source[0].weight.numel()).reshape(4, 3, 3, 3))
+    path = _save(source.state_dict(), tmp_path / "Rivendell.pt")
+
+    model = _model(in_channels=1)
+    report = load_checkpoint(model, path, mismatch="partial")
+    assert report.partial == ["0.weight"]
+    assert (model[0].weight == source[0].weight[:, :1]).all()
+
+    model = _model(in_channels=5)
+    _ = load_checkpoint(model, path, mismatch="partial")
+    assert (model[0].weight[:, :3] == source[0].weight).all()
+    assert (model[0].weight[:, 3:] == 0).all()
+
+
+def test_load_checkpoint_partial_skips_different_dims(tmp_path: Path):
+    """Test tensors with a different number of dims are skipped."""
+    path = _save({"0.weight": zeros(2, 4, 1)}, tmp_path / "Lorien.pt")
+
+    report = load_checkpoint(Sequential(Linear(4, 2)), path, mismatch="partial")
+    assert report.skipped == ["0.weight"]
+    assert report.missing == ["0.bias"]
+
+
+def test_load_checkpoint_shape_mismatch_error(tmp_path: Path):
+    """Test shape mismatches raise with ``mismatch='error'``."""
+    path = _save(_model(in_channels=3).state_dict(), tmp_path / "Erebor.pt")
+
+    with pytest.raises(RuntimeError):
+        _ = load_checkpoint(_model(in_channels=1), path, mismatch="error")
+
+
+def test_load_checkpoint_strict(tmp_path: Path):
+    """Test ``strict`` raises unless the model and checkpoint match."""
+    state = _model().state_dict()
+    _ = state.pop("2.bias")
+    path = _save(state, tmp_path / "Fangorn.pt")
+
+    report = load_checkpoint(_model(), path)
+    assert report.missing == ["2.bias"]
+
+    with pytest.raises(RuntimeError):
+        _ = load_checkpoint(_model(), path, strict=True)
+
+
+def test_load_checkpoint_legacy_format(tmp_path: Path):
+    """Test checkpoints which can't be memory-mapped are still loaded."""
+    path = tmp_path / "Edoras.pt"
+    torch.save({"0.weight": ones(2, 4)}, path, _use_new_zipfile_serialization=False)
+
+    model = Sequential(Linear(4, 2))
+    report = load_checkpoint(model, path)
+    assert report.loaded == ["0.weight"]
+    assert (model[0].weight == 1).all()
+
+
+def test_load_checkpoint_argument_types(tmp_path: Path):
+    """Test the types of the arguments are checked."""
+    path = _save(_model().state_dict(), tmp_path / "Minas Tirith.pt")
+
+    with pytest.raises(TypeError):
+        _ = load_checkpoint(_model().state_dict(), path)
+    with pytest.raises(TypeError):
+        _ = load_checkpoint(_model(), str(path))
+    with pytest.raises(TypeError):
+        _ = load_checkpoint(_model(), path, prefix_map=[("module.", "")])
+
+
+def test_load_checkpoint_mismatch_values(tmp_path: Path):
+    """Test the values of ``mismatch`` are checked."""
+    path = _save(_model().state_dict(), tmp_path / "Minas Morgul.pt")
+
+    for mismatch in ["skip", "partial", "error"]:
+        _ = load_checkpoint(_model(), path, mismatch=mismatch)
+
+    with pytest.raises(ValueError):
+        _ = load_checkpoint(_model(), path, mismatch="Sauron")
+
+
+def _train_step(model: Module, optimiser: Adam):
+    """Take one optimisation step, so the optimiser has some state."""
+    optimiser.zero_grad()
+    model(rand(2, 3, 16, 16)).sum().backward()
+    optimiser.step()
+
+
+def test_checkpoint_writer_shards_per_submodule(tmp_path: Path):
+    """Test the model is saved in one file per top-level submodule.
+
+    The pool and input norm have no parameters or buffers, so no shards.
+
+    """
+    model = ConvNet2d(out_feats=2, encoder_style="resnet18", pretrained=False)
+
+    with CheckpointWriter(tmp_path) as writer:
+        checkpoint_dir = writer.save(3, model, extra={"epoch": 3}).result()
+
+    assert checkpoint_dir == tmp_path / "step-0000000003"
+    names = {path.name for path in checkpoint_dir.iterdir()}
+    assert names == {
+        "manifest.json",
+        "model.backbone.pt",
+        "model.dense_layers.pt",
+    }
+
+    manifest = read_manifest(checkpoint_dir)
+    assert manifest["step"] == 3
+    assert manifest["extra"] == {"epoch": 3}
+    assert set(manifest["shards"]) == names - {"manifest.json"}
+
+
+def test_checkpoint_writer_round_trip(tmp_path: Path):
+    """Test the model and optimiser are restored from the shards."""
+    model = Sequential(Conv2d(3, 4, 3), BatchNorm2d(4))
+    optimiser = Adam(model.parameters())
+    _train_step(model, optimiser)
+
+    with CheckpointWriter(tmp_path) as writer:
+        _ = writer.save(1, model, optimiser)
+    expected = {key: value.clone() for key, value in model.state_dict().items()}
+
+    # Change the model after saving, to check the save used a snapshot.
+    _train_step(model, optimiser)
+
+    new_model = Sequential(Conv2d(3, 4, 3), BatchNorm2d(4))
+    new_optimiser = Adam(new_model.parameters())
+    report = load_sharded_checkpoint(
+        new_model,
+        latest_checkpoint(tmp_path),
+        optimiser=new_optimiser,
+        strict=True,
+    )
+
+    assert report.loaded == list(expected.keys())
+    for key, value in expected.items():
+        assert (new_model.state_dict()[key] == value).all(), key
+
+    assert new_optimiser.state_dict()["state"][0]["step"] == 1
+
+
+def test_checkpoint_writer_keeps_last(tmp_path: Path):
+    """Test only the last ``keep_last`` checkpoints are kept."""
+    model = _model()
+
+    with CheckpointWriter(tmp_path, keep_last=2) as writer:
+        for step in [1, 2, 10, 11]:
+            _ = writer.save(step, model)
+
+    assert list_checkpoints(tmp_path) == [
+        tmp_path / "step-0000000010",
+        tmp_path / "step-0000000011",
+    ]
+    assert not list(tmp_path.glob(".step-*"))
+
+
+def test_checkpoint_writer_replaces_same_step(tmp_path: Path):
+    """Test saving at the same step again replaces the checkpoint."""
+    model = Sequential(Linear(4, 2))
+
+    with CheckpointWriter(tmp_path) as writer:
+        _ = writer.save(5, model, extra={"name": "Boromir"})
+        _ = writer.save(5, model, extra={"name": "Faramir"})
+
+    assert list_checkpoints(tmp_path) == [tmp_path / "step-0000000005"]
+    assert read_manifest(tmp_path / "step-0000000005")["extra"]["name"] == "Faramir"
+
+
+def test_checkpoint_writer_removes_stale_temporary_dirs(tmp_path: Path):
+    """Test interrupted saves are cleaned up, and never listed."""
+    (tmp_path / ".step-0000000007.tmp").mkdir()
+    (tmp_path / ".step-0000000007.tmp" / "model.pt").write_text("Gollum")
+
+    assert latest_checkpoint(tmp_path) is None
+
+    writer = CheckpointWriter(tmp_path)
+    writer.close()
+    assert not list(tmp_path.iterdir())
+
+
+def _failing_save(*args, **kwargs):
+    """Stand in for ``torch.save`` when the disk is full."""
+    raise OSError("No space left in Orthanc.")
+
+
+def test_checkpoint_writer_reraises_write_errors(tmp_path: Path, monkeypatch):
+    """Test errors raised in the background thread are re-raised."""
+    model = Sequential(Linear(4, 2))
+    writer = CheckpointWriter(tmp_path)
+    monkeypatch.setattr(torch, "save", _failing_save)
+
+    _ = writer.save(1, model)
+    with pytest.raises(OSError, match="Orthanc"):
+        writer.wait()
+    writer.close()
+
+
+def test_checkpoint_writer_retries_failed_step(tmp_path: Path, monkeypatch):
+    """Test a failed save can be retried at the same step by the same writer."""
+    model = Sequential(Linear(4, 2))
+
+    with CheckpointWriter(tmp_path) as writer:
+        with monkeypatch.context() as patch:
+            patch.setattr(torch, "save", _failing_save)
+            _ = writer.save(1, model)
+            with pytest.raises(OSError):
+                writer.wait()
+        assert (tmp_path / ".step-0000000001.tmp").exists()
+
+        assert writer.save(1, model).result() == tmp_path / "step-0000000001"
+
+    assert list(tmp_path.iterdir()) == [tmp_path / "step-0000000001"]
+
+
+def test_checkpoint_writer_keeps_old_step_until_replaced(tmp_path: Path, monkeypatch):
+    """Test a crash while replacing a step leaves the old copy to restore."""
+    model = Sequential(Linear(4, 2))
+    with CheckpointWriter(tmp_path) as writer:
+        _ = writer.save(5, model, extra={"name": "Boromir"})
+
+    replace = os.replace
+
+    def _crashing_replace(src, dst):
+        """Crash when the new checkpoint is moved into place."""
+        if Path(src).name.endswith(".tmp"):
+            raise OSError("The beacons of Gondor are lit.")
+        replace(src, dst)
+
+    with CheckpointWriter(tmp_path) as writer:
+        with monkeypatch.context() as patch:
+            patch.setattr(os, "replace", _crashing_replace)
+            _ = writer.save(5, model, extra={"name": "Faramir"})
+            with pytest.raises(OSError):
+                writer.wait()
+    assert (tmp_path / ".step-0000000005.old").is_dir()
+
+    with CheckpointWriter(tmp_path):
+        pass
+    assert list(tmp_path.iterdir()) == [tmp_path / "step-0000000005"]
+    assert read_manifest(tmp_path / "step-0000000005")["extra"]["name"] == "Boromir"
+
+
+def test_checkpoint_writer_argument_checks(tmp_path: Path):
+    """Test the arguments of the writer and ``save`` are checked."""
+    with pytest.raises(TypeError):
+        _ = CheckpointWriter(str(tmp_path))
+    with pytest.raises(TypeError):
+        _ = CheckpointWriter(tmp_path, keep_last=1.0)
+    with pytest.raises(ValueError):
+        _ = CheckpointWriter(tmp_path, keep_last=0)
+
+    with CheckpointWriter(tmp_path) as writer:
+        with pytest.raises(TypeError):
+            _ = writer.save(1.0, _model())
+        with pytest.raises(ValueError):
+            _ = writer.save(-1, _model())
+        with pytest.raises(TypeError):
+            _ = writer.save(1, _model().state_dict())
+        with pytest.raises(TypeError):
+            _ = writer.save(1, _model(), optimiser="Shadowfax")
+        with pytest.raises(TypeError):
+            _ = writer.save(1, _model(), extra={"ring": object()})
+
+
+def test_load_sharded_checkpoint_argument_checks(tmp_path: Path):
+    """Test the arguments of ``load_sharded_checkpoint`` are checked."""
+    with CheckpointWriter(tmp_path) as writer:
+        checkpoint_dir = writer.save(1, _model()).result()
+
+    with pytest.raises(TypeError):
+        _ = load_sharded_checkpoint(_model(), str(checkpoint_dir))
+    with pytest.raises(TypeError):
+        _ = load_sharded_checkpoint(_model(), checkpoint_dir, num_threads=2.0)
+    with pytest.raises(ValueError):
+        _ = load_sharded_checkpoint(_model(), checkpoint_dir, num_threads=0)
+    with pytest.raises(RuntimeError):
+        _ = load_sharded_checkpoint(
+            _model(),
+            checkpoint_dir,
+            optimiser=Adam(_model().parameters()),
+        )
+
+
+def test_meta_model_allocates_nothing():
+    """Test the model's parameters and saved buffers are on the meta device."""
+    model = meta_model(
+        ConvNet2d,
+        out_feats=2,
+        encoder_style="resnet18",
+        pretrained=False,
+        input_norm_kwargs={"mean": (0.5,), "std": (0.25,)},
+    )
+
+    assert all(param.is_meta for param in model.parameters())
+    assert all(buffer.is_meta for buffer in model.buffers())
+
+
+def test_materialise_model_rebuilds_unsaved_buffers():
+    """Test the input normalisation's buffers are rebuilt, not left on meta."""
+    kwargs = {"in_feats": 4, "out_feats": 2, "input_norm_kwargs": {"std": (0.5,)}}
+    source = FCNet(**kwargs).double()
+    model = materialise_model(meta_model(FCNet, **kwargs).double(), source.state_dict())
+
+    assert model.input_norm.mult.device == torch.device("cpu")
+    assert model.input_norm.mult.dtype == torch.float64
+    assert torch.allclose(model.input_norm.mult, source.input_norm.mult)
+    assert torch.allclose(model.input_norm.shift, source.input_norm.shift)
+
+
+def test_meta_model_skips_pretrained_weights(monkeypatch):
+    """Test no pretrained weights are requested on the meta device."""
+    # pylint: disable=protected-access
+    requested = []
+
+    def _resnet18(weights=None):
+        requested.append(weights)
+        return torchvision_resnet18(weights=None)
+
+    torchvision_resnet18 = backbones._encoder_options["resnet18"]
+    monkeypatch.setitem(backbones._encoder_options, "resnet18", _resnet18)
+
+    _ = meta_model(ConvNet2d, out_feats=2, encoder_style="resnet18", pretrained=True)
+    assert requested == [None]
+
+
+def test_materialise_model_from_file(tmp_path: Path):
+    """Test a meta model is given the weights in a checkpoint file."""
+    source = UNet(in_chans=3, out_chans=2, features_start=8, num_layers=3)
+    path = _save({"model": source.state_dict()}, tmp_path / "Gondolin.pt")
+
+    model = meta_model(UNet, in_chans=3, out_chans=2, features_start=8, num_layers=3)
+    model = materialise_model(model, path, state_key="model")
+
+    for key, value in source.state_dict().items():
+        assert (model.state_dict()[key] == value).all(), key
+    assert all(param.requires_grad for param in model.parameters())
+
+    batch = rand(2, 3, 16, 16)
+    source.eval()
+    model.eval()
+    assert (model(batch) == source(batch)).all()
+
+
+def test_materialise_model_from_state_dict_and_directory(tmp_path: Path):
+    """Test meta models are materialised from state dicts and directories."""
+    source = ConvNet2d(
+        out_feats=2,
+        encoder_style="resnet18",
+        pretrained=False,
+        input_norm_kwargs={"mean": (0.5,), "std": (0.25,)},
+    )
+    with CheckpointWriter(tmp_path) as writer:
+        checkpoint_dir = writer.save(1, source).result()
+
+    for checkpoint in [source.state_dict(), checkpoint_dir]:
+        model = meta_model(
+            ConvNet2d,
+            out_feats=2,
+            encoder_style="resnet18",
+            input_norm_kwargs={"mean": (0.5,), "std": (0.25,)},
+        )
+        model = materialise_model(model, checkpoint, device="cpu")
+
+        batch = rand(2, 3, 32, 32)
+        source.eval()
+        model.eval()
+        assert (model(batch) == source(batch)).all()
+
+
+def test_materialise_model_prefix_map(tmp_path: Path):
+    """Test the checkpoint's key prefixes are remapped."""
+    state = {f"module.{key}": value for key, value in _model().state_dict().items()}
+    path = _save(state, tmp_path / "Nargothrond.pt")
+
+    model = materialise_model(meta_model(_model), path, prefix_map={"module.": ""})
+    assert not any(param.is_meta for param in model.parameters())
+
+
+def test_materialise_model_mismatches():
+    """Test mismatched keys and shapes raise a ``RuntimeError``."""
+    state = _model().state_dict()
+    _ = state.pop("2.bias")
+
+    with pytest.raises(RuntimeError):
+        _ = materialise_model(meta_model(_model), state)
+    with pytest.raises(RuntimeError):
+        _ = materialise_model(meta_model(_model, in_channels=1), _model().state_dict())
+
+
+def test_materialise_model_argument_types(tmp_path: Path):
+    """Test the types of the arguments are checked."""
+    state = _model().state_dict()
+
+    with pytest.raises(TypeError):
+        _ = materialise_model(state, state)
+    with pytest.raises(TypeError):
+        _ = materialise_model(meta_model(_model), str(tmp_path))
+    with pytest.raises(TypeError):
+        _ = materialise_model(meta_model(_model), state, prefix_map=("module.", ""))
+    with pytest.raises(TypeError):
+        _ = materialise_model(meta_model(_model), state, num_threads=1.0)
+    with pytest.raises(ValueError):
+        _ = materialise_model(meta_model(_model), state, num_threads=0)
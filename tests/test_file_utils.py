@@ -1,11 +1,17 @@
 """Tests for ``torch_tools.file_utils``."""
+import os
+import sqlite3
+import tarfile
 from pathlib import Path
+from typing import List
 from shutil import rmtree, make_archive
-from zipfile import BadZipFile
+from zipfile import BadZipFile, ZipFile
 
 import pytest
 
 from torch_tools.file_utils import traverse_directory_tree, ls_zipfile
+from torch_tools.file_utils import walk_directory_tree, ls_tarfile
+from torch_tools.file_utils import traverse_directory_shard
 
 _parent_dir = Path(".test-paths/").resolve()
 _base_path = Path(_parent_dir, "Meriadoc/Peregrin/Samwise/Frodo/").resolve()
@@ -167,3 +173,295 @@ def test_ls_zipfile_return_values():
 
     for exp, ret in zip(expected, returned):
         assert exp == ret
+
+
+def test_walk_directory_tree_is_lazy():
+    """Test ``walk_directory_tree`` yields paths rather than listing them."""
+    walker = walk_directory_tree(_parent_dir)
+
+    assert not isinstance(walker, list)
+    assert next(walker) in _paths
+
+
+def test_walk_directory_tree_argument_checking():
+    """Test the arguments are checked before the walk starts."""
+    with pytest.raises(TypeError):
+        walk_directory_tree(str(_parent_dir))
+    with pytest.raises(FileNotFoundError):
+        walk_directory_tree(Path("Minas", "Morgul/"))
+    with pytest.raises(TypeError):
+        walk_directory_tree(_parent_dir, suffixes=".txt")
+    with pytest.raises(TypeError):
+        walk_directory_tree(_parent_dir, pattern=1)
+    with pytest.raises(TypeError):
+        walk_directory_tree(_parent_dir, sort=1)
+    with pytest.raises(ValueError):
+        walk_directory_tree(_parent_dir, chunk_size=0)
+
+
+def test_walk_directory_tree_finds_all_files():
+    """Test the walk finds the same files as ``traverse_directory_tree``."""
+    assert sorted(walk_directory_tree(_parent_dir)) == sorted(_paths)
+
+    members = sorted(map(lambda x: x.name, walk_directory_tree(_zip_path)))
+    assert members == sorted(map(lambda x: x.name, _paths))
+
+
+def test_walk_directory_tree_filters():
+    """Test the suffix and pattern filters, including on zip members."""
+    assert not list(walk_directory_tree(_parent_dir, suffixes=[".png"]))
+
+    found = list(walk_directory_tree(_parent_dir, pattern="G*"))
+    assert sorted(map(lambda x: x.name, found)) == ["Gandalf.txt", "Gimli.txt"]
+
+    found = list(walk_directory_tree(_zip_path, suffixes=[".txt"], pattern="L*"))
+    assert list(map(lambda x: x.name, found)) == ["Legolas.txt"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 1000])
+def test_walk_directory_tree_sorted(chunk_size: int):
+    """Test the sorted walk, with and without spilling to disk."""
+    walked = list(walk_directory_tree(_parent_dir, sort=True, chunk_size=chunk_size))
+    assert walked == _paths
+
+
+def _make_undecodable_names(root: Path) -> List[Path]:
+    """Make files whose names are not valid UTF-8."""
+    root.mkdir(parents=True)
+    names = [b"Sm\xe9agol.txt", b"D\xe9agol.txt", b"Gollum.txt"]
+    for name in names:
+        with open(os.path.join(os.fsencode(root), name), "wb"):
+            pass
+    return [root / os.fsdecode(name) for name in names]
+
+
+def test_walk_directory_tree_sorted_undecodable_names(tmp_path: Path):
+    """Test names which aren't valid UTF-8 survive spilling to disk."""
+    files = _make_undecodable_names(tmp_path / "Misty Mountains")
+
+    walked = list(walk_directory_tree(tmp_path, sort=True, chunk_size=1))
+    assert walked == sorted(files, key=lambda x: x.name)
+    assert all(map(lambda x: x.exists(), walked))
+
+
+def test_traverse_directory_tree_index_undecodable_names(tmp_path: Path):
+    """Test names which aren't valid UTF-8 survive the listing index."""
+    files = _make_undecodable_names(tmp_path / "Misty Mountains")
+    with tarfile.open(tmp_path / "Misty Mountains" / "Moria.tar", "w") as archive:
+        archive.addfile(tarfile.TarInfo(os.fsdecode(b"Dur\xefn.txt")))
+    files.append(tmp_path / "Misty Mountains" / "Moria.tar" / "Dur\udcefn.txt")
+
+    index = tmp_path / "listing.sqlite"
+    for _ in range(2):
+        found = traverse_directory_tree(tmp_path / "Misty Mountains", index_path=index)
+        assert sorted(found) == sorted(files)
+
+
+@pytest.mark.parametrize("num_threads", [2, 4])
+def test_walk_directory_tree_parallel(num_threads: int):
+    """Test the threaded walk finds the same files, in a repeatable order."""
+    first = list(walk_directory_tree(_parent_dir, num_threads=num_threads))
+    second = list(walk_directory_tree(_parent_dir, num_threads=num_threads))
+
+    assert first == second
+    assert sorted(first) == sorted(_paths)
+
+    # Breadth first, so shallower files should come first
+    assert list(map(lambda x: len(x.parts), first)) == sorted(
+        map(lambda x: len(x.parts), first)
+    )
+
+    members = list(walk_directory_tree(_zip_path, num_threads=num_threads))
+    assert sorted(map(lambda x: x.name, members)) == [x.name for x in _paths]
+
+
+def test_traverse_directory_tree_parallel():
+    """Test the threaded traversal returns the same list."""
+    assert traverse_directory_tree(_parent_dir, num_threads=3) == _paths
+
+    with pytest.raises(TypeError):
+        traverse_directory_tree(_parent_dir, num_threads=2.0)
+    with pytest.raises(ValueError):
+        traverse_directory_tree(_parent_dir, num_threads=0)
+
+
+def _make_old_tree(root: Path) -> List[Path]:
+    """Make a small tree, with a zip file, whose timestamps are in the past."""
+    (root / "Shire" / "Bag End").mkdir(parents=True)
+    files = [root / "Shire" / "Bilbo.txt", root / "Shire" / "Bag End" / "Frodo.txt"]
+    _ = list(map(lambda x: x.touch(), files))
+
+    with ZipFile(root / "Shire" / "Mathom.zip", "w") as archive:
+        archive.writestr("Mithril.txt", "")
+
+    for path in [root, *root.rglob("*")]:
+        os.utime(path, ns=(10**18, 10**18))
+
+    return sorted(files + [root / "Shire" / "Mathom.zip" / "Mithril.txt"])
+
+
+def test_walk_directory_tree_with_index(tmp_path: Path, monkeypatch):
+    """Test the index returns the same files, and only relists changes."""
+    root, index = tmp_path / "Middle Earth", tmp_path / "index.sqlite"
+    expected = _make_old_tree(root)
+
+    assert sorted(walk_directory_tree(root, index_path=index)) == expected
+    assert index.exists()
+
+    listed: List[str] = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        listed.append(str(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+
+    # Nothing has changed, so nothing should be relisted
+    assert sorted(walk_directory_tree(root, index_path=index)) == expected
+    assert not listed
+
+    # Adding a file should only relist its directory
+    (root / "Shire" / "Bag End" / "Sam.txt").touch()
+    found = traverse_directory_tree(root, index_path=index)
+    assert sorted(found) == sorted(expected + [root / "Shire/Bag End/Sam.txt"])
+    assert listed == [str(root / "Shire" / "Bag End")]
+
+
+def test_walk_directory_tree_index_refreshes_zips_and_removals(tmp_path: Path):
+    """Test rewritten zips are reopened, and removed directories forgotten."""
+    root, index = tmp_path / "Middle Earth", tmp_path / "index.sqlite"
+    _ = _make_old_tree(root)
+    _ = list(walk_directory_tree(root, index_path=index))
+
+    with ZipFile(root / "Shire" / "Mathom.zip", "w") as archive:
+        archive.writestr("Mithril.txt", "")
+        archive.writestr("Sting.txt", "")
+
+    rmtree(root / "Shire" / "Bag End")
+
+    names = sorted(map(lambda x: x.name, walk_directory_tree(root, index_path=index)))
+    assert names == ["Bilbo.txt", "Mithril.txt", "Sting.txt"]
+
+    with sqlite3.connect(index) as conn:
+        dirs = [path for (path,) in conn.execute("SELECT path FROM dirs")]
+    assert str(root / "Shire" / "Bag End") not in dirs
+
+
+def test_walk_directory_tree_index_argument_checking(tmp_path: Path):
+    """Test the ``index_path`` argument is checked."""
+    with pytest.raises(TypeError):
+        walk_directory_tree(_parent_dir, index_path=str(tmp_path / "index"))
+    with pytest.raises(ValueError):
+        walk_directory_tree(_parent_dir, index_path=tmp_path, num_threads=2)
+
+
+def test_walk_directory_tree_lists_tar_members(tmp_path: Path):
+    """Test tar archives are listed in place, and their indexes skipped."""
+    (tmp_path / "Rohan").mkdir()
+    (tmp_path / "Rohan" / "Theoden.txt").touch()
+    with tarfile.open(tmp_path / "Rohan" / "Edoras.tar", "w") as archive:
+        archive.addfile(tarfile.TarInfo("Eomer.txt"))
+        archive.addfile(tarfile.TarInfo("Eowyn.txt"))
+
+    expected = [
+        tmp_path / "Rohan" / "Edoras.tar" / "Eomer.txt",
+        tmp_path / "Rohan" / "Edoras.tar" / "Eowyn.txt",
+        tmp_path / "Rohan" / "Theoden.txt",
+    ]
+
+    # The second time round, the tar's index exists, and should be skipped
+    for _ in range(2):
+        assert traverse_directory_tree(tmp_path / "Rohan") == expected
+        assert traverse_directory_tree(tmp_path / "Rohan", num_threads=2) == expected
+
+    index = tmp_path / "listing.sqlite"
+    assert traverse_directory_tree(tmp_path / "Rohan", index_path=index) == expected
+    assert traverse_directory_tree(tmp_path / "Rohan", index_path=index) == expected
+
+    assert ls_tarfile(tmp_path / "Rohan" / "Edoras.tar") == expected[:2]
+    with pytest.raises(TypeError):
+        ls_tarfile(str(tmp_path / "Rohan" / "Edoras.tar"))
+
+
+def _make_kingdoms(root: Path) -> List[Path]:
+    """Make a tree of files spread over nested directories."""
+    files = [root / "Arnor.txt"]
+    for kingdom in ["Gondor", "Rohan", "Mordor", "Lindon", "Eriador"]:
+        for town in range(3):
+            (root / kingdom / f"town_{town}").mkdir(parents=True)
+            for house in range(town + 1):
+                files.append(root / kingdom / f"town_{town}" / f"{house}.txt")
+    _ = list(map(lambda x: x.touch(), files))
+    return files
+
+
+@pytest.mark.parametrize("world_size", [1, 3, 50])
+def test_traverse_directory_shard_partitions(tmp_path: Path, world_size: int):
+    """Test the shards are disjoint and cover the whole tree."""
+    files = _make_kingdoms(tmp_path / "Middle Earth")
+
+    shards = [
+        traverse_directory_shard(tmp_path / "Middle Earth", rank, world_size)
+        for rank in range(world_size)
+    ]
+
+    assert sorted(sum(shards, [])) == sorted(files)
+    assert all(map(lambda x: x == sorted(x, key=lambda y: y.name), shards))
+
+
+def test_traverse_directory_shard_with_manifest(tmp_path: Path):
+    """Test the manifest-based shards are balanced and cover the tree."""
+    files = _make_kingdoms(tmp_path / "Middle Earth")
+    manifest = tmp_path / "manifest"
+
+    shards = [
+        traverse_directory_shard(tmp_path / "Middle Earth", rank, 4, manifest)
+        for rank in range(4)
+    ]
+
+    assert sorted(sum(shards, [])) == sorted(files)
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
+
+    # Ranks other than zero should wait for the manifest, then give up
+    with pytest.raises(TimeoutError):
+        traverse_directory_shard(
+            tmp_path / "Middle Earth",
+            rank=1,
+            world_size=4,
+            manifest_path=tmp_path / "missing",
+            timeout=0.2,
+        )
+
+
+def test_traverse_directory_shard_manifest_undecodable_names(tmp_path: Path):
+    """Test names which aren't valid UTF-8 survive the manifest."""
+    files = _make_undecodable_names(tmp_path / "Misty Mountains")
+
+    shards = [
+        traverse_directory_shard(
+            tmp_path / "Misty Mountains", rank, 2, tmp_path / "manifest"
+        )
+        for rank in range(2)
+    ]
+    assert sorted(sum(shards, [])) == sorted(files)
+
+
+def test_traverse_directory_shard_arguments(tmp_path: Path, monkeypatch):
+    """Test the rank and world size arguments, and their defaults."""
+    files = _make_kingdoms(tmp_path / "Middle Earth")
+
+    monkeypatch.setenv("RANK", "1")
+    monkeypatch.setenv("WORLD_SIZE", "2")
+    from_env = traverse_directory_shard(tmp_path / "Middle Earth")
+    assert from_env == traverse_directory_shard(tmp_path / "Middle Earth", 1, 2)
+    assert 0 < len(from_env) < len(files)
+
+    with pytest.raises(ValueError):
+        traverse_directory_shard(tmp_path, rank=2, world_size=2)
+    with pytest.raises(ValueError):
+        traverse_directory_shard(tmp_path, rank=0, world_size=0)
+    with pytest.raises(TypeError):
+        traverse_directory_shard(tmp_path, rank=1.0, world_size=2)
+    with pytest.raises(TypeError):
+        traverse_directory_shard(tmp_path, manifest_path=str(tmp_path / "Gollum"))
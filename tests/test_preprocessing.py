@@ -0,0 +1,325 @@
+"""Tests for ``torch_tools.preprocessing``."""
+import os
+import sqlite3
+import tarfile
+from contextlib import closing
+from types import SimpleNamespace
+from pathlib import Path
+from typing import List, Tuple
+from zipfile import ZipFile
+
+import pytest
+
+from torch import Tensor, full, float32  # pylint: disable=no-name-in-module
+from torchvision.transforms import Compose  # type: ignore
+
+from torch_tools import preprocessing
+from torch_tools.preprocessing import PreprocessingManifest, ManifestChanges
+from torch_tools.preprocessing import convert_directory_tree, TensorStore
+
+
+def _make_dataset(root: Path) -> List[Path]:
+    """Make a small dataset, with a zip file, with old timestamps."""
+    (root / "Fellowship").mkdir(parents=True)
+    files = [root / "Fellowship" / f"{name}.txt" for name in ["Frodo", "Sam"]]
+    _ = list(map(lambda x: x.write_text(x.stem), files))
+
+    with ZipFile(root / "Towers.zip", "w") as archive:
+        archive.writestr("Merry.txt", "Merry")
+
+    for path in [root, *root.rglob("*")]:
+        os.utime(path, ns=(10**18, 10**18))
+
+    return files + [root / "Towers.zip" / "Merry.txt"]
+
+
+class _Stores:
+    """Record calls to the ``process`` and ``remove`` callbacks."""
+
+    def __init__(self):
+        """Build ``_Stores``."""
+        self.processed: List[Path] = []
+        self.removed: List[Tuple[str, str]] = []
+
+    def process(self, path: Path) -> List[Tuple[str, str]]:
+        """Pretend to process ``path``."""
+        self.processed.append(path)
+        return [("cache", path.stem), ("shard", "0")]
+
+    def remove(self, store: str, key: str):
+        """Pretend to remove an artefact."""
+        self.removed.append((store, key))
+
+
+def test_manifest_first_update_processes_everything(tmp_path: Path):
+    """Test every file is processed, and recorded, the first time."""
+    files = _make_dataset(tmp_path / "Middle Earth")
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+    stores = _Stores()
+
+    changes = manifest.update(tmp_path / "Middle Earth", stores.process, stores.remove)
+
+    assert isinstance(changes, ManifestChanges)
+    assert sorted(changes.added) == sorted(files)
+    assert not changes.changed and not changes.deleted
+    assert sorted(stores.processed) == sorted(files)
+    assert not stores.removed
+    assert manifest.artefacts(files[0]) == [("cache", "Frodo"), ("shard", "0")]
+
+
+def test_manifest_rebuild_only_touches_changes(tmp_path: Path):
+    """Test a rebuild only processes new and changed files."""
+    root = tmp_path / "Middle Earth"
+    files = _make_dataset(root)
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+    manifest.update(root, _Stores().process)
+
+    # Touching a file without changing it should not count as a change
+    os.utime(files[0])
+    (root / "Fellowship" / "Sam.txt").write_text("Samwise")
+    (root / "Fellowship" / "Pippin.txt").write_text("Pippin")
+    (root / "Fellowship" / "Frodo.txt").rename(root / "Frodo.txt")
+
+    stores = _Stores()
+    changes = manifest.update(root, stores.process, stores.remove)
+
+    assert changes.added == [root / "Fellowship" / "Pippin.txt", root / "Frodo.txt"]
+    assert changes.changed == [root / "Fellowship" / "Sam.txt"]
+    assert changes.deleted == [root / "Fellowship" / "Frodo.txt"]
+    assert sorted(stores.processed) == sorted(changes.added + changes.changed)
+    assert sorted(stores.removed) == sorted(
+        [("cache", "Frodo"), ("shard", "0"), ("cache", "Sam"), ("shard", "0")]
+    )
+    assert not manifest.artefacts(root / "Fellowship" / "Frodo.txt")
+
+    # Nothing has changed now
+    assert manifest.changes(root) == ManifestChanges([], [], [])
+
+
+def test_manifest_tracks_archive_members(tmp_path: Path):
+    """Test members of zip files are checked by their contents."""
+    root = tmp_path / "Middle Earth"
+    _ = _make_dataset(root)
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+    manifest.update(root, _Stores().process)
+
+    with ZipFile(root / "Towers.zip", "w") as archive:
+        archive.writestr("Merry.txt", "Meriadoc")
+        archive.writestr("Treebeard.txt", "Hoom")
+
+    changes = manifest.changes(root)
+    assert changes.added == [root / "Towers.zip" / "Treebeard.txt"]
+    assert changes.changed == [root / "Towers.zip" / "Merry.txt"]
+
+
+def test_manifest_reads_each_tar_archive_once(tmp_path: Path, monkeypatch):
+    """Test the members of a compressed tar archive are hashed in one pass.
+
+    Only the manifest's own reads of the archive are counted, not the
+    listing's.
+
+    """
+    root = tmp_path / "Middle Earth"
+    root.mkdir()
+    for name in ["Gimli", "Gloin", "Balin"]:
+        (tmp_path / f"{name}.txt").write_text(name)
+    with tarfile.open(root / "Erebor.tar.gz", "w:gz") as archive:
+        for name in ["Gimli", "Gloin", "Balin"]:
+            archive.add(tmp_path / f"{name}.txt", arcname=f"{name}.txt")
+
+    opened: List[Path] = []
+    open_tar = tarfile.open
+
+    def _open(name, *args, **kwargs):
+        opened.append(Path(name))
+        return open_tar(name, *args, **kwargs)
+
+    monkeypatch.setattr(preprocessing, "tarfile", SimpleNamespace(open=_open))
+
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+    changes = manifest.update(root, _Stores().process, commit_every=2)
+
+    assert len(changes.added) == 3
+    assert opened == [root / "Erebor.tar.gz"]
+    assert manifest.artefacts(root / "Erebor.tar.gz" / "Balin.txt") == [
+        ("cache", "Balin"),
+        ("shard", "0"),
+    ]
+    assert manifest.changes(root) == ManifestChanges([], [], [])
+
+
+def test_manifest_record_many(tmp_path: Path):
+    """Test several files are recorded in one go."""
+    files = _make_dataset(tmp_path / "Middle Earth")
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+
+    manifest.record_many((path, [("cache", path.stem)]) for path in files)
+    manifest.record(files[0], [("shard", "1")])
+
+    assert manifest.artefacts(files[0]) == [("shard", "1")]
+    assert manifest.artefacts(files[-1]) == [("cache", "Merry")]
+    assert manifest.changes(tmp_path / "Middle Earth") == ManifestChanges([], [], [])
+
+
+@pytest.mark.parametrize("commit_every", [1, 2, 1000])
+def test_manifest_update_commit_every(tmp_path: Path, commit_every: int):
+    """Test every file is recorded whatever the transaction size."""
+    files = _make_dataset(tmp_path / "Middle Earth")
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+
+    stores = _Stores()
+    _ = manifest.update(
+        tmp_path / "Middle Earth", stores.process, commit_every=commit_every
+    )
+
+    assert sorted(stores.processed) == sorted(files)
+    assert all(map(manifest.artefacts, files))
+
+    with pytest.raises(TypeError):
+        _ = manifest.update(tmp_path / "Middle Earth", stores.process, commit_every=1.0)
+    with pytest.raises(ValueError):
+        _ = manifest.update(tmp_path / "Middle Earth", stores.process, commit_every=0)
+
+
+def test_manifest_undecodable_names(tmp_path: Path):
+    """Test names which aren't valid UTF-8 are recorded like any other."""
+    root = tmp_path / "Middle Earth"
+    files = _make_dataset(root)
+    with open(os.path.join(os.fsencode(root), b"Sm\xe9agol.txt"), "wb") as file:
+        file.write(b"My precious")
+    files.append(root / os.fsdecode(b"Sm\xe9agol.txt"))
+
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+    stores = _Stores()
+    changes = manifest.update(root, stores.process, stores.remove)
+
+    assert sorted(changes.added) == sorted(files)
+    assert manifest.artefacts(files[-1]) == [("cache", files[-1].stem), ("shard", "0")]
+    assert manifest.changes(root) == ManifestChanges([], [], [])
+
+    files[-1].unlink()
+    _ = manifest.update(root, stores.process, stores.remove)
+    assert stores.removed == [("cache", files[-1].stem), ("shard", "0")]
+
+
+def test_manifest_reads_text_paths(tmp_path: Path):
+    """Test manifests which hold paths as text are still understood."""
+    root = tmp_path / "Middle Earth"
+    files = _make_dataset(root)
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+    manifest.update(root, _Stores().process)
+
+    with closing(sqlite3.connect(tmp_path / "manifest.sqlite")) as conn:
+        conn.execute("UPDATE files SET path = CAST(path AS TEXT)")
+        conn.execute(
+            "UPDATE artefacts SET path = CAST(path AS TEXT), key = CAST(key AS TEXT)"
+        )
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+
+    manifest = PreprocessingManifest(tmp_path / "manifest.sqlite")
+    assert manifest.changes(root) == ManifestChanges([], [], [])
+    assert manifest.artefacts(files[0]) == [("cache", "Frodo"), ("shard", "0")]
+
+
+def test_manifest_argument_types(tmp_path: Path):
+    """Test the manifest path must be a ``Path``."""
+    with pytest.raises(TypeError):
+        PreprocessingManifest(str(tmp_path / "manifest.sqlite"))
+
+
+def _load_number(path: Path) -> Tensor:
+    """Load the number in the file at ``path`` into a small tensor."""
+    return full((2, 3), float(path.read_text()))
+
+
+def _make_numbers(root: Path, count: int) -> List[Path]:
+    """Write ``count`` files, each holding its own index."""
+    (root / "Numbers").mkdir(parents=True)
+    files = [root / "Numbers" / f"{idx:03d}.txt" for idx in range(count)]
+    _ = list(map(lambda x: x[1].write_text(str(x[0])), enumerate(files)))
+    return files
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_convert_directory_tree(tmp_path: Path, num_workers: int):
+    """Test the files are converted into a memory-mapped store."""
+    files = _make_numbers(tmp_path / "Shire", 20)
+
+    report = convert_directory_tree(
+        tmp_path / "Shire",
+        tmp_path / "store",
+        Compose([_load_number]),
+        num_workers=num_workers,
+        chunk_size=3,
+    )
+
+    assert report["converted"] == 20 and report["skipped"] == 0
+    assert report["files_per_sec"] > 0
+
+    store = TensorStore(tmp_path / "store")
+    assert len(store) == 20 and store.complete
+    assert store.sources == files
+    assert store.shape == (2, 3) and store.dtype == float32
+    for idx in range(20):
+        assert (store[idx] == idx).all()
+
+
+def test_convert_directory_tree_undecodable_names(tmp_path: Path):
+    """Test names which aren't valid UTF-8 survive the store's source list."""
+    files = _make_numbers(tmp_path / "Shire", 2)
+    with open(os.path.join(os.fsencode(files[0].parent), b"\xe9.txt"), "wb") as file:
+        file.write(b"2")
+    files.append(files[0].parent / os.fsdecode(b"\xe9.txt"))
+
+    _ = convert_directory_tree(
+        tmp_path / "Shire", tmp_path / "store", Compose([_load_number]), 0
+    )
+
+    store = TensorStore(tmp_path / "store")
+    assert store.complete and store.sources == files
+    assert (store[2] == 2).all()
+
+
+def test_convert_directory_tree_resumes(tmp_path: Path):
+    """Test a conversion picks up where it stopped."""
+    _ = _make_numbers(tmp_path / "Shire", 10)
+    tfms = Compose([_load_number])
+    _ = convert_directory_tree(tmp_path / "Shire", tmp_path / "store", tfms, 0)
+
+    # Pretend the conversion stopped before finishing the last four files
+    store = TensorStore(tmp_path / "store")
+    store.done[6:] = 0
+    store[8].fill_(-1.0)
+
+    report = convert_directory_tree(tmp_path / "Shire", tmp_path / "store", tfms, 0)
+
+    assert report["converted"] == 4 and report["skipped"] == 6
+    assert TensorStore(tmp_path / "store").complete
+    assert (TensorStore(tmp_path / "store")[8] == 8).all()
+
+
+def test_convert_directory_tree_checks(tmp_path: Path):
+    """Test the arguments and the transforms' outputs are checked."""
+    _ = _make_numbers(tmp_path / "Shire", 4)
+    (tmp_path / "Shire" / "Numbers" / "999.txt").write_text("1.0\n2.0")
+
+    def bad_shape(path: Path) -> Tensor:
+        return _load_number(path)[:1] if "999" in path.name else _load_number(path)
+
+    with pytest.raises(ValueError):
+        convert_directory_tree(
+            tmp_path / "Shire", tmp_path / "store", Compose([bad_shape]), 0
+        )
+    with pytest.raises(TypeError):
+        convert_directory_tree(
+            tmp_path / "Shire", tmp_path / "other", Compose([str]), 0
+        )
+    with pytest.raises(TypeError):
+        convert_directory_tree(tmp_path / "Shire", "store", Compose([str]))  # type: ignore
+    with pytest.raises(TypeError):
+        convert_directory_tree(tmp_path / "Shire", tmp_path / "x", [_load_number])
+    with pytest.raises(ValueError):
+        convert_directory_tree(
+            tmp_path / "Shire", tmp_path / "x", Compose([_load_number]), -1
+        )
@@ -1,13 +1,30 @@
 """Tests for functions in ``torch_tools.torch_utils``."""
 import pytest
 
-from torch import randint, rand, full, zeros, ones  # pylint: disable=no-name-in-module
+from torch import (  # pylint: disable=no-name-in-module
+    randint,
+    rand,
+    full,
+    zeros,
+    ones,
+    arange,
+    bool as torch_bool,
+    uint8,
+    float16,
+    int8,
+)  # pylint: disable=no-name-in-module
 
 
 from torch_tools.torch_utils import (
     target_from_mask_img,
+    target_from_mask_img_batch,
+    index_map_from_mask_img,
     patchify_img_batch,
+    unpatchify_img_batch,
     img_batch_dims_power_of_2,
+    patch_geometry,
+    extract_overlapping_patches,
+    blend_overlapping_patches,
 )
 
 # pylint: disable=redefined-outer-name
@@ -190,6 +207,103 @@ def test_target_from_mask_img_return_values():
         assert (target.argmax(dim=0) == mask_img).all()
 
 
+@pytest.mark.parametrize("dtype", [torch_bool, uint8, float16])
+def test_target_from_mask_img_batch_return_values(dtype):
+    """Test the batched targets are one-hot, channel-first and compact."""
+    mask_batch = randint(7, (4, 16, 8))
+    target = target_from_mask_img_batch(mask_batch, num_classes=7, dtype=dtype)
+
+    assert target.shape == (4, 7, 16, 8) and target.dtype == dtype
+    assert target.is_contiguous()
+    assert (target.sum(dim=1) == 1).all()
+    assert (target.float().argmax(dim=1) == mask_batch).all()
+
+    # It should agree with the single-image version
+    single = target_from_mask_img(mask_batch[2].float(), num_classes=7)
+    assert (single == target[2]).all()
+
+
+def test_target_from_mask_img_batch_ignore_index():
+    """Test ignored pixels get all-zero target vectors."""
+    mask_batch = randint(3, (2, 8, 8))
+    mask_batch[0, :2, :] = 255
+
+    target = target_from_mask_img_batch(mask_batch, 3, ignore_index=255)
+
+    assert (target[0, :, :2, :] == 0).all()
+    assert (target[0, :, 2:, :].sum(dim=0) == 1).all()
+    assert (target[1].argmax(dim=0) == mask_batch[1]).all()
+
+    # Other out-of-range values should still be caught
+    mask_batch[1, 0, 0] = 3
+    with pytest.raises(ValueError):
+        _ = target_from_mask_img_batch(mask_batch, 3, ignore_index=255)
+    with pytest.raises(ValueError):
+        _ = target_from_mask_img_batch(full((1, 2, 2), -1), 3, ignore_index=255)
+
+
+def test_target_from_mask_img_batch_argument_checks():
+    """Test the arguments of ``target_from_mask_img_batch`` are checked."""
+    _ = target_from_mask_img_batch(randint(2, (2, 8, 8)), num_classes=2)
+
+    with pytest.raises(TypeError):
+        _ = target_from_mask_img_batch(randint(2, (2, 8, 8)).numpy(), 2)
+    with pytest.raises(TypeError):
+        _ = target_from_mask_img_batch(randint(2, (2, 8, 8)), 2.0)
+    with pytest.raises(TypeError):
+        _ = target_from_mask_img_batch(randint(2, (2, 8, 8)), 2, ignore_index=1.5)
+    with pytest.raises(TypeError):
+        _ = target_from_mask_img_batch(randint(2, (2, 8, 8)), 2, dtype="uint8")
+    with pytest.raises(ValueError):
+        _ = target_from_mask_img_batch(randint(2, (2, 8, 8)), 1)
+    with pytest.raises(ValueError):
+        _ = target_from_mask_img_batch(randint(2, (2, 8, 8)), 2, ignore_index=1)
+    with pytest.raises(ValueError):
+        _ = target_from_mask_img_batch(rand(2, 8, 8), 2)
+    with pytest.raises(ValueError):
+        _ = target_from_mask_img_batch(full((2, 8, 8), 2), 2)
+    with pytest.raises(RuntimeError):
+        _ = target_from_mask_img_batch(randint(2, (8, 8)), 2)
+
+
+def test_index_map_from_mask_img_return_values():
+    """Test the index maps are compact and expand to the one-hot targets."""
+    mask_img = randint(5, (1, 16, 8)).float()
+    index_map = index_map_from_mask_img(mask_img, num_classes=5)
+
+    assert index_map.shape == (16, 8) and index_map.dtype == uint8
+    assert (index_map == mask_img[0]).all()
+
+    # Expanding a batch of them should match the one-hot targets
+    one_hot = target_from_mask_img_batch(index_map.unsqueeze(0), num_classes=5)
+    assert (one_hot[0] == target_from_mask_img(mask_img[0], num_classes=5)).all()
+
+    # Ignored pixels should keep their value
+    mask_img[0, 0, 0] = 255
+    index_map = index_map_from_mask_img(mask_img, 5, ignore_index=255)
+    assert index_map[0, 0] == 255 and (index_map[1:] == mask_img[0, 1:]).all()
+
+
+def test_index_map_from_mask_img_argument_checks():
+    """Test the arguments of ``index_map_from_mask_img`` are checked."""
+    _ = index_map_from_mask_img(randint(2, (8, 8)), num_classes=2)
+
+    with pytest.raises(TypeError):
+        _ = index_map_from_mask_img(randint(2, (8, 8)).numpy(), 2)
+    with pytest.raises(ValueError):
+        _ = index_map_from_mask_img(randint(2, (8, 8)), 2, dtype=float16)
+    with pytest.raises(ValueError):
+        _ = index_map_from_mask_img(randint(2, (8, 8)), 300)
+    with pytest.raises(ValueError):
+        _ = index_map_from_mask_img(randint(2, (8, 8)), 2, ignore_index=255, dtype=int8)
+    with pytest.raises(ValueError):
+        _ = index_map_from_mask_img(full((8, 8), 2), 2)
+    with pytest.raises(RuntimeError):
+        _ = index_map_from_mask_img(randint(2, (2, 8, 8)), 2)
+    with pytest.raises(RuntimeError):
+        _ = index_map_from_mask_img(randint(2, (8,)), 2)
+
+
 def test_patchify_img_batch_img_batch_arg_type():
     """Test the ``img_batch`` argument only accepts ``Tensor``."""
     # Should work with mini-batches of img-like
@@ -298,3 +412,138 @@ def test_patchify_img_batch_allows_gradient_flow():
     out.backward()
 
     assert (batch.grad == 123).all()
+
+
+def test_unpatchify_img_batch_inverts_patchify(create_fake_image_batch):
+    """Test ``unpatchify_img_batch`` reassembles the original images."""
+    batch = create_fake_image_batch
+
+    for patch_size in (1, 2, 4, 16, 64):
+        patches = patchify_img_batch(batch, patch_size)
+        assert (unpatchify_img_batch(patches, (64, 128)) == batch).all()
+
+
+def test_unpatchify_img_batch_allows_gradient_flow():
+    """Test gradient flow works through function."""
+    patches = ones(32, 3, 4, 4, requires_grad=True)
+    out = (unpatchify_img_batch(patches, (16, 8)) * 3).sum()
+    out.backward()
+
+    assert (patches.grad == 3).all()
+
+
+def test_unpatchify_img_batch_argument_checks():
+    """Test the arguments of ``unpatchify_img_batch`` are checked."""
+    # Should work with 4D, square, patches which fill the images
+    unpatchify_img_batch(rand(16, 3, 4, 4), (8, 8))
+
+    with pytest.raises(TypeError):
+        unpatchify_img_batch(rand(16, 3, 4, 4).numpy(), (8, 8))
+    with pytest.raises(RuntimeError):
+        unpatchify_img_batch(rand(16, 4, 4), (8, 8))
+    with pytest.raises(TypeError):
+        unpatchify_img_batch(rand(16, 3, 4, 4), [8, 8])
+    with pytest.raises(TypeError):
+        unpatchify_img_batch(rand(16, 3, 4, 4), (8.0, 8))
+    with pytest.raises(ValueError):
+        unpatchify_img_batch(rand(16, 3, 4, 2), (8, 8))
+    with pytest.raises(ValueError):
+        unpatchify_img_batch(rand(16, 3, 4, 4), (8, 10))
+    with pytest.raises(RuntimeError):
+        unpatchify_img_batch(rand(15, 3, 4, 4), (8, 8))
+
+
+def test_patch_geometry():
+    """Test the overlapping patches cover the images."""
+    assert patch_geometry((16, 16), 8, 4) == (3, 3, 0, 0)
+    assert patch_geometry((17, 16), 8, 4, padding=1) == (4, 4, 1, 2)
+    assert patch_geometry((5, 5), 8, 8) == (1, 1, 3, 3)
+
+    with pytest.raises(TypeError):
+        patch_geometry((16, 16), 8.0, 4)
+    with pytest.raises(ValueError):
+        patch_geometry((16, 16), 8, 0)
+    with pytest.raises(ValueError):
+        patch_geometry((16, 16), 8, 9)
+    with pytest.raises(ValueError):
+        patch_geometry((16, 16), 8, 4, padding=-1)
+
+
+def test_extract_overlapping_patches_values():
+    """Test the overlapping patches hold the right pixels."""
+    batch = arange(2 * 3 * 12 * 12).float().reshape(2, 3, 12, 12)
+
+    patches = extract_overlapping_patches(batch, 8, 4)
+    assert patches.shape == (8, 3, 8, 8)
+    assert (patches[0] == batch[0, :, :8, :8]).all()
+    assert (patches[1] == batch[0, :, :8, 4:]).all()
+    assert (patches[2] == batch[0, :, 4:, :8]).all()
+    assert (patches[7] == batch[1, :, 4:, 4:]).all()
+
+    # With non-overlapping patches, it should agree with patchify_img_batch
+    assert (
+        extract_overlapping_patches(batch, 4, 4) == patchify_img_batch(batch, 4)
+    ).all()
+
+    # The padding, and the padding at the end, should be zeros
+    patches = extract_overlapping_patches(batch, 8, 6, padding=1)
+    assert patches.shape == (2 * 4, 3, 8, 8)
+    assert (patches[0, :, 0, :] == 0).all() and (patches[0, :, :, 0] == 0).all()
+    assert (patches[0, :, 1:, 1:] == batch[0, :, :7, :7]).all()
+    assert (patches[3, :, -1, :] == 0).all() and (patches[3, :, :, -1] == 0).all()
+
+
+@pytest.mark.parametrize("weighting", ["uniform", "gaussian"])
+@pytest.mark.parametrize(
+    "patch_size, stride, padding", [(8, 4, 0), (16, 5, 3), (7, 7, 0), (64, 16, 0)]
+)
+def test_blend_overlapping_patches_inverts_extraction(
+    weighting, patch_size, stride, padding
+):
+    """Test blending the unchanged patches gives back the images."""
+    batch = rand(2, 3, 37, 50)
+    patches = extract_overlapping_patches(batch, patch_size, stride, padding)
+    blended = blend_overlapping_patches(
+        patches, (37, 50), patch_size, stride, padding, weighting
+    )
+
+    assert blended.shape == batch.shape
+    assert (blended - batch).abs().max() < 1e-5
+
+
+def test_blend_overlapping_patches_weighting():
+    """Test the Gaussian weighting favours the centres of the patches."""
+    patches = zeros(9, 1, 8, 8)
+    patches[4] = 1.0
+
+    uniform = blend_overlapping_patches(patches, (16, 16), 8, 4, weighting="uniform")
+    gaussian = blend_overlapping_patches(patches, (16, 16), 8, 4, weighting="gaussian")
+
+    # The centre of the image is in the middle of patch 4, and at the corner
+    # of four others.
+    assert uniform[0, 0, 8, 8] == pytest.approx(0.25)
+    assert gaussian[0, 0, 8, 8] > 0.9
+
+
+def test_blend_overlapping_patches_allows_gradient_flow():
+    """Test gradient flow works through the extraction and blending."""
+    batch = ones(2, 3, 16, 16, requires_grad=True)
+    patches = extract_overlapping_patches(batch, 8, 4)
+    out = (blend_overlapping_patches(patches, (16, 16), 8, 4) * 2).sum()
+    out.backward()
+
+    assert (batch.grad - 2).abs().max() < 1e-5
+
+
+def test_blend_overlapping_patches_argument_checks():
+    """Test the arguments of ``blend_overlapping_patches`` are checked."""
+    blend_overlapping_patches(rand(9, 3, 8, 8), (16, 16), 8, 4)
+
+    with pytest.raises(TypeError):
+        blend_overlapping_patches(rand(9, 3, 8, 8), [16, 16], 8, 4)
+    with pytest.raises(ValueError):
+        blend_overlapping_patches(rand(9, 3, 8, 8), (16, 16), 8, 4, weighting="Sauron")
+    with pytest.raises(RuntimeError):
+        blend_overlapping_patches(rand(8, 3, 8, 8), (16, 16), 8, 4)
+    with pytest.raises(RuntimeError):
+        blend_overlapping_patches(rand(9, 3, 8, 4), (16, 16), 8, 4)
@@ -0,0 +1,149 @@
+"""Tests for ``torch_tools.validation``."""
+import os
+import sys
+import subprocess
+from threading import Thread
+
+import pytest
+
+from torch import rand  # pylint: disable=no-name-in-module
+
+from torch_tools.models._blocks_2d import UNetUpBlock
+from torch_tools.torch_utils import target_from_mask_img_batch
+from torch_tools.validation import (
+    get_validation_level,
+    set_validation_level,
+    validation_level,
+    check_shapes,
+    check_values,
+)
+
+
+def test_validation_levels():
+    """Test which checks each level switches on."""
+    assert get_validation_level() == "full"
+    assert check_shapes() and check_values()
+
+    with validation_level("shapes"):
+        assert get_validation_level() == "shapes"
+        assert check_shapes() and not check_values()
+
+        with validation_level("off"):
+            assert not check_shapes() and not check_values()
+
+        assert get_validation_level() == "shapes"
+
+    assert get_validation_level() == "full"
+
+
+def test_validation_level_restored_after_errors():
+    """Test the context manager restores the level if there's an error."""
+    with pytest.raises(RuntimeError):
+        with validation_level("off"):
+            raise RuntimeError("You shall not pass!")
+    assert get_validation_level() == "full"
+
+
+def test_validation_level_is_per_thread():
+    """Test a ``validation_level`` block doesn't change other threads' level."""
+    seen = []
+    thread = Thread(target=lambda: seen.append(get_validation_level()))
+
+    with validation_level("off"):
+        thread.start()
+        thread.join()
+        assert get_validation_level() == "off"
+
+    assert seen == ["full"]
+
+
+def test_set_validation_level_sets_the_default():
+    """Test ``set_validation_level`` applies to every thread, outside blocks."""
+    seen = []
+    thread = Thread(target=lambda: seen.append(get_validation_level()))
+
+    set_validation_level("shapes")
+    try:
+        with validation_level("off"):
+            assert get_validation_level() == "off"
+        thread.start()
+        thread.join()
+        assert get_validation_level() == "shapes"
+    finally:
+        set_validation_level("full")
+
+    assert seen == ["shapes"]
+
+
+def test_validation_level_argument_checks():
+    """Test only the known levels are accepted."""
+    with pytest.raises(TypeError):
+        set_validation_level(0)
+    with pytest.raises(ValueError):
+        set_validation_level("Mordor")
+    with pytest.raises(ValueError):
+        with validation_level("Mordor"):
+            pass
+    assert get_validation_level() == "full"
+
+
+def test_validation_level_from_environment():
+    """Test the initial level is read from the environment variable."""
+    code = "from torch_tools.validation import get_validation_level as get;"
+    code += "print(get())"
+    env = {**os.environ, "TORCH_TOOLS_VALIDATION": "Off"}
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert result.stdout.strip() == "off"
+
+
+def test_validation_level_from_bad_environment():
+    """Test an unknown level in the environment warns and falls back."""
+    code = "from torch_tools.validation import get_validation_level as get;"
+    code += "print(get())"
+    env = {**os.environ, "TORCH_TOOLS_VALIDATION": "Mordor"}
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert result.stdout.strip() == "full"
+    assert "TORCH_TOOLS_VALIDATION" in result.stderr
+
+
+def test_unet_up_block_checks_skipped():
+    """Test ``UNetUpBlock`` skips its shape checks when validation is off."""
+    block = UNetUpBlock(8, 4, bilinear=False, lr_slope=0.1)
+    to_upsample, down_features = rand(1, 8, 8, 8), rand(1, 4, 8, 8)
+
+    with pytest.raises(RuntimeError):
+        _ = block(to_upsample, down_features)
+
+    with validation_level("off"):
+        assert block(to_upsample, down_features).shape == (1, 4, 8, 8)
+
+
+def test_mask_value_checks_skipped():
+    """Test the mask's values are only checked with full validation."""
+    mask_batch = rand(2, 4, 4)
+
+    with pytest.raises(ValueError):
+        _ = target_from_mask_img_batch(mask_batch, 2)
+
+    with validation_level("shapes"):
+        target = target_from_mask_img_batch(mask_batch, 2)
+        assert (target[:, 0] == 1).all()
+
+        # Ignored pixels should still be handled
+        mask_batch[0, 0, 0] = 255
+        target = target_from_mask_img_batch(mask_batch, 2, ignore_index=255)
+        assert (target[0, :, 0, 0] == 0).all()
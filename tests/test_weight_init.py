@@ -1,7 +1,8 @@
 """Tests for ``torch_tools.weight_init``"""
 import pytest
 
-from torch.nn import Conv2d, Linear
+from torch import allclose, device, eye  # pylint: disable=no-name-in-module
+from torch.nn import Conv2d, Linear, Sequential, BatchNorm2d, Flatten
 
 from torchvision.models import resnet18
 
@@ -47,3 +48,147 @@ def test_applying_normal_init_to_resnet():
     """Should work when applied to a resnet."""
     model = resnet18(weights=None)
     model.apply(lambda x: weight_init.normal_init(x, mean=0.0, std=0.25))
+
+
+def _small_model() -> Sequential:
+    """Build a small model with conv, norm and linear layers."""
+    return Sequential(
+        Conv2d(3, 8, 3),
+        BatchNorm2d(8),
+        Conv2d(8, 8, 3),
+        Flatten(),
+        Linear(8, 16),
+        Linear(16, 16),
+        Linear(16, 16),
+    )
+
+
+def test_init_model_schemes_and_rules():
+    """Test each parameter gets the scheme of its layer's rule."""
+    model = _small_model()
+    schemes = weight_init.init_model(
+        model,
+        "kaiming_normal",
+        rules={Linear: "orthogonal"},
+        bias="normal",
+        scheme_kwargs={"normal": {"std": 0.5}},
+    )
+
+    assert schemes["0.weight"] == "kaiming_normal"
+    assert schemes["1.weight"] == "ones" and schemes["1.bias"] == "normal"
+    assert schemes["4.weight"] == "orthogonal" and schemes["6.bias"] == "normal"
+    assert len(schemes) == len(list(model.parameters()))
+
+    assert (model[1].weight == 1).all()
+    for layer in model[5:]:
+        assert allclose(layer.weight @ layer.weight.T, eye(16), atol=1e-5)
+
+    # The grouped linear layers should still get different values
+    assert not (model[5].weight == model[6].weight).all()
+    assert not (model[5].bias == model[6].bias).all()
+
+
+@pytest.mark.parametrize(
+    "scheme, std",
+    [
+        ("kaiming_normal", (2.0 / (1.0 + 0.01**2) / 2304) ** 0.5),
+        ("kaiming_uniform", (2.0 / (1.0 + 0.01**2) / 2304) ** 0.5),
+        ("xavier_normal", (2.0 / (2304 + 2304)) ** 0.5),
+        ("xavier_uniform", (2.0 / (2304 + 2304)) ** 0.5),
+        ("normal", 0.02),
+    ],
+)
+def test_init_model_scheme_scales(scheme, std):
+    """Test the schemes give values with the right standard deviation."""
+    model = Sequential(*[Conv2d(256, 256, 3) for _ in range(4)])
+    weight_init.init_model(
+        model,
+        scheme,
+        scheme_kwargs={"kaiming_normal": {"a": 0.01}, "kaiming_uniform": {"a": 0.01}},
+    )
+
+    for layer in model:
+        assert abs(layer.weight.std().item() - std) < 0.02 * std
+        assert (layer.bias == 0).all()
+
+
+def test_init_model_seeded_by_name():
+    """Test seeded parameters only depend on the seed, name and shape."""
+    first, second = _small_model(), _small_model()
+    weight_init.init_model(first, "normal", seed=123)
+    weight_init.init_model(second, "normal", seed=123)
+
+    for param_1, param_2 in zip(first.parameters(), second.parameters()):
+        assert (param_1 == param_2).all()
+
+    # Adding layers shouldn't change the values of the existing ones
+    third = Sequential(*_small_model(), Linear(16, 2))
+    weight_init.init_model(third, "normal", seed=123)
+    assert (third[4].weight == first[4].weight).all()
+
+    weight_init.init_model(second, "normal", seed=321)
+    assert not (first[4].weight == second[4].weight).all()
+
+
+def test_init_model_options_only_apply_to_their_scheme():
+    """Test each scheme's options don't leak into the other schemes."""
+    model = Sequential(Linear(256, 256))
+    weight_init.init_model(
+        model,
+        "kaiming_normal",
+        bias="uniform",
+        scheme_kwargs={"kaiming_normal": {"a": 0.9}},
+    )
+
+    assert model[0].bias.min() < 0.9
+    assert (model[0].bias >= 0.0).all() and (model[0].bias < 1.0).all()
+
+
+def test_init_model_rejects_matrix_schemes_for_vectors():
+    """Test Kaiming, Xavier and orthogonal can't be used for 1-D params."""
+    for scheme in ("kaiming_normal", "xavier_uniform", "orthogonal"):
+        with pytest.raises(ValueError, match="two or more dimensions"):
+            weight_init.init_model(_small_model(), bias=scheme)
+        with pytest.raises(ValueError, match="'1.weight'"):
+            weight_init.init_model(_small_model(), rules={BatchNorm2d: scheme})
+
+
+def test_init_model_on_meta_device():
+    """Test meta parameters are rejected with a clear error."""
+    with device("meta"):
+        model = _small_model()
+
+    with pytest.raises(RuntimeError, match="meta device"):
+        weight_init.init_model(model, seed=123)
+
+
+def test_init_model_argument_checks():
+    """Test the arguments of ``init_model`` are checked."""
+    with pytest.raises(TypeError):
+        weight_init.init_model("Balrog")
+    with pytest.raises(TypeError):
+        weight_init.init_model(_small_model(), rules=[Linear])
+    with pytest.raises(TypeError):
+        weight_init.init_model(_small_model(), seed=1.0)
+    with pytest.raises(ValueError):
+        weight_init.init_model(_small_model(), "Glorot")
+    with pytest.raises(ValueError):
+        weight_init.init_model(_small_model(), bias="Glorot")
+    with pytest.raises(ValueError):
+        weight_init.init_model(_small_model(), rules={Linear: "Glorot"})
+    with pytest.raises(TypeError):
+        weight_init.init_model(_small_model(), scheme_kwargs=[("normal", {})])
+    with pytest.raises(TypeError):
+        weight_init.init_model(_small_model(), scheme_kwargs={"normal": 0.5})
+    with pytest.raises(ValueError):
+        weight_init.init_model(_small_model(), scheme_kwargs={"Glorot": {}})
+    with pytest.raises(ValueError):
+        weight_init.init_model(
+            _small_model(), scheme_kwargs={"xavier_normal": {"a": 0.1}}
+        )
+
+
+def test_init_model_on_resnet():
+    """Should work when applied to a resnet."""
+    schemes = weight_init.init_model(resnet18(weights=None), "kaiming_normal")
+    assert len(schemes) == len(list(resnet18(weights=None).parameters()))